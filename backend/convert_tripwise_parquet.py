@@ -0,0 +1,81 @@
+"""
+One-off conversion of the TripWiseData CSVs to Parquet datasets.
+
+Each CSV is written next to itself as <name>_parquet/, hive-partitioned by
+year/month of Scheduled_Trip_Start_Time, so /api/history/monthly-stats only
+reads the requested month instead of streaming the whole CSV.
+
+Usage (from the backend directory):
+    python convert_tripwise_parquet.py
+"""
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from routers.history import BASE_DATA_PATH, TRIPWISE_COLUMNS, TRIPWISE_DTYPES, get_tripwise_parquet_root
+
+TRIPWISE_FILES = [
+    os.path.join(BASE_DATA_PATH, "TripWiseData_01APR2023_30APR2024", "TripWiseData_01APR2023_30APR2024.csv"),
+    os.path.join(BASE_DATA_PATH, "TripWiseData_01APR2024_30APR2025", "TripWiseData_01APR2024_30APR2025.csv"),
+]
+
+CHUNK_SIZE = 500000
+
+
+def _tripwise_batches(csv_path: str):
+    """Yield cleaned record batches (counts as int64, year/month added)."""
+    with pd.read_csv(csv_path, chunksize=CHUNK_SIZE, usecols=lambda c: c in TRIPWISE_COLUMNS, dtype=TRIPWISE_DTYPES) as reader:
+        for chunk in reader:
+            start_times = pd.to_datetime(chunk['Scheduled_Trip_Start_Time'], errors='coerce')
+            valid = start_times.notna()  # Rows without a start time never match a month
+            if not valid.any():
+                continue
+
+            out = pd.DataFrame({
+                'Trips_Scheduled': pd.to_numeric(chunk['Trips_Scheduled'][valid], errors='coerce').fillna(0).astype('int64'),
+                'Trips_Completed': pd.to_numeric(chunk['Trips_Completed'][valid], errors='coerce').fillna(0).astype('int64'),
+            })
+            if 'RouteID' in chunk.columns:
+                out['RouteID'] = chunk['RouteID'][valid].astype(str)
+            out['year'] = start_times[valid].dt.year.astype('int32')
+            out['month'] = start_times[valid].dt.month.astype('int32')
+
+            yield pa.RecordBatch.from_pandas(out, preserve_index=False)
+
+
+def convert_tripwise_csv(csv_path: str) -> str:
+    """Convert one TripWiseData CSV to a year/month-partitioned Parquet dataset."""
+    target = get_tripwise_parquet_root(csv_path)
+    print(f"Converting {os.path.basename(csv_path)} -> {target}")
+
+    batches = _tripwise_batches(csv_path)
+    first = next(batches, None)
+    if first is None:
+        print("  Empty file, skipped")
+        return target
+
+    def all_batches():
+        yield first
+        yield from batches
+
+    ds.write_dataset(
+        all_batches(),
+        target,
+        schema=first.schema,
+        format="parquet",
+        partitioning=["year", "month"],
+        partitioning_flavor="hive",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        existing_data_behavior="delete_matching"
+    )
+    print("  Done")
+    return target
+
+
+if __name__ == "__main__":
+    for csv_path in TRIPWISE_FILES:
+        if os.path.exists(csv_path):
+            convert_tripwise_csv(csv_path)
+        else:
+            print(f"Skipping missing file: {csv_path}")
@@ -1,10 +1,26 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from typing import Optional, List
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional, List, Dict, Tuple
 from pydantic import BaseModel
+import hashlib
+import time
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
+# Validated token cache: token digest -> (user, expiry timestamp)
+# Keyed by a 16-byte blake2b digest so raw bearer tokens aren't kept in memory.
+# Entries expire at the token's own "exp" claim, capped at TOKEN_CACHE_TTL seconds
+# so user changes (role, disabled) are picked up within a few minutes.
+TOKEN_CACHE_TTL = 300
+TOKEN_CACHE_MAX_SIZE = 4096
+_token_cache: Dict[bytes, Tuple["User", float]] = {}
+
+
+def _token_key(token: str) -> bytes:
+    """Cache key for a token."""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 
 class User(BaseModel):
     """User model."""
@@ -21,6 +37,26 @@ class TokenData(BaseModel):
     role: Optional[str] = None
 
 
+def _cache_token(key: bytes, user: User, exp: Optional[float]):
+    """Store a validated token until its exp claim (capped at TOKEN_CACHE_TTL)."""
+    now = time.time()
+    expires_at = now + TOKEN_CACHE_TTL
+    if exp is not None:
+        expires_at = min(expires_at, float(exp))
+    
+    if expires_at <= now:
+        return
+    
+    if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+        # Drop expired entries first, then the oldest ones
+        for expired in [k for k, (_, e) in _token_cache.items() if e <= now]:
+            del _token_cache[expired]
+        while len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+            del _token_cache[next(iter(_token_cache))]
+    
+    _token_cache[key] = (user, expires_at)
+
+
 async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> User:
     """
     Get current authenticated user from JWT token.
@@ -36,11 +72,21 @@ async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> Use
             disabled=False
         )
     
-    # Verify token
+    # Fast path: token already validated recently
+    key = _token_key(token)
+    cached = _token_cache.get(key)
+    if cached is not None:
+        user, expires_at = cached
+        if expires_at > time.time():
+            return user
+        _token_cache.pop(key, None)
+    
+    # Verify token (cache miss) - decode and user lookup are blocking,
+    # so run them in the threadpool instead of on the event loop
     try:
         from services.auth_service import verify_token, get_user
         
-        payload = verify_token(token)
+        payload = await run_in_threadpool(verify_token, token)
         
         if payload is None:
             raise HTTPException(
@@ -49,16 +95,11 @@ async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> Use
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        # verify_token guarantees "sub" and "exp" are present
+        username: str = payload["sub"]
         
         # Load user
-        user_dict = get_user(username)
+        user_dict = await run_in_threadpool(get_user, username)
         if user_dict is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -66,7 +107,7 @@ async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> Use
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        return User(
+        user = User(
             username=user_dict["username"],
             full_name=user_dict["full_name"],
             email=user_dict["email"],
@@ -74,6 +115,11 @@ async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)) -> Use
             disabled=user_dict.get("disabled", False)
         )
         
+        # Cache only successful validations
+        _cache_token(key, user, payload.get("exp"))
+        
+        return user
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -101,8 +147,8 @@ def require_role(allowed_roles: List[str]):
     return role_checker
 
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
-    """Require admin role."""
+async def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Require admin role (async so FastAPI runs it inline, not in the threadpool)."""
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -1,13 +1,13 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
 from contextlib import asynccontextmanager
 import asyncio
-from services.simulation import simulation
+from services.simulation import get_simulation
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -25,6 +25,7 @@ async def lifespan(app: FastAPI):
     
     # Start simulation
     print("\n[2/3] Starting simulation...")
+    simulation = get_simulation()
     app.state.simulation = simulation
     app.state.sim_task = asyncio.create_task(simulation.run())
     print("✓ Simulation task started")
@@ -38,6 +39,10 @@ async def lifespan(app: FastAPI):
         print(f"⚠️ Background tasks failed: {e}")
         app.state.background_task = None
     
+    # Start audit log writer
+    from services.audit_service import audit_writer
+    app.state.audit_task = asyncio.create_task(audit_writer.run())
+    
     print("\n✓ Application started successfully!")
     
     yield
@@ -52,13 +57,22 @@ async def lifespan(app: FastAPI):
     except:
         pass
     
-    await sim_task
-    if background_task:
-        background_task.cancel()
+    await audit_writer.stop()
+    
+    # Stop the simulation loop without waiting out its sleep
+    app.state.sim_task.cancel()
+    try:
+        await app.state.sim_task
+    except asyncio.CancelledError:
+        pass
+    
+    if app.state.background_task:
+        app.state.background_task.cancel()
     
     print("✓ Application shutdown complete")
 
-app = FastAPI(title="Route Insight Hub API", lifespan=lifespan)
+# orjson serializes responses (including datetimes) much faster than stdlib json
+app = FastAPI(title="Route Insight Hub API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS
 app.add_middleware(
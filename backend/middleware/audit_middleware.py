@@ -3,8 +3,10 @@ Middleware to integrate audit logging with FastAPI requests.
 """
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
-from services.audit_service import log_api_access
-import time
+from services.audit_service import log_api_access, audit_writer
+
+# Paths never audited (health checks, docs, probes)
+SKIP_PATHS = frozenset({"/", "/health", "/docs", "/redoc", "/openapi.json", "/favicon.ico", "/metrics"})
 
 
 class AuditMiddleware(BaseHTTPMiddleware):
@@ -12,34 +14,29 @@ class AuditMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next):
         # Skip logging for health/root endpoints
-        if request.url.path in ["/", "/health", "/docs", "/openapi.json"]:
+        if request.url.path in SKIP_PATHS:
             return await call_next(request)
         
-        # Record start time
-        start_time = time.time()
-        
         # Get user from request if authenticated
-        username = "anonymous"
-        try:
-            if hasattr(request.state, "user"):
-                username = request.state.user.get("username", "anonymous")
-        except:
-            pass
+        user = getattr(request.state, "user", None)
+        username = user.get("username", "anonymous") if user else "anonymous"
         
         # Process request
         response = await call_next(request)
         
-        # Log API access
-        try:
-            success = response.status_code < 400
-            
-            log_api_access(
-                username=username,
-                endpoint=request.url.path,
-                method=request.method,
-                success=success
-            )
-        except Exception as e:
-            print(f"Error logging audit event: {e}")
+        # Log API access - queued for the background writer when it is running
+        success = response.status_code < 400
+        if audit_writer.running:
+            audit_writer.submit(username, request.url.path, request.method, success)
+        else:
+            try:
+                log_api_access(
+                    username=username,
+                    endpoint=request.url.path,
+                    method=request.method,
+                    success=success
+                )
+            except Exception as e:
+                audit_writer.record_error(e)
         
         return response
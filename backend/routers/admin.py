@@ -6,8 +6,11 @@ from fastapi import APIRouter, Depends, Query
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
+import asyncio
 from dependencies import require_admin, User
-from services.audit_service import get_audit_logs
+from services.audit_service import get_audit_logs, log_admin_action
+from services.auth_service import list_users
+from services.background_tasks import scheduler
 from services.compliance_service import (
     get_data_retention_policy,
     validate_data_minimization,
@@ -92,9 +95,8 @@ async def get_system_stats(current_user: User = Depends(require_admin)):
     Get system statistics (admin only).
     """
     try:
+        # ML stack (xgboost/sklearn) is imported lazily, on first use
         from services.ml_models import delay_model, demand_model, anomaly_model
-        from services.background_tasks import scheduler
-        from services.auth_service import list_users
         
         ml_stats = {
             "delay_model_trained": delay_model.is_trained if delay_model else False,
@@ -126,8 +128,6 @@ async def retrain_models(current_user: User = Depends(require_admin)):
     """
     try:
         from services.model_trainer import train_all_models
-        from services.audit_service import log_admin_action
-        import asyncio
         
         # Log action
         log_admin_action(
@@ -3,17 +3,25 @@ from typing import List
 from models.schemas import AIRecommendation
 from dependencies import get_current_user
 from services.ai_service import (
-    generate_ai_recommendations, 
+    get_cached_recommendation_async,
+    get_precomputed_recommendation,
+    get_batch_recommendation,
     predict_delay, 
     forecast_demand,
-    detect_anomaly
+    detect_anomaly_batch,
+    anomaly_reason_codes,
+    ANOMALY_REASONS
 )
-from database import supabase
 from datetime import datetime
 from pydantic import BaseModel
+import numpy as np
+import asyncio
 
 router = APIRouter(prefix="/api/ai", tags=["AI"])
 
+# Peak hours (7-10 and 17-20) indexed by hour of day
+_PEAK_HOURS = (False,) * 7 + (True,) * 4 + (False,) * 6 + (True,) * 4 + (False,) * 3
+
 
 class DelayPredictionResponse(BaseModel):
     bus_id: str
@@ -46,29 +54,52 @@ class FeedbackRequest(BaseModel):
     comment: str = ""
 
 
+async def _bus_recommendation(bus) -> dict:
+    """Precomputed or batch recommendation for the bus's route, else generated now."""
+    rec_data = get_precomputed_recommendation(bus.route.route_id)
+    if rec_data is None:
+        rec_data = get_batch_recommendation(bus.route.route_id)
+    if rec_data is not None:
+        return rec_data
+    
+    return await get_cached_recommendation_async(bus.route.route_id, {
+        "delay": bus.delay_minutes,
+        "occupancy": bus.occupancy,
+        "status": bus.status,
+        "speed": bus.speed
+    })
+
+
 @router.get("/recommendations", response_model=List[AIRecommendation])
 async def get_ai_recommendations(request: Request, user = Depends(get_current_user)):
     """
     Get AI-generated recommendations for fleet optimization.
     """
     simulation = request.app.state.simulation
-    buses = simulation.buses.values()
     
     recs = []
-    # Generate recommendations for critical/minor delay buses
-    count = 0
-    for bus in buses:
-        if count >= 5: break # Limit to 5 recommendations
+    # One clock read per request, shared by every recommendation
+    now = datetime.now()
+    created_ts = int(now.timestamp())
+    
+    # Recommendations for delayed/crowded buses, most severe first. Most come
+    # from the scheduler's precomputed set; each wave runs the remaining
+    # generations concurrently (cache misses await the async Mistral client)
+    # and failed buses are replaced by the next candidates.
+    candidates = simulation.critical_buses()
+    next_idx = 0
+    while len(recs) < 5 and next_idx < len(candidates): # Limit to 5 recommendations
+        wave = candidates[next_idx:next_idx + 5 - len(recs)]
+        next_idx += len(wave)
         
-        # Check for issues
-        if bus.status in ["critical-delay", "minor-delay"] or bus.occupancy > 80:
+        results = await asyncio.gather(*[
+            _bus_recommendation(bus) for bus in wave
+        ], return_exceptions=True)
+        
+        for bus, rec_data in zip(wave, results):
             try:
-                rec_data = generate_ai_recommendations(bus.route.route_id, bus_state={
-                    "delay": bus.delay_minutes,
-                    "occupancy": bus.occupancy,
-                    "status": bus.status,
-                    "speed": bus.speed
-                })
+                if isinstance(rec_data, Exception):
+                    raise rec_data
                 
                 print(f"Generated rec_data for {bus.bus_id}: {rec_data}")
                 
@@ -76,15 +107,16 @@ async def get_ai_recommendations(request: Request, user = Depends(get_current_us
                 if "status" not in rec_data:
                     rec_data["status"] = "pending"
                 
+                # Validated on purpose: rec_data may come from the LLM, and a bad
+                # reply should only skip this bus, not fail the whole response
                 recs.append(
                     AIRecommendation(
-                        rec_id=f"rec-{bus.bus_id}-{int(datetime.now().timestamp())}",
+                        rec_id=f"rec-{bus.bus_id}-{created_ts}",
                         route_id=bus.route.route_id,
                         **rec_data,
-                        created_at=datetime.now()
+                        created_at=now
                     )
                 )
-                count += 1
             except Exception as e:
                 print(f"Error creating recommendation for bus {bus.bus_id}: {e}")
                 # Continue to next bus instead of failing entire request
@@ -114,10 +146,11 @@ async def get_delay_prediction(
     # Get prediction
     predicted_delay = predict_delay(route_id, bus_id)
     
-    return DelayPredictionResponse(
+    # Built from trusted simulation/model values; response_model validates once at the edge
+    return DelayPredictionResponse.model_construct(
         bus_id=bus_id,
         route_id=route_id,
-        predicted_delay=predicted_delay,
+        predicted_delay=float(predicted_delay),
         confidence=0.85,  # Model confidence
         timestamp=datetime.now()
     )
@@ -132,8 +165,6 @@ async def get_demand_forecast(
     """
     Get demand forecast for a specific route.
     """
-    from datetime import datetime
-    
     # Create time slot
     now = datetime.now()
     if hour is not None:
@@ -144,13 +175,11 @@ async def get_demand_forecast(
     # Get forecast
     predicted_demand = forecast_demand(route_id, time_slot)
     
-    is_peak = (7 <= time_slot.hour <= 10) or (17 <= time_slot.hour <= 20)
-    
     return DemandForecastResponse(
         route_id=route_id,
         time_slot=time_slot,
         predicted_demand=predicted_demand,
-        peak_hour=is_peak
+        peak_hour=_PEAK_HOURS[time_slot.hour]
     )
 
 
@@ -160,30 +189,30 @@ async def get_anomalies(request: Request, user = Depends(get_current_user)):
     Get list of buses with detected anomalies.
     """
     simulation = request.app.state.simulation
+    buses = list(simulation.buses.values())
     anomalies = []
     
-    for bus in simulation.buses.values():
-        is_anomaly = detect_anomaly(bus.occupancy, bus.delay_minutes, bus.speed)
+    # Score all buses in one batched call
+    metrics = np.array(
+        [(bus.occupancy, bus.delay_minutes, bus.speed) for bus in buses],
+        dtype=np.float64
+    ).reshape(-1, 3)
+    anomaly_mask = detect_anomaly_batch(metrics)
+    reason_codes = anomaly_reason_codes(metrics)
+    
+    for idx in np.flatnonzero(anomaly_mask):
+        bus = buses[idx]
         
-        if is_anomaly:
-            # Determine reason
-            reasons = []
-            if bus.occupancy > 95:
-                reasons.append("overcrowding")
-            if bus.delay_minutes > 30:
-                reasons.append("critical delay")
-            if bus.speed < 5:
-                reasons.append("stalled")
-            
-            anomalies.append(AnomalyResponse(
-                bus_id=bus.bus_id,
-                route_id=bus.route.route_id,
-                is_anomaly=True,
-                occupancy=bus.occupancy,
-                delay=bus.delay_minutes,
-                speed=bus.speed,
-                reason=", ".join(reasons) if reasons else "statistical anomaly"
-            ))
+        # Trusted simulation values - skip per-item validation
+        anomalies.append(AnomalyResponse.model_construct(
+            bus_id=bus.bus_id,
+            route_id=bus.route.route_id,
+            is_anomaly=True,
+            occupancy=bus.occupancy,
+            delay=bus.delay_minutes,
+            speed=bus.speed,
+            reason=ANOMALY_REASONS[reason_codes[idx]]
+        ))
     
     return anomalies
 
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, Request
-from typing import List, Dict
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Dict, Optional, Tuple
 from models.schemas import RouteAnalytics
 from dependencies import get_current_user
-from database import supabase
 from pydantic import BaseModel
+import asyncio
+import time
+import numpy as np
+from services.simulation import ON_TIME
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
 
+# OD flows cache: (computed_at, flows). The OD matrix is network-wide
+# (compute_od_matrix doesn't filter by route), so one entry serves every route_id.
+OD_CACHE_TTL = 300
+_od_cache: Optional[Tuple[float, list]] = None
+_od_lock: Optional[asyncio.Lock] = None  # Created on first use, on the serving loop
 
 class ODFlowResponse(BaseModel):
     origin: str
@@ -38,7 +47,42 @@ async def get_route_analytics(request: Request, user = Depends(get_current_user)
     Get analytics for all routes.
     """
     simulation = request.app.state.simulation
-    return simulation.get_route_analytics()
+    # Dicts already match RouteAnalytics; the list is built and serialized
+    # once per simulation tick, not per request
+    return Response(content=simulation.route_analytics_snapshot(), media_type="application/json")
+
+
+def _compute_od_flows() -> List["ODFlowResponse"]:
+    """Compute the top 50 OD flows from ticketing data (blocking)."""
+    from services.data_loader import data_loader
+    
+    if not data_loader.data_cache:
+        data_loader.load_all_data()
+    
+    od_matrix = data_loader.compute_od_matrix()
+    
+    if od_matrix is None or len(od_matrix) == 0:
+        return []
+    
+    # Convert to response format, column-wise (no per-row Series)
+    top = od_matrix.head(50)  # Limit to top 50 flows
+    if 'total_passengers' in top.columns:
+        passengers = top['total_passengers'].fillna(0)
+    else:
+        passengers = top['trip_count']
+    
+    return [
+        ODFlowResponse(
+            origin=origin,
+            destination=destination,
+            passenger_count=int(passenger_count),
+            revenue=float(revenue),
+            trip_count=int(trip_count)
+        )
+        for origin, destination, passenger_count, revenue, trip_count in zip(
+            top['origin'], top['destination'], passengers, top['total_revenue'], top['trip_count']
+        )
+    ]
 
 
 @router.get("/od-matrix/{route_id}", response_model=List[ODFlowResponse])
@@ -46,33 +90,28 @@ async def get_od_matrix(route_id: str, user = Depends(get_current_user)):
     """
     Get origin-destination flow matrix for a specific route.
     """
-    # Load OD matrix from data loader
-    try:
-        from services.data_loader import data_loader
-        
-        if not data_loader.data_cache:
-            data_loader.load_all_data()
-        
-        od_matrix = data_loader.compute_od_matrix()
+    global _od_cache, _od_lock
+    
+    if _od_cache is not None and time.monotonic() - _od_cache[0] < OD_CACHE_TTL:
+        return _od_cache[1]
+    
+    if _od_lock is None:
+        _od_lock = asyncio.Lock()
+    
+    # Concurrent misses wait for a single recomputation
+    async with _od_lock:
+        if _od_cache is not None and time.monotonic() - _od_cache[0] < OD_CACHE_TTL:
+            return _od_cache[1]
         
-        if od_matrix is None or len(od_matrix) == 0:
+        # Load OD matrix from data loader
+        try:
+            flows = await run_in_threadpool(_compute_od_flows)
+        except Exception as e:
+            print(f"Error computing OD matrix: {e}")
             return []
         
-        # Convert to response format
-        flows = []
-        for _, row in od_matrix.head(50).iterrows():  # Limit to top 50 flows
-            flows.append(ODFlowResponse(
-                origin=row.get('origin', 'Unknown'),
-                destination=row.get('destination', 'Unknown'),
-                passenger_count=int(row.get('total_passengers', row.get('trip_count', 0))),
-                revenue=float(row.get('total_revenue', 0)),
-                trip_count=int(row.get('trip_count', 0))
-            ))
-        
+        _od_cache = (time.monotonic(), flows)
         return flows
-    except Exception as e:
-        print(f"Error computing OD matrix: {e}")
-        return []
 
 
 @router.get("/temporal-patterns", response_model=List[TemporalPattern])
@@ -82,42 +121,22 @@ async def get_temporal_patterns(request: Request, user = Depends(get_current_use
     """
     simulation = request.app.state.simulation
     
-    # Aggregate by hour from current bus states
-    hourly_data = {}
-    
-    for bus in simulation.buses.values():
-        hour = bus.last_updated.hour
-        
-        if hour not in hourly_data:
-            hourly_data[hour] = {
-                'demand': [],
-                'occupancy': [],
-                'delay': []
-            }
-        
-        hourly_data[hour]['demand'].append(bus.occupancy * 0.5)  # Approximate demand
-        hourly_data[hour]['occupancy'].append(bus.occupancy)
-        hourly_data[hour]['delay'].append(bus.delay_minutes)
+    # Aggregate by hour from the simulation's per-bus arrays
+    hours = simulation.hour_arr
+    counts = np.maximum(np.bincount(hours, minlength=24), 1)  # Hours without data average to 0
+    avg_occupancy = np.bincount(hours, weights=simulation.occupancy_arr, minlength=24) / counts
+    avg_delay = np.bincount(hours, weights=simulation.delay_arr, minlength=24) / counts
+    avg_demand = avg_occupancy * 0.5  # Approximate demand
     
-    # Calculate averages
-    patterns = []
-    for hour in range(24):
-        if hour in hourly_data:
-            data = hourly_data[hour]
-            patterns.append(TemporalPattern(
-                hour=hour,
-                avg_demand=sum(data['demand']) / len(data['demand']),
-                avg_occupancy=sum(data['occupancy']) / len(data['occupancy']),
-                avg_delay=sum(data['delay']) / len(data['delay'])
-            ))
-        else:
-            # No data for this hour
-            patterns.append(TemporalPattern(
-                hour=hour,
-                avg_demand=0,
-                avg_occupancy=0,
-                avg_delay=0
-            ))
+    patterns = [
+        TemporalPattern(
+            hour=hour,
+            avg_demand=float(avg_demand[hour]),
+            avg_occupancy=float(avg_occupancy[hour]),
+            avg_delay=float(avg_delay[hour])
+        )
+        for hour in range(24)
+    ]
     
     return patterns
 
@@ -128,32 +147,33 @@ async def get_efficiency_metrics(request: Request, user = Depends(get_current_us
     Get efficiency metrics for all routes.
     """
     simulation = request.app.state.simulation
-    metrics = []
     
+    # Per-route aggregates in one vectorized pass over the per-bus arrays
+    bus_counts = simulation.route_counts()
+    on_time_counts = simulation.route_sums(simulation.status_arr == ON_TIME)
+    speed_sums = simulation.route_sums(simulation.speed_arr)
+    
+    metrics = []
     for route_id, route in simulation.routes.items():
-        # Get buses on this route
-        buses_on_route = [b for b in simulation.buses.values() if b.route.route_id == route_id]
-        
-        if not buses_on_route:
-            continue
+        idx = simulation.route_index.get(route_id)
+        if idx is None:
+            continue  # No buses on this route
         
         # Calculate metrics
-        total_delay = sum(b.delay_minutes for b in buses_on_route)
-        on_time_count = sum(1 for b in buses_on_route if b.status == "on-time")
-        on_time_pct = (on_time_count / len(buses_on_route)) * 100 if buses_on_route else 0
-        
-        avg_speed = sum(b.speed for b in buses_on_route) / len(buses_on_route)
+        bus_count = int(bus_counts[idx])
+        on_time_pct = float(on_time_counts[idx]) / bus_count * 100
+        avg_speed = float(speed_sums[idx]) / bus_count
         
         # Get revenue from route stats
         stats = simulation.route_stats.get(route_id, {})
         revenue = stats.get('revenue', 0)
         
         # Estimate route length (simplified)
-        route_length = len(route.path) * 2  # Approximate km
+        route_length = len(route) * 2  # Approximate km
         
         metrics.append(EfficiencyMetrics(
             route_id=route_id,
-            total_trips=len(buses_on_route),
+            total_trips=bus_count,
             on_time_percentage=on_time_pct,
             avg_speed=avg_speed,
             fuel_efficiency=avg_speed / 10,  # Simplified fuel efficiency
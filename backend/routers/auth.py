@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from typing import List
 from pydantic import BaseModel, EmailStr
 from datetime import timedelta
@@ -58,7 +59,8 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     - control_room / control123
     - depot / depot123
     """
-    user = authenticate_user(form_data.username, form_data.password)
+    # Password hashing is CPU-bound; keep it off the event loop
+    user = await run_in_threadpool(authenticate_user, form_data.username, form_data.password)
     
     if not user:
         raise HTTPException(
@@ -98,7 +100,8 @@ async def register(
     Register a new user (admin only).
     """
     try:
-        new_user = create_user(
+        new_user = await run_in_threadpool(
+            create_user,
             username=user_data.username,
             password=user_data.password,
             full_name=user_data.full_name,
@@ -144,7 +147,7 @@ async def update_user_info(
         # Convert to dict, excluding None values
         updates = user_update.dict(exclude_none=True)
         
-        updated_user = update_user(username, updates)
+        updated_user = await run_in_threadpool(update_user, username, updates)
         return updated_user
         
     except ValueError as e:
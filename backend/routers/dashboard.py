@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from models.schemas import KPIResponse
 from dependencies import get_current_user
-from database import supabase
 from services.ai_service import predict_delay
 
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
@@ -1,12 +1,25 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Dict, Tuple
 import pandas as pd
 import os
 import glob
+import functools
+from collections import OrderedDict
 from datetime import datetime
 from pydantic import BaseModel
 import asyncio
 import calendar
+import time
+import numpy as np
+from dependencies import require_admin, User
+from services.audit_service import log_admin_action
+
+try:
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
 
 router = APIRouter(
     prefix="/api/history",
@@ -25,19 +38,54 @@ class MonthlyStats(BaseModel):
 BASE_DATA_PATH = "C:/Users/bhava/Desktop/RTGS/2years"
 HALTWISE_FILE = "C:/Users/bhava/Desktop/RTGS/HaltWiseData_22Apr2025.xls"
 
-def get_booking_files_for_month(year: int, month: int) -> List[str]:
-    """Get all booking CSV files for the given month/year."""
+# TripWiseData columns used for monthly stats
+TRIPWISE_COLUMNS = frozenset({'Scheduled_Trip_Start_Time', 'Trips_Scheduled', 'Trips_Completed', 'RouteID'})
+
+# Declared dtypes so pandas parses in one pass without low_memory=False.
+# Trip counts stay inferred: they go through to_numeric(errors='coerce')
+# because the export may contain non-numeric values.
+TRIPWISE_DTYPES = {'Scheduled_Trip_Start_Time': str, 'RouteID': 'category'}
+
+# Monthly stats cache: (year, month) -> (computed_at, stats). Source files for a
+# month rarely change, so results are kept for an hour. Months are chosen by the
+# client, so at most MONTHLY_STATS_CACHE_SIZE are kept (least recently used go first).
+MONTHLY_STATS_CACHE_TTL = 3600
+MONTHLY_STATS_CACHE_SIZE = 64
+_monthly_stats_cache: "OrderedDict[Tuple[int, int], Tuple[float, MonthlyStats]]" = OrderedDict()
+# Computations in flight, shared by concurrent requests for the same month;
+# removed as soon as they finish. Keyed by (year, month, generation): /refresh
+# bumps the generation so later requests start fresh computations, and results
+# of computations started before it are not cached.
+_monthly_stats_pending: Dict[Tuple[int, int, int], asyncio.Task] = {}
+_monthly_stats_generation = 0
+
+# Booking files read concurrently in the final fallback
+BOOKING_READ_CONCURRENCY = 8
+
+@functools.lru_cache(maxsize=256)
+def get_booking_files_for_month(year: int, month: int) -> Tuple[str, ...]:
+    """
+    Get all booking CSV files for the given month/year.
+    Cached per month (the recursive glob is expensive); cleared by POST /api/history/refresh.
+    """
     month_str = f"{month:02d}"
     year_str = str(year)
     month_path = os.path.join(BASE_DATA_PATH, year_str, month_str)
     
     if not os.path.exists(month_path):
-        return []
+        return ()
     
     pattern = os.path.join(month_path, "**", "ticket_booking_info_*.csv")
-    files = glob.glob(pattern, recursive=True)
-    return files
+    return tuple(glob.glob(pattern, recursive=True))
 
+def get_tripwise_parquet_root(tripwise_file: str) -> str:
+    """
+    Get the Parquet dataset directory for a TripWiseData CSV (created by
+    convert_tripwise_parquet.py, hive-partitioned by year/month).
+    """
+    return os.path.splitext(tripwise_file)[0] + "_parquet"
+
+@functools.lru_cache(maxsize=256)
 def get_tripwise_file_for_period(year: int, month: int) -> str:
     """
     Get the appropriate TripWiseData CSV file based on date range.
@@ -60,6 +108,60 @@ def get_tripwise_file_for_period(year: int, month: int) -> str:
     
     return None
 
+@functools.lru_cache(maxsize=2)
+def _load_tripwise(parquet_root: str):
+    """
+    Load a TripWise Parquet dataset into memory once (one per source file).
+    Adds month_key = year * 12 + month so a month is a single filter.
+    """
+    dataset = ds.dataset(parquet_root, format="parquet", partitioning="hive")
+    columns = [c for c in ('Trips_Scheduled', 'Trips_Completed', 'RouteID', 'year', 'month') if c in dataset.schema.names]
+    table = dataset.to_table(columns=columns)
+    month_key = pc.add(pc.multiply(table['year'], 12), table['month'])
+    return table.drop_columns(['year', 'month']).append_column('month_key', month_key)
+
+def read_tripwise_month_parquet(parquet_root: str, year: int, month: int) -> Tuple[int, int, Dict[str, int]]:
+    """
+    Read one month of TripWiseData from the cached Parquet table.
+    Returns (scheduled, completed, failures by route).
+    """
+    table = _load_tripwise(parquet_root)
+    table = table.filter(pc.equal(table['month_key'], year * 12 + month))
+    columns = table.column_names
+    
+    if table.num_rows == 0:
+        return 0, 0, {}
+    
+    sched = table.column('Trips_Scheduled').to_numpy()
+    compl = table.column('Trips_Completed').to_numpy()
+    
+    route_failures = {}
+    if 'RouteID' in columns:
+        failed = sched - compl
+        has_failures = failed > 0
+        route_ids = table.column('RouteID').to_numpy(zero_copy_only=False)[has_failures]
+        failed_by_route = pd.Series(failed[has_failures]).groupby(route_ids).sum()
+        route_failures = {str(r): int(c) for r, c in failed_by_route.items()}
+    
+    return int(np.sum(sched)), int(np.sum(compl)), route_failures
+
+def _count_bookings_in_file(file_path: str) -> int:
+    """Count non-null BOOKING_IDs in one booking CSV (only that column is parsed)."""
+    return pd.read_csv(file_path, usecols=['BOOKING_ID'], dtype={'BOOKING_ID': str})['BOOKING_ID'].count()
+
+async def _count_bookings_async(files) -> int:
+    """Count bookings across files, reading up to BOOKING_READ_CONCURRENCY files at once."""
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(BOOKING_READ_CONCURRENCY)
+    
+    async def count_one(file_path: str) -> int:
+        async with sem:
+            return await loop.run_in_executor(None, _count_bookings_in_file, file_path)
+    
+    results = await asyncio.gather(*(count_one(f) for f in files), return_exceptions=True)
+    # Unreadable files (or files without BOOKING_ID) are skipped
+    return sum(int(r) for r in results if not isinstance(r, BaseException))
+
 @router.get("/monthly-stats", response_model=MonthlyStats)
 async def get_monthly_stats(
     year: int = Query(..., description="Year (e.g. 2023)"),
@@ -69,6 +171,66 @@ async def get_monthly_stats(
     Get monthly statistics using TripWiseData for trip completion metrics.
     Falls back to HaltWiseData if TripWiseData unavailable.
     """
+    key = (year, month)
+    cached = _monthly_stats_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < MONTHLY_STATS_CACHE_TTL:
+        _monthly_stats_cache.move_to_end(key)
+        return cached[1]
+    
+    # Concurrent requests for the same month wait for a single computation
+    pending_key = (year, month, _monthly_stats_generation)
+    task = _monthly_stats_pending.get(pending_key)
+    if task is None:
+        task = asyncio.create_task(_fill_monthly_stats(year, month))
+        _monthly_stats_pending[pending_key] = task
+        task.add_done_callback(lambda _: _monthly_stats_pending.pop(pending_key, None))
+    # A disconnecting client mustn't cancel the computation for the others
+    return await asyncio.shield(task)
+
+
+async def _fill_monthly_stats(year: int, month: int) -> MonthlyStats:
+    """Compute a month's stats and cache them unless /refresh ran meanwhile."""
+    generation = _monthly_stats_generation
+    stats = await _compute_monthly_stats(year, month)
+    if generation != _monthly_stats_generation:
+        return stats
+    _monthly_stats_cache[(year, month)] = (time.monotonic(), stats)
+    _monthly_stats_cache.move_to_end((year, month))
+    while len(_monthly_stats_cache) > MONTHLY_STATS_CACHE_SIZE:
+        _monthly_stats_cache.popitem(last=False)
+    return stats
+
+
+@router.post("/refresh")
+async def refresh_history_cache(current_user: User = Depends(require_admin)):
+    """
+    Clear cached file lookups and monthly stats (admin only).
+    Use after new booking/TripWise files are added for a month.
+    """
+    global _monthly_stats_generation
+    
+    get_booking_files_for_month.cache_clear()
+    get_tripwise_file_for_period.cache_clear()
+    _load_tripwise.cache_clear()
+    _monthly_stats_cache.clear()
+    _monthly_stats_generation += 1
+    
+    log_admin_action(
+        username=current_user.username,
+        action="refresh_history_cache",
+        target="history",
+        details={}
+    )
+    
+    return {
+        "status": "success",
+        "message": "History caches cleared",
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+async def _compute_monthly_stats(year: int, month: int) -> MonthlyStats:
+    """Compute monthly statistics from the source files (in the thread pool)."""
     print(f"Fetching stats for {year}-{month:02d}")
     
     def process_data():
@@ -80,9 +242,21 @@ async def get_monthly_stats(
         # Try TripWiseData first (faster, smaller files)
         tripwise_file = get_tripwise_file_for_period(year, month)
         
-        if tripwise_file and os.path.exists(tripwise_file):
-            print(f"Using TripWiseData: {os.path.basename(tripwise_file)}")
+        parquet_root = get_tripwise_parquet_root(tripwise_file) if tripwise_file else None
+        
+        if PYARROW_AVAILABLE and parquet_root and os.path.isdir(parquet_root):
+            print(f"Using TripWiseData Parquet: {os.path.basename(parquet_root)}")
             
+            try:
+                total_trips, completed_trips, route_failures = read_tripwise_month_parquet(parquet_root, year, month)
+                failed_trips = total_trips - completed_trips
+                print(f"TripWiseData results: Scheduled={total_trips}, Completed={completed_trips}, Failed={failed_trips}")
+            except Exception as e:
+                print(f"Error processing TripWiseData Parquet: {e}")
+                total_trips = 0
+        
+        elif tripwise_file and os.path.exists(tripwise_file):
+            print(f"Using TripWiseData: {os.path.basename(tripwise_file)} (run convert_tripwise_parquet.py for faster reads)")
             
             try:
                 # TripWiseData contains aggregated stats per trip
@@ -94,7 +268,8 @@ async def get_monthly_stats(
                 target_start = pd.Timestamp(year=year, month=month, day=1)
                 target_end = pd.Timestamp(year=year, month=month, day=last_day) + pd.Timedelta(days=1)
                 
-                with pd.read_csv(tripwise_file, chunksize=chunk_size, low_memory=False) as reader:
+                # Only the columns we aggregate are parsed (RouteID is optional)
+                with pd.read_csv(tripwise_file, chunksize=chunk_size, usecols=lambda c: c in TRIPWISE_COLUMNS, dtype=TRIPWISE_DTYPES) as reader:
                     chunk_num = 0
                     for chunk in reader:
                         chunk_num += 1
@@ -106,14 +281,14 @@ async def get_monthly_stats(
                             continue
                         
                         # Parse and filter by date
-                        chunk['Scheduled_Trip_Start_Time'] = pd.to_datetime(chunk['Scheduled_Trip_Start_Time'], errors='coerce')
+                        start_times = pd.to_datetime(chunk['Scheduled_Trip_Start_Time'], errors='coerce')
                         
                         # Debug: check date range in chunk
                         if chunk_num == 1:
-                            print(f"First chunk date range: {chunk['Scheduled_Trip_Start_Time'].min()} to {chunk['Scheduled_Trip_Start_Time'].max()}")
+                            print(f"First chunk date range: {start_times.min()} to {start_times.max()}")
                             print(f"Target range: {target_start} to {target_end}")
                         
-                        mask = (chunk['Scheduled_Trip_Start_Time'] >= target_start) & (chunk['Scheduled_Trip_Start_Time'] < target_end)
+                        mask = (start_times >= target_start) & (start_times < target_end)
                         filtered = chunk[mask]
                         
                         if chunk_num == 1 and not filtered.empty:
@@ -122,21 +297,26 @@ async def get_monthly_stats(
                         if filtered.empty:
                             continue
                         
-                        # Sum scheduled and completed trips for this month
+                        # Scheduled/completed counts, parsed once per chunk into int32
+                        # arrays (per-trip counts are small) and reused below
                         # Use to_numeric to handle non-numeric values safely
-                        chunk_scheduled = pd.to_numeric(filtered['Trips_Scheduled'], errors='coerce').fillna(0).astype(int).sum()
-                        chunk_completed = pd.to_numeric(filtered['Trips_Completed'], errors='coerce').fillna(0).astype(int).sum()
+                        sched = pd.to_numeric(filtered['Trips_Scheduled'], errors='coerce').fillna(0).to_numpy(dtype=np.int32)
+                        compl = pd.to_numeric(filtered['Trips_Completed'], errors='coerce').fillna(0).to_numpy(dtype=np.int32)
                         
-                        total_trips += int(chunk_scheduled)
-                        completed_trips += int(chunk_completed)
-                        failed_trips += (int(chunk_scheduled) - int(chunk_completed))
+                        # Accumulate in int64 (numpy's default int is 32-bit on Windows)
+                        chunk_scheduled = int(sched.sum(dtype=np.int64))
+                        chunk_completed = int(compl.sum(dtype=np.int64))
+                        
+                        total_trips += chunk_scheduled
+                        completed_trips += chunk_completed
+                        failed_trips += chunk_scheduled - chunk_completed
                         
                         # Count failures by route
                         if 'RouteID' in filtered.columns:
-                            sched = pd.to_numeric(filtered['Trips_Scheduled'], errors='coerce').fillna(0).astype(int)
-                            compl = pd.to_numeric(filtered['Trips_Completed'], errors='coerce').fillna(0).astype(int)
-                            filtered['Failed'] = sched - compl
-                            failed_by_route = filtered[filtered['Failed'] > 0].groupby('RouteID')['Failed'].sum()
+                            failed = sched - compl
+                            has_failures = failed > 0
+                            route_ids = filtered['RouteID'].to_numpy()[has_failures]
+                            failed_by_route = pd.Series(failed[has_failures]).groupby(route_ids).sum()
                             for route_id, count in failed_by_route.items():
                                 route_str = str(route_id)
                                 route_failures[route_str] = route_failures.get(route_str, 0) + int(count)
@@ -174,19 +354,17 @@ async def get_monthly_stats(
             except Exception as e:
                 print(f"Error processing HaltWiseData: {e}")
         
+        return total_trips, completed_trips, failed_trips, route_failures
+    
+    # Run in thread pool
+    try:
+        loop = asyncio.get_running_loop()
+        total_trips, completed_trips, failed_trips, route_failures = await loop.run_in_executor(None, process_data)
+        
         # Final fallback to booking data
         if total_trips == 0:
             print("Using booking data as final fallback...")
-            files = get_booking_files_for_month(year, month)
-            total_bookings = 0
-            
-            for file_path in files:
-                try:
-                    df = pd.read_csv(file_path, low_memory=False)
-                    if 'BOOKING_ID' in df.columns:
-                        total_bookings += len(df.dropna(subset=['BOOKING_ID']))
-                except:
-                    continue
+            total_bookings = await _count_bookings_async(get_booking_files_for_month(year, month))
             
             total_trips = total_bookings
             completed_trips = total_bookings
@@ -206,11 +384,6 @@ async def get_monthly_stats(
             cancellations=failed_trips,
             worst_routes=worst_routes_list
         )
-    
-    # Run in thread pool
-    try:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, process_data)
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,7 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from typing import List
 from models.schemas import BusLocation
 from dependencies import get_current_user
-from database import supabase
 from datetime import datetime
 
 router = APIRouter(prefix="/api/live", tags=["Live"])
@@ -15,7 +14,14 @@ async def get_live_buses(request: Request, user = Depends(get_current_user)):
     Get live location of all active buses.
     """
     simulation = request.app.state.simulation
-    buses = simulation.get_all_buses()
     
-    # Map simulation format to schema if needed, but dicts align well
-    return buses
+    # Payload is serialized once per simulation tick (dicts already match
+    # BusLocation, so no per-request validation or encoding)
+    body, etag = simulation.live_buses_snapshot()
+    
+    # Client already has this tick's positions
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException, Query, Request
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-import random
+import numpy as np
+from services.simulation import STATUS_CODES
 
 router = APIRouter(
     prefix="/api/reports",
@@ -10,6 +11,16 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Statuses counted as active in the fleet breakdown
+ACTIVE_SET = frozenset({"on-time", "minor-delay", "critical-delay"})
+ACTIVE_CODES = np.array([STATUS_CODES[s] for s in ACTIVE_SET], dtype=np.int8)
+
+# Buses outside the simulation (not tracked live yet) - fixed depot figures
+# until fleet records are available
+MAINTENANCE_BUSES = 90
+IDLE_BUSES = 40
+STANDBY_BUSES = 125
+
 # Response Models
 class WeeklyDelayData(BaseModel):
     day: str
@@ -34,72 +45,86 @@ class ReportsData(BaseModel):
     routes_optimized: int
     passengers_served: str
 
-@router.get("/performance", response_model=ReportsData)
-async def get_performance_reports(request: Request):
+# Weekly Delay Trends (simulated comparison) - static, built once
+WEEKLY_DELAY = [
+    WeeklyDelayData(day="Mon", before=12.5, after=7.2),
+    WeeklyDelayData(day="Tue", before=10.8, after=6.4),
+    WeeklyDelayData(day="Wed", before=14.2, after=8.1),
+    WeeklyDelayData(day="Thu", before=11.3, after=6.9),
+    WeeklyDelayData(day="Fri", before=15.6, after=9.2),
+    WeeklyDelayData(day="Sat", before=8.4, after=5.1),
+    WeeklyDelayData(day="Sun", before=6.2, after=4.0),
+]
+
+def _scan_fleet(simulation) -> Tuple[int, float, np.ndarray, np.ndarray]:
     """
-    Get aggregated performance reports combining booking data and simulation state.
+    Fleet aggregates from the simulation's per-bus arrays: active count,
+    total delay, and the indices of routes with buses with their average delay.
     """
-    simulation = request.app.state.simulation
-    
-    # Fleet Status from Simulation
-    fleet_status = []
-    active = len([b for b in simulation.buses.values() if b.status in ["on-time", "minor-delay", "critical-delay"]])
-    maintenance = random.randint(80, 100)  # Mock maintenance count
-    idle = random.randint(30, 50)
-    standby = random.randint(100, 150)
+    active = int(np.count_nonzero(np.isin(simulation.status_arr, ACTIVE_CODES)))
+    total_delay = float(simulation.delay_arr.sum())
     
-    fleet_status = [
+    counts = simulation.route_counts()
+    route_idx = np.flatnonzero(counts)
+    avg_delays = simulation.route_sums(simulation.delay_arr)[route_idx] / counts[route_idx]
+    return active, total_delay, route_idx, avg_delays
+
+def _compute_fleet_status(active: int) -> List[FleetStatusItem]:
+    """Fleet status breakdown (active from the simulation, the rest fixed depot figures)."""
+    return [
         FleetStatusItem(name="Active", value=active, color="hsl(152, 60%, 36%)"),
-        FleetStatusItem(name="Maintenance", value=maintenance, color="hsl(36, 80%, 48%)"),
-        FleetStatusItem(name="Idle", value=idle, color="hsl(0, 72%, 50%)"),
-        FleetStatusItem(name="Standby", value=standby, color="hsl(220, 70%, 35%)"),
-    ]
-    
-    # Weekly Delay Trends (simulated comparison)
-    weekly_delay = [
-        WeeklyDelayData(day="Mon", before=12.5, after=7.2),
-        WeeklyDelayData(day="Tue", before=10.8, after=6.4),
-        WeeklyDelayData(day="Wed", before=14.2, after=8.1),
-        WeeklyDelayData(day="Thu", before=11.3, after=6.9),
-        WeeklyDelayData(day="Fri", before=15.6, after=9.2),
-        WeeklyDelayData(day="Sat", before=8.4, after=5.1),
-        WeeklyDelayData(day="Sun", before=6.2, after=4.0),
+        FleetStatusItem(name="Maintenance", value=MAINTENANCE_BUSES, color="hsl(36, 80%, 48%)"),
+        FleetStatusItem(name="Idle", value=IDLE_BUSES, color="hsl(0, 72%, 50%)"),
+        FleetStatusItem(name="Standby", value=STANDBY_BUSES, color="hsl(220, 70%, 35%)"),
     ]
+
+def _compute_congestion(route_ids: List[str], route_idx: np.ndarray, avg_delays: np.ndarray) -> List[CongestionZone]:
+    """Top 8 routes by average live delay (worst first)."""
+    k = min(8, len(avg_delays))
+    if k == 0:
+        return []
     
-    # Congestion Zones from Live Buses
-    route_delays = {}
-    for bus in simulation.buses.values():
-        route_id = bus.route.route_id
-        if route_id not in route_delays:
-            route_delays[route_id] = []
-        route_delays[route_id].append(bus.delay_minutes)
+    # Partial selection of the top k, then order just those (ties keep route order)
+    top = np.sort(np.argpartition(-avg_delays, k - 1)[:k])
+    top = top[np.argsort(-avg_delays[top], kind="stable")]
     
-    # Calculate average delays per route
-    congestion_data = []
-    for route_id, delays in sorted(route_delays.items(), key=lambda x: sum(x[1])/len(x[1]) if x[1] else 0, reverse=True)[:8]:
-        avg_delay = sum(delays) / len(delays) if delays else 0
-        # Convert delay to congestion score (0-100)
-        score = min(100, int(avg_delay * 5))
-        # Use route name if available
-        route_name = f"Route {route_id}"
-        congestion_data.append(CongestionZone(zone=route_name, score=score))
+    # Convert delay to congestion score (0-100)
+    scores = np.minimum(100, (avg_delays[top] * 5).astype(int))
     
-    # Summary Stats
-    total_buses = len(simulation.buses)
+    # Use route name if available
+    return [
+        CongestionZone(zone=f"Route {route_ids[route_idx[i]]}", score=int(score))
+        for i, score in zip(top, scores)
+    ]
+
+def _compute_delay_summary(active: int, total_delay: float, total_buses: int) -> Tuple[str, str]:
+    """Delay reduction vs. baseline and fleet utilization, formatted for display."""
     utilization = (active / total_buses * 100) if total_buses > 0 else 0
     
     # Calculate delay reduction (compare current avg to baseline)
-    all_delays = [b.delay_minutes for b in simulation.buses.values()]
-    avg_current_delay = sum(all_delays) / len(all_delays) if all_delays else 0
+    avg_current_delay = total_delay / total_buses if total_buses > 0 else 0
     baseline_delay = 12.0  # Assumed baseline before optimization
     reduction = ((baseline_delay - avg_current_delay) / baseline_delay * 100) if baseline_delay > 0 else 0
     
+    return f"{reduction:.0f}%", f"{utilization:.1f}%"
+
+@router.get("/performance", response_model=ReportsData)
+async def get_performance_reports(request: Request):
+    """
+    Get aggregated performance reports combining booking data and simulation state.
+    """
+    simulation = request.app.state.simulation
+    
+    # Every section derives from one vectorized pass over the fleet arrays
+    active, total_delay, route_idx, avg_delays = _scan_fleet(simulation)
+    avg_delay_reduction, fleet_utilization = _compute_delay_summary(active, total_delay, len(simulation.buses))
+    
     return ReportsData(
-        weekly_delay=weekly_delay,
-        fleet_status=fleet_status,
-        congestion_zones=congestion_data,
-        avg_delay_reduction=f"{reduction:.0f}%",
-        fleet_utilization=f"{utilization:.1f}%",
-        routes_optimized=len(route_delays),
+        weekly_delay=WEEKLY_DELAY,
+        fleet_status=_compute_fleet_status(active),
+        congestion_zones=_compute_congestion(simulation.route_ids, route_idx, avg_delays),
+        avg_delay_reduction=avg_delay_reduction,
+        fleet_utilization=fleet_utilization,
+        routes_optimized=len(route_idx),
         passengers_served="2.4M"  # Could be calculated from booking data
     )
@@ -0,0 +1,143 @@
+"""
+Mistral Batch API for non-interactive recommendation regeneration.
+
+Scheduled passes over the fleet don't need an answer within a request, so
+they go through a batch job (cheaper than per-request chat completions and
+no per-call HTTP overhead). Interactive requests keep using the chat API.
+"""
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services.ai_service import (
+    get_client,
+    recommendation_inputs_batch,
+    recommendation_messages,
+    parse_recommendation,
+    store_batch_recommendations
+)
+
+BATCH_MODEL = "mistral-tiny"
+BATCH_POLL_INTERVAL = 30  # seconds between job status checks
+BATCH_TIMEOUT = 1500  # give up on a job after 25 minutes (refresh runs every 30)
+
+# Job states after which the job won't change any more
+_TERMINAL_STATUSES = frozenset({"SUCCESS", "FAILED", "TIMEOUT_EXCEEDED", "CANCELLED"})
+
+
+def _build_batch_file(items: List[Tuple[str, Dict]]) -> bytes:
+    """Build the JSONL input file; custom_id is the item's index in items."""
+    lines = []
+    inputs = recommendation_inputs_batch(items)
+    for i, ((route_id, _), (delay, utilization, status, speed, demand, is_anomaly)) in enumerate(zip(items, inputs)):
+        lines.append(json.dumps({
+            "custom_id": str(i),
+            "body": {
+                "messages": recommendation_messages(route_id, delay, utilization, status, speed, demand, is_anomaly)
+            }
+        }))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def submit_recommendation_batch(items: List[Tuple[str, Dict]]) -> Optional[str]:
+    """
+    Upload recommendation prompts for (route_id, bus_state) items and start a
+    batch job. Returns the job id, or None if Mistral isn't configured.
+    """
+    client = get_client()
+    if not client or not items:
+        return None
+
+    # Building inputs runs ML predictions; keep it off the event loop
+    content = await asyncio.to_thread(_build_batch_file, items)
+
+    batch_file = await client.files.upload_async(
+        file={"file_name": "recommendations.jsonl", "content": content},
+        purpose="batch"
+    )
+    job = await client.batch.jobs.create_async(
+        input_files=[batch_file.id],
+        model=BATCH_MODEL,
+        endpoint="/v1/chat/completions",
+        metadata={"job_type": "recommendations"}
+    )
+    return job.id
+
+
+async def wait_for_batch(job_id: str, timeout: float = BATCH_TIMEOUT):
+    """Poll a batch job until it finishes. Returns the job, or None on timeout."""
+    client = get_client()
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await client.batch.jobs.get_async(job_id=job_id)
+        if job.status in _TERMINAL_STATUSES:
+            return job
+        if time.monotonic() >= deadline:
+            return None
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+
+
+async def cancel_batch(job_id: str):
+    """Ask Mistral to cancel a batch job; failures are only logged."""
+    try:
+        await get_client().batch.jobs.cancel_async(job_id=job_id)
+    except Exception as e:
+        print(f"Failed to cancel recommendation batch {job_id}: {e}")
+
+
+async def fetch_batch_results(job) -> Dict[str, Dict]:
+    """Download a finished job's output. Returns custom_id -> recommendation."""
+    if not job.output_file:
+        return {}
+
+    response = await get_client().files.download_async(file_id=job.output_file)
+    output = await response.aread()
+
+    results = {}
+    for line in output.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            reply = entry.get("response") or {}
+            if reply.get("status_code") != 200:
+                continue
+            content = reply["body"]["choices"][0]["message"]["content"]
+            results[entry["custom_id"]] = parse_recommendation(content)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"Skipping unparseable batch result: {e}")
+
+    return results
+
+
+async def regenerate_recommendations_batch(items: List[Tuple[str, Dict]]) -> int:
+    """
+    Regenerate recommendations for (route_id, bus_state) items, one per route,
+    with one batch job and publish them per route (get_batch_recommendation).
+    Returns how many were published; 0 if Mistral isn't configured.
+    Raises RuntimeError if the job fails or doesn't finish in BATCH_TIMEOUT;
+    a timed-out or cancelled wait also cancels the job on Mistral.
+    """
+    job_id = await submit_recommendation_batch(items)
+    if job_id is None:
+        return 0
+
+    try:
+        job = await wait_for_batch(job_id)
+    except asyncio.CancelledError:
+        # Don't leave the job running (and billed) on Mistral's side
+        await asyncio.shield(cancel_batch(job_id))
+        raise
+    if job is None:
+        await cancel_batch(job_id)
+    if job is None or job.status != "SUCCESS":
+        status = job.status if job is not None else "TIMEOUT"
+        raise RuntimeError(f"Recommendation batch {job_id} did not succeed: {status}")
+
+    results = await fetch_batch_results(job)
+    store_batch_recommendations({
+        items[int(custom_id)][0]: rec_data for custom_id, rec_data in results.items()
+    })
+
+    return len(results)
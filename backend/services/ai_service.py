@@ -1,19 +1,30 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import functools
 import random
 from datetime import datetime, timedelta
 import os
-from mistralai import Mistral
+import threading
+import time
+import httpx
 import json
+import numpy as np
+from services.ml_kernels import detect_anomaly_vec
 
-# Initialize Mistral Client
-api_key = os.environ.get("MISTRAL_API_KEY")
-client = None
-
-if api_key:
+@functools.lru_cache(maxsize=1)
+def get_client():
+    """Mistral client, created on first use (None without MISTRAL_API_KEY)."""
+    api_key = os.environ.get("MISTRAL_API_KEY")
+    if not api_key:
+        return None
+    
     try:
-        client = Mistral(api_key=api_key)
+        from mistralai import Mistral
+        return Mistral(api_key=api_key)
     except Exception as e:
         print(f"Failed to initialize Mistral client: {e}")
+        return None
 
 # Import ML models
 try:
@@ -24,12 +35,80 @@ except ImportError as e:
     MODELS_AVAILABLE = False
     delay_model = demand_model = anomaly_model = None
 
+# Recommendation cache: (route_id, delay bucket, occupancy bucket, status,
+# speed bucket, hour) -> (expiry, rec). Delay and speed are bucketed in 5-unit
+# bins and occupancy in 10% bins; the text of a recommendation doesn't change
+# with noise inside a bucket. Only Mistral replies are cached, so a failed call
+# (mock fallback) is retried on the next request.
+RECOMMENDATION_CACHE_SIZE = 4096
+RECOMMENDATION_CACHE_TTL = 300
+_recommendation_cache: "OrderedDict[Tuple, Tuple[float, Dict]]" = OrderedDict()
+_recommendation_cache_lock = threading.Lock()  # Callers may run in the threadpool
+
+# Recommendations generated off the request path by the scheduler:
+# route_id -> rec for the route's most critical bus at the last refresh.
+# Replaced as a whole on every refresh.
+PRECOMPUTE_MAX_ROUTES = 20
+_precomputed_recommendations: Dict[str, Dict] = {}
+
+# Recommendations from the scheduled Mistral batch job: route_id -> (expiry, rec).
+# A job is submitted every 30 minutes and may take up to 25, so entries live
+# until the next job's results have had time to replace them. They take a whole
+# job to rebuild, so clear_recommendation_cache leaves them alone.
+BATCH_RECOMMENDATION_TTL = 3600
+_batch_recommendations: Dict[str, Tuple[float, Dict]] = {}
+
+# Concurrent Mistral requests allowed from the async path (API rate limits)
+MISTRAL_MAX_CONCURRENCY = 10
+_mistral_semaphore: Optional[asyncio.Semaphore] = None  # Created on first use, on the serving loop
+
+# Transient Mistral errors (timeouts, 429, 5xx) are retried with exponential
+# backoff (1s, 2s, ... capped at 8s, with jitter). After BREAKER_THRESHOLD failed
+# calls in a row the breaker opens and requests use the mock for BREAKER_COOLDOWN seconds.
+MISTRAL_MAX_ATTEMPTS = 3
+MISTRAL_BACKOFF_BASE = 1.0
+MISTRAL_BACKOFF_MAX = 8.0
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 60
+_breaker = {"failures": 0, "open_until": 0.0}
+_breaker_lock = threading.Lock()
+
+
+# Recommendation prompt. The instructions come first and never change, so every
+# request shares the same prefix (provider-side prompt caching); only the
+# metrics at the end vary.
+_PROMPT_TMPL = """You are an AI transport planning assistant for APSRTC.
+Generate a single actionable operational recommendation in JSON format with the following keys:
+- recommendation: A short action title (e.g. "Deploy Extra Bus")
+- reason: A concise explanation (max 1 sentence)
+- expected_impact: Quantitative impact (e.g. "Reduce delay by 10%")
+- confidence: A float between 0.0 and 1.0 representing confidence level.
+
+Do not output markdown code blocks. Just the JSON object.
+
+Analyze the following route metrics:
+- Route ID: {route_id}
+- Current Status: {status}
+- Current Predicted Delay: {delay:.1f} mins
+- Current Passenger Demand: {demand} pax
+- Bus Utilization: {utilization:.0f}%
+- Speed: {speed:.0f} km/h
+- Anomaly Detected: {anomaly}
+"""
+_YES_NO = ("No", "Yes")
+_JSON_DECODER = json.JSONDecoder()
+
+
+@functools.lru_cache(maxsize=2048)
+def _route_seed(route_id: str) -> int:
+    """Per-route seed for the mock predictions."""
+    return sum(map(ord, route_id))
+
 
 def predict_delay(route_id: str, bus_id: str, hour: int = None, day_of_week: int = None) -> float:
     """Predict delay using trained ML model or fallback to mock."""
     if MODELS_AVAILABLE and delay_model and delay_model.is_trained:
         # Use real ML model
-        from datetime import datetime
         now = datetime.now()
         hour = hour if hour is not None else now.hour
         day_of_week = day_of_week if day_of_week is not None else now.weekday()
@@ -40,11 +119,11 @@ def predict_delay(route_id: str, bus_id: str, hour: int = None, day_of_week: int
             day_of_week=day_of_week
         )
     else:
-        # Mock delay prediction for initial testing
-        base_delay = random.uniform(0, 15)
-        seed = sum(ord(c) for c in route_id)
-        random.seed(seed + datetime.now().hour)
-        return round(base_delay, 1)
+        # Mock delay prediction for initial testing (stable per route and hour;
+        # a local Random so the global RNG isn't reseeded)
+        hour = hour if hour is not None else datetime.now().hour
+        rng = random.Random(_route_seed(route_id) + hour)
+        return round(rng.uniform(0, 15), 1)
 
 
 def forecast_demand(route_id: str, time_slot: datetime = None) -> int:
@@ -68,6 +147,27 @@ def forecast_demand(route_id: str, time_slot: datetime = None) -> int:
         return random.randint(10, 40)  # Off-peak
 
 
+def forecast_demand_batch(route_ids: List[str], time_slot: datetime = None) -> np.ndarray:
+    """Forecast demand for many routes at one time slot in one model call."""
+    time_slot = time_slot or datetime.now()
+    n = len(route_ids)
+    
+    if n == 0:
+        return np.zeros(0, dtype=int)
+    
+    if MODELS_AVAILABLE and demand_model and demand_model.is_trained:
+        # Use real ML model
+        return demand_model.predict_batch(
+            route_ids,
+            np.full(n, time_slot.hour),
+            np.full(n, time_slot.weekday()),
+            np.full(n, time_slot.month)
+        )
+    else:
+        # Same mock ranges as forecast_demand
+        return np.array([forecast_demand(route_id, time_slot) for route_id in route_ids], dtype=int)
+
+
 def detect_anomaly(occupancy: float, delay: float, speed: float) -> bool:
     """Detect anomalies using trained ML model or rule-based fallback."""
     if MODELS_AVAILABLE and anomaly_model and anomaly_model.is_trained:
@@ -78,112 +178,373 @@ def detect_anomaly(occupancy: float, delay: float, speed: float) -> bool:
         return occupancy > 95 or delay > 30 or speed < 5
 
 
-def generate_ai_recommendations(route_id: str, bus_state: Optional[Dict] = None) -> Dict:
+# Anomaly reason bits: 1 = overcrowding, 2 = critical delay, 4 = stalled.
+# ANOMALY_REASONS[code] is the display text for every bit combination.
+_REASON_BITS = ((1, "overcrowding"), (2, "critical delay"), (4, "stalled"))
+ANOMALY_REASONS = tuple(
+    ", ".join(label for bit, label in _REASON_BITS if code & bit) or "statistical anomaly"
+    for code in range(8)
+)
+
+
+def anomaly_reason_codes(metrics: np.ndarray) -> np.ndarray:
+    """Threshold reason bitmask for an (N, 3) array of occupancy, delay, speed rows."""
+    return (
+        (metrics[:, 0] > 95).astype(np.int8)
+        | ((metrics[:, 1] > 30).astype(np.int8) << 1)
+        | ((metrics[:, 2] < 5).astype(np.int8) << 2)
+    )
+
+
+def detect_anomaly_batch(metrics: np.ndarray) -> np.ndarray:
     """
-    Generate recommendation using Mistral AI if available, otherwise fallback to mock.
-    Enhanced with real ML predictions.
+    Detect anomalies for many buses in one call.
+    
+    Args:
+        metrics: (N, 3) array of occupancy, delay, speed rows
+    
+    Returns:
+        Boolean mask of length N (True = anomaly)
     """
+    if len(metrics) == 0:
+        return np.zeros(0, dtype=bool)
+    
+    if MODELS_AVAILABLE and anomaly_model and anomaly_model.is_trained:
+        # Use real ML model
+        return anomaly_model.detect_batch(metrics)
+    else:
+        # Rule-based fallback
+        out = np.empty(len(metrics), dtype=bool)
+        detect_anomaly_vec(metrics[:, 0], metrics[:, 1], metrics[:, 2], out)
+        return out
+
+
+def _bus_metrics(route_id: str, bus_state: Optional[Dict]) -> Tuple[float, float, str, float]:
+    """(delay, utilization, status, speed) from the bus state, or predicted/mock values without one."""
     # Get real predictions if available
     if bus_state:
-        delay = bus_state.get("delay", 0)
-        utilization = bus_state.get("occupancy", 50)
-        status = bus_state.get("status", "on-time")
-        speed = bus_state.get("speed", 40)
-    else:
-        delay = predict_delay(route_id, "BUS-000")
-        utilization = random.randint(40, 95)
-        status = "unknown"
-        speed = 40
-        
+        return (
+            bus_state.get("delay", 0),
+            bus_state.get("occupancy", 50),
+            bus_state.get("status", "on-time"),
+            bus_state.get("speed", 40)
+        )
+    return predict_delay(route_id, "BUS-000"), random.randint(40, 95), "unknown", 40
+
+
+def _recommendation_inputs(route_id: str, bus_state: Optional[Dict] = None) -> Tuple[float, float, str, float, int, bool]:
+    """
+    Gather the metrics a recommendation is based on, using real ML predictions.
+    Returns (delay, utilization, status, speed, demand, is_anomaly).
+    """
+    delay, utilization, status, speed = _bus_metrics(route_id, bus_state)
     demand = forecast_demand(route_id, datetime.now())
     
     # Detect anomaly
     is_anomaly = detect_anomaly(utilization, delay, speed)
     
-    if not client:
-        return _mock_recommendation(route_id, bus_state, is_anomaly)
+    return delay, utilization, status, speed, demand, is_anomaly
 
-    try:
-        prompt = f"""
-        You are an AI transport planning assistant for APSRTC.
-        Analyze the following route metrics:
-        - Route ID: {route_id}
-        - Current Status: {status}
-        - Current Predicted Delay: {delay:.1f} mins
-        - Current Passenger Demand: {demand} pax
-        - Bus Utilization: {utilization:.0f}%
-        - Speed: {speed:.0f} km/h
-        - Anomaly Detected: {'Yes' if is_anomaly else 'No'}
-
-        Generate a single actionable operational recommendation in JSON format with the following keys:
-        - recommendation: A short action title (e.g. "Deploy Extra Bus")
-        - reason: A concise explanation (max 1 sentence)
-        - expected_impact: Quantitative impact (e.g. "Reduce delay by 10%")
-        - confidence: A float between 0.0 and 1.0 representing confidence level.
-
-        Do not output markdown code blocks. Just the JSON object.
-        """
-
-        response = client.chat.complete(
-            model="mistral-tiny",
-            messages=[{"role": "user", "content": prompt}]
-        )
 
-        content = response.choices[0].message.content
-        # Clean up code blocks if present
-        if "```json" in content:
-            content = content.replace("```json", "").replace("```", "")
-        
-        rec_data = json.loads(content)
-        # Ensure status field is present (default to "pending" if not)
-        if "status" not in rec_data:
-            rec_data["status"] = "pending"
+def recommendation_inputs_batch(items: List[Tuple[str, Optional[Dict]]]) -> List[Tuple[float, float, str, float, int, bool]]:
+    """_recommendation_inputs for (route_id, bus_state) items, with one demand and one anomaly call for all of them."""
+    if not items:
+        return []
+    
+    metrics = [_bus_metrics(route_id, bus_state) for route_id, bus_state in items]
+    demands = forecast_demand_batch([route_id for route_id, _ in items], datetime.now()).tolist()
+    anomalies = detect_anomaly_batch(np.array(
+        [(utilization, delay, speed) for delay, utilization, _, speed in metrics], dtype=np.float64
+    )).tolist()
+    
+    return [
+        (delay, utilization, status, speed, demand, is_anomaly)
+        for (delay, utilization, status, speed), demand, is_anomaly in zip(metrics, demands, anomalies)
+    ]
+
+
+def recommendation_messages(route_id: str, delay: float, utilization: float, status: str,
+                            speed: float, demand: int, is_anomaly: bool) -> List[Dict]:
+    """Build the Mistral chat messages for one route."""
+    prompt = _PROMPT_TMPL.format_map({
+        "route_id": route_id,
+        "status": status,
+        "delay": delay,
+        "demand": demand,
+        "utilization": utilization,
+        "speed": speed,
+        "anomaly": _YES_NO[bool(is_anomaly)]
+    })
+    return [{"role": "user", "content": prompt}]
+
+
+def parse_recommendation(content: str) -> Dict:
+    """Parse a Mistral reply into a recommendation dict."""
+    # Decode the first JSON object in place; code fences or text around it are ignored
+    start = content.find("{")
+    if start < 0:
+        raise ValueError("No JSON object in reply")
+    
+    rec_data = _JSON_DECODER.raw_decode(content, start)[0]
+    # Ensure status field is present (default to "pending" if not)
+    if "status" not in rec_data:
+        rec_data["status"] = "pending"
+    
+    return rec_data
+
+
+def _is_retryable(e: Exception) -> bool:
+    """Timeouts, connection errors, rate limits and server errors are worth retrying."""
+    if isinstance(e, httpx.TransportError):
+        return True
+    status_code = getattr(e, "status_code", None)
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retry number attempt + 1."""
+    return min(MISTRAL_BACKOFF_BASE * 2 ** attempt, MISTRAL_BACKOFF_MAX) * random.uniform(0.5, 1.0)
+
+
+def _breaker_open() -> bool:
+    return time.monotonic() < _breaker["open_until"]
+
+
+def _record_mistral_result(success: bool):
+    """Track consecutive failed calls; open the breaker after BREAKER_THRESHOLD."""
+    with _breaker_lock:
+        if success:
+            _breaker["failures"] = 0
+            return
         
-        return rec_data
+        _breaker["failures"] += 1
+        if _breaker["failures"] >= BREAKER_THRESHOLD:
+            _breaker["open_until"] = time.monotonic() + BREAKER_COOLDOWN
+            _breaker["failures"] = 0
+            print(f"⚠️ Mistral unavailable, using mock recommendations for {BREAKER_COOLDOWN}s")
+
+
+async def _call_mistral_async(messages: List[Dict]):
+    """Async chat completion with retries; the semaphore isn't held while backing off."""
+    global _mistral_semaphore
+    
+    if _mistral_semaphore is None:
+        _mistral_semaphore = asyncio.Semaphore(MISTRAL_MAX_CONCURRENCY)
+    
+    for attempt in range(MISTRAL_MAX_ATTEMPTS):
+        try:
+            async with _mistral_semaphore:
+                return await get_client().chat.complete_async(model="mistral-tiny", messages=messages)
+        except Exception as e:
+            if attempt == MISTRAL_MAX_ATTEMPTS - 1 or not _is_retryable(e):
+                raise
+        await asyncio.sleep(_backoff_delay(attempt))
 
+
+async def _generate_recommendation_async(route_id: str, bus_state: Optional[Dict] = None) -> Tuple[Dict, bool]:
+    """
+    Generate a recommendation with the async Mistral client, falling back to a mock.
+    Returns (rec_data, cacheable); mock fallbacks after an API error aren't cacheable.
+    """
+    # ML predictions are blocking; keep them off the event loop
+    delay, utilization, status, speed, demand, is_anomaly = await asyncio.to_thread(
+        _recommendation_inputs, route_id, bus_state
+    )
+    
+    if not get_client():
+        return _mock_recommendation(route_id, bus_state, is_anomaly), True
+    
+    if _breaker_open():
+        return _mock_recommendation(route_id, bus_state, is_anomaly), False
+    
+    try:
+        response = await _call_mistral_async(
+            recommendation_messages(route_id, delay, utilization, status, speed, demand, is_anomaly)
+        )
     except Exception as e:
         print(f"Mistral API Error: {e}")
-        return _mock_recommendation(route_id, bus_state, is_anomaly)
+        _record_mistral_result(False)
+        return _mock_recommendation(route_id, bus_state, is_anomaly), False
+    
+    _record_mistral_result(True)
+    try:
+        return parse_recommendation(response.choices[0].message.content), True
+    except Exception as e:
+        print(f"Unparseable Mistral reply: {e}")
+        return _mock_recommendation(route_id, bus_state, is_anomaly), False
+
+
+def _recommendation_cache_key(route_id: str, bus_state: Dict) -> Tuple:
+    """Cache key: route plus bus state discretized into buckets."""
+    return (
+        route_id,
+        int(bus_state.get("delay", 0) // 5),
+        int(bus_state.get("occupancy", 50) // 10),
+        bus_state.get("status", "on-time"),
+        int(bus_state.get("speed", 40) // 5),
+        datetime.now().hour  # Demand forecast in the prompt depends on the hour
+    )
+
+
+def _recommendation_cache_get(key: Tuple) -> Optional[Dict]:
+    """Return a copy of a live cached recommendation, or None."""
+    with _recommendation_cache_lock:
+        cached = _recommendation_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            _recommendation_cache.move_to_end(key)
+            return dict(cached[1])
+    return None
+
+
+def _recommendation_cache_put(key: Tuple, rec_data: Dict):
+    """Store a recommendation, evicting the least recently used entries."""
+    with _recommendation_cache_lock:
+        _recommendation_cache[key] = (time.monotonic() + RECOMMENDATION_CACHE_TTL, rec_data)
+        _recommendation_cache.move_to_end(key)
+        while len(_recommendation_cache) > RECOMMENDATION_CACHE_SIZE:
+            _recommendation_cache.popitem(last=False)
+
+
+async def _get_recommendation_async(route_id: str, bus_state: Dict) -> Tuple[Dict, bool]:
+    """Cached or freshly generated recommendation (a copy) and whether it is cacheable."""
+    key = _recommendation_cache_key(route_id, bus_state)
+    cached = _recommendation_cache_get(key)
+    if cached is not None:
+        return cached, True
+    
+    rec_data, cacheable = await _generate_recommendation_async(route_id, bus_state)
+    if cacheable:
+        _recommendation_cache_put(key, rec_data)
+    return dict(rec_data), cacheable
+
+
+async def get_cached_recommendation_async(route_id: str, bus_state: Dict) -> Dict:
+    """
+    Recommendation memoized on discretized bus state, generating misses with
+    the async Mistral client. Returns a copy, so callers may modify the result.
+    """
+    return (await _get_recommendation_async(route_id, bus_state))[0]
+
+
+async def precompute_recommendations(buses: List) -> int:
+    """
+    Generate recommendations for the most critical bus of each route (buses
+    ordered most severe first, at most PRECOMPUTE_MAX_ROUTES routes) and publish
+    them for get_precomputed_recommendation. Returns how many were published.
+    """
+    global _precomputed_recommendations
+    
+    per_route = {}
+    for bus in buses:
+        if len(per_route) >= PRECOMPUTE_MAX_ROUTES:
+            break
+        per_route.setdefault(bus.route.route_id, {
+            "delay": bus.delay_minutes,
+            "occupancy": bus.occupancy,
+            "status": bus.status,
+            "speed": bus.speed
+        })
+    
+    results = await asyncio.gather(*[
+        _get_recommendation_async(route_id, bus_state)
+        for route_id, bus_state in per_route.items()
+    ], return_exceptions=True)
+    
+    # Mock fallbacks after an API error aren't published; those routes are
+    # generated live until the next refresh
+    precomputed = {}
+    for route_id, result in zip(per_route, results):
+        if isinstance(result, Exception):
+            print(f"Error precomputing recommendation for route {route_id}: {result}")
+            continue
+        rec_data, cacheable = result
+        if cacheable:
+            precomputed[route_id] = rec_data
+    
+    _precomputed_recommendations = precomputed
+    return len(precomputed)
+
+
+def get_precomputed_recommendation(route_id: str) -> Optional[Dict]:
+    """Copy of the route's precomputed recommendation, or None."""
+    rec_data = _precomputed_recommendations.get(route_id)
+    return dict(rec_data) if rec_data is not None else None
+
+
+def store_batch_recommendations(recs: Dict[str, Dict]):
+    """Publish route_id -> rec results of a batch job for get_batch_recommendation."""
+    global _batch_recommendations
+    
+    # Routes missing from this job keep their previous result until it expires
+    now = time.monotonic()
+    live = {route_id: entry for route_id, entry in _batch_recommendations.items() if entry[0] > now}
+    live.update((route_id, (now + BATCH_RECOMMENDATION_TTL, rec_data)) for route_id, rec_data in recs.items())
+    _batch_recommendations = live
+
+
+def get_batch_recommendation(route_id: str) -> Optional[Dict]:
+    """Copy of the route's recommendation from the last batch job, or None if none is live."""
+    entry = _batch_recommendations.get(route_id)
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    return dict(entry[1])
+
+
+def clear_recommendation_cache():
+    """
+    Drop all cached recommendations (e.g. after features are recomputed).
+    Precomputed and batch recommendations are kept; they are replaced when
+    the next precompute or batch run finishes.
+    """
+    with _recommendation_cache_lock:
+        _recommendation_cache.clear()
+
+
+# Mock recommendation options per condition: (recommendations, reason templates)
+_MOCK_ANOMALY = (("Immediate inspection required",), ("Anomaly detected in bus operations",))
+_MOCK_DELAY = (  # by delay bucket: <= 10, > 10, > 20 mins
+    ((), ()),
+    (("Adjust dwell time at major stops", "Skip non-essential stops"), ("Minor delay of {delay:.0f} mins accumulating",)),
+    (("Deploy backup bus immediately", "Short-terminate trip and turn back"), ("Critical delay of {delay:.0f} mins detected",)),
+)
+_MOCK_OCCUPANCY = (  # by occupancy bucket: normal, < 20%, > 90%
+    ((), ()),
+    (("Merge with following schedule",), ("Low utilization detected",)),
+    (("Dispatch reliever bus",), ("Extreme overcrowding detected",)),
+)
+_MOCK_DEFAULT = (("Maintain current headway",), ("Routine schedule optimization",))
+
+
+def _build_mock_table() -> Dict[Tuple[bool, int, int], Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+    """Options for every (is_anomaly, delay bucket, occupancy bucket), built once."""
+    table = {}
+    for is_anomaly in (False, True):
+        for delay_bucket, (delay_recs, delay_reasons) in enumerate(_MOCK_DELAY):
+            for occ_bucket, (occ_recs, occ_reasons) in enumerate(_MOCK_OCCUPANCY):
+                recs = (_MOCK_ANOMALY[0] if is_anomaly else ()) + delay_recs + occ_recs
+                reasons = (_MOCK_ANOMALY[1] if is_anomaly else ()) + delay_reasons + occ_reasons
+                table[(is_anomaly, delay_bucket, occ_bucket)] = (recs, reasons) if reasons else _MOCK_DEFAULT
+    return table
+
+
+_MOCK_RECS = _build_mock_table()
 
 
 def _mock_recommendation(route_id: str, bus_state: Optional[Dict] = None, is_anomaly: bool = False) -> Dict:
     """Fallback mock recommendation with anomaly awareness."""
-    reasons = []
-    rec_list = []
-    
     delay = bus_state.get("delay", 0) if bus_state else 0
     occ = bus_state.get("occupancy", 0) if bus_state else 0
     
-    if is_anomaly:
-        reasons.append("Anomaly detected in bus operations")
-        rec_list.append("Immediate inspection required")
-    
-    if delay > 20:
-        reasons.append(f"Critical delay of {delay:.0f} mins detected")
-        rec_list.append("Deploy backup bus immediately")
-        rec_list.append("Short-terminate trip and turn back")
-    elif delay > 10:
-        reasons.append(f"Minor delay of {delay:.0f} mins accumulating")
-        rec_list.append("Adjust dwell time at major stops")
-        rec_list.append("Skip non-essential stops")
-    
-    if occ > 90:
-        reasons.append("Extreme overcrowding detected")
-        rec_list.append("Dispatch reliever bus")
-    elif occ < 20:
-        reasons.append("Low utilization detected")
-        rec_list.append("Merge with following schedule")
-
-    # Defaults if no specific issues
-    if not reasons:
-        reasons.append("Routine schedule optimization")
-        rec_list.append("Maintain current headway")
+    rec_list, reasons = _MOCK_RECS[(
+        bool(is_anomaly),
+        2 if delay > 20 else 1 if delay > 10 else 0,
+        2 if occ > 90 else 1 if occ < 20 else 0
+    )]
 
     return {
         "recommendation": random.choice(rec_list),
-        "reason": random.choice(reasons),
+        "reason": random.choice(reasons).format(delay=delay),
         "expected_impact": f"Reduce delay by {random.randint(10, 30)}%",
         "confidence": round(random.uniform(0.7, 0.99), 2),
         "status": "pending"
     }
-
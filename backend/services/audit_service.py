@@ -2,24 +2,117 @@
 Audit logging service for tracking system events and user actions.
 Logs stored in JSON files for local compliance.
 """
-import json
+import asyncio
+import atexit
 import os
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set, Tuple
 from pathlib import Path
 
-# Audit log file
+import orjson
+
+# Audit logs, one JSONL file per day (backend/data/audit/YYYY-MM-DD.jsonl)
+AUDIT_LOG_DIR = "backend/data/audit"
+# Single file used before daily partitioning - still read as the oldest entries
 AUDIT_LOG_FILE = "backend/data/audit_log.jsonl"
+AUDIT_LOG_BUFFER_SIZE = 1 << 16
+AUDIT_FSYNC_INTERVAL = 1.0  # fsync at most once per second
+AUDIT_TAIL_BLOCK_SIZE = 1 << 16  # get_audit_logs reads the file backwards in 64KB blocks
+AUDIT_ERROR_REPORT_INTERVAL = 60.0  # report failed audit writes at most once a minute
+
+# Append handle kept open across writes (opened on first write, reopened each day)
+_log_file = None
+_log_date: Optional[str] = None
+_log_lock = threading.Lock()
+_last_fsync = 0.0
+
+# (epoch second, formatted "YYYY-MM-DDTHH:MM:SS") reused for events in the same second
+_timestamp_prefix = (None, "")
+
+# Usernames seen in each log file: path -> (bytes indexed, usernames). Lets a
+# username-filtered query skip files the user has no events in. Today's file is
+# indexed incrementally; finished files are saved as <day>.users.json sidecars.
+_username_index: Dict[str, Tuple[int, Set[str]]] = {}
 
 
 def ensure_audit_log():
-    """Ensure audit log file exists."""
-    os.makedirs(os.path.dirname(AUDIT_LOG_FILE), exist_ok=True)
+    """Ensure the audit log directory exists."""
+    os.makedirs(AUDIT_LOG_DIR, exist_ok=True)
+
+
+def _current_log_path(day: str) -> str:
+    """Log file for a YYYY-MM-DD day."""
+    return os.path.join(AUDIT_LOG_DIR, f"{day}.jsonl")
+
+
+def _log_files_newest_first(start_date: Optional[datetime], end_date: Optional[datetime]) -> List[str]:
+    """Daily log files that can hold entries in the date range, newest first."""
+    start_day = start_date.date() if start_date else None
+    end_day = end_date.date() if end_date else None
+    
+    files = []
+    for path in Path(AUDIT_LOG_DIR).glob("*.jsonl"):
+        try:
+            day = datetime.strptime(path.stem, "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        
+        if (start_day and day < start_day) or (end_day and day > end_day):
+            continue
+        files.append((day, str(path)))
+    
+    files.sort(reverse=True)
+    paths = [path for _, path in files]
+    
+    if os.path.exists(AUDIT_LOG_FILE):
+        paths.append(AUDIT_LOG_FILE)
+    return paths
+
+
+def _username_sidecar(path: str) -> str:
+    return path[:-len(".jsonl")] + ".users.json"
+
+
+def _usernames_in(path: str) -> Set[str]:
+    """Usernames with events in a log file (only bytes not yet indexed are read)."""
+    size = os.path.getsize(path)
+    indexed, usernames = _username_index.get(path, (0, None))
+    closed = path != _current_log_path(time.strftime("%Y-%m-%d"))
     
-    if not os.path.exists(AUDIT_LOG_FILE):
-        # Create empty file
-        with open(AUDIT_LOG_FILE, 'w') as f:
+    if usernames is None and closed:
+        try:
+            with open(_username_sidecar(path), 'rb') as f:
+                usernames = set(orjson.loads(f.read()))
+            _username_index[path] = (size, usernames)
+            return usernames
+        except (OSError, ValueError):
             pass
+    
+    if usernames is None:
+        indexed, usernames = 0, set()
+    
+    if indexed < size:
+        with open(path, 'rb') as f:
+            f.seek(indexed)
+            data = f.read(size - indexed)
+        
+        # Only complete lines; a partly written last line is picked up next time
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].split(b'\n'):
+            if line.strip():
+                usernames.add(orjson.loads(line).get('username'))
+        _username_index[path] = (indexed + end, usernames)
+        
+        if closed:
+            try:
+                with open(_username_sidecar(path), 'wb') as f:
+                    f.write(orjson.dumps(sorted(u for u in usernames if u is not None)))
+            except OSError as e:
+                print(f"Error saving audit username index: {e}")
+    
+    return usernames
 
 
 def log_event(
@@ -43,10 +136,47 @@ def log_event(
         ip_address: Client IP address (optional)
         success: Whether the action succeeded
     """
-    ensure_audit_log()
+    line = orjson.dumps(_build_event(
+        event_type=event_type,
+        username=username,
+        action=action,
+        resource=resource,
+        details=details,
+        ip_address=ip_address,
+        success=success
+    ), option=orjson.OPT_APPEND_NEWLINE)
+    
+    # Queued for the background writer when it is running
+    if not audit_writer.submit_line(line):
+        _write_lines([line])
+
+
+def _format_timestamp(timestamp: float) -> str:
+    """Local ISO timestamp; the date/time part is formatted once per second."""
+    global _timestamp_prefix
+    
+    second = int(timestamp)
+    cached_second, prefix = _timestamp_prefix
+    if cached_second != second:
+        prefix = datetime.fromtimestamp(second).strftime("%Y-%m-%dT%H:%M:%S")
+        _timestamp_prefix = (second, prefix)
     
-    event = {
-        "timestamp": datetime.now().isoformat(),
+    return f"{prefix}.{int((timestamp - second) * 1_000_000):06d}"
+
+
+def _build_event(
+    event_type: str,
+    username: str,
+    action: str,
+    resource: str = None,
+    details: Dict = None,
+    ip_address: str = None,
+    success: bool = True,
+    timestamp: Optional[float] = None
+) -> Dict:
+    """Build an audit event record."""
+    return {
+        "timestamp": _format_timestamp(timestamp if timestamp is not None else time.time()),
         "event_type": event_type,
         "username": username,
         "action": action,
@@ -55,10 +185,71 @@ def log_event(
         "ip_address": ip_address,
         "success": success
     }
+
+
+def _write_lines(lines: List[bytes]):
+    """Append serialized events to the log file in a single write."""
+    global _log_file, _log_date, _last_fsync
+    
+    if not lines:
+        return
+    
+    with _log_lock:
+        # Switch to a new file at midnight
+        today = time.strftime("%Y-%m-%d")
+        if _log_file is not None and _log_date != today:
+            _log_file.flush()
+            os.fsync(_log_file.fileno())
+            _log_file.close()
+            _log_file = None
+        
+        if _log_file is None:
+            ensure_audit_log()
+            _log_file = open(_current_log_path(today), 'ab', buffering=AUDIT_LOG_BUFFER_SIZE)
+            _log_date = today
+        
+        # Append to log file (JSONL format - one JSON per line)
+        _log_file.write(b''.join(lines))
+        _log_file.flush()
+        
+        now = time.monotonic()
+        if now - _last_fsync >= AUDIT_FSYNC_INTERVAL:
+            os.fsync(_log_file.fileno())
+            _last_fsync = now
+
+
+def _write_events(events: List[Dict]):
+    """Append events to the log file in a single write."""
+    _write_lines([orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE) for event in events])
+
+
+def flush():
+    """Flush and fsync the audit log file."""
+    global _last_fsync
+    
+    with _log_lock:
+        if _log_file is not None and not _log_file.closed:
+            _log_file.flush()
+            os.fsync(_log_file.fileno())
+            _last_fsync = time.monotonic()
+
+
+def _iter_lines_reversed(f, block_size: int = AUDIT_TAIL_BLOCK_SIZE):
+    """Yield the lines of a binary file last to first, reading backwards in blocks."""
+    position = f.seek(0, os.SEEK_END)
+    remainder = b''
+    
+    while position > 0:
+        read_size = min(block_size, position)
+        position -= read_size
+        f.seek(position)
+        
+        lines = (f.read(read_size) + remainder).split(b'\n')
+        # The first piece may continue in the previous block
+        remainder = lines[0]
+        yield from reversed(lines[1:])
     
-    # Append to log file (JSONL format - one JSON per line)
-    with open(AUDIT_LOG_FILE, 'a') as f:
-        f.write(json.dumps(event) + '\n')
+    yield remainder
 
 
 def get_audit_logs(
@@ -79,48 +270,50 @@ def get_audit_logs(
         end_date: Filter by end date
     
     Returns:
-        List of audit log entries
+        List of audit log entries, most recent first
     """
-    ensure_audit_log()
-    
     logs = []
     
-    try:
-        with open(AUDIT_LOG_FILE, 'r') as f:
-            for line in f:
-                if not line.strip():
-                    continue
+    for path in _log_files_newest_first(start_date, end_date):
+        try:
+            # No events by this user in the file - skip parsing it
+            if username and username not in _usernames_in(path):
+                continue
+            
+            with open(path, 'rb') as f:
+                # Newest first, so we can stop as soon as we have enough
+                for line in _iter_lines_reversed(f):
+                    if not line.strip():
+                        continue
                     
-                log = json.loads(line)
-                
-                # Apply filters
-                if username and log.get('username') != username:
-                    continue
-                
-                if event_type and log.get('event_type') != event_type:
-                    continue
-                
-                if start_date:
-                    log_time = datetime.fromisoformat(log['timestamp'])
-                    if log_time < start_date:
+                    log = orjson.loads(line)
+                    
+                    # Apply filters
+                    if username and log.get('username') != username:
                         continue
-                
-                if end_date:
-                    log_time = datetime.fromisoformat(log['timestamp'])
-                    if log_time > end_date:
+                    
+                    if event_type and log.get('event_type') != event_type:
                         continue
-                
-                logs.append(log)
-                
-                # Limit results
-                if len(logs) >= limit:
-                    break
-        
-        # Return most recent first
-        return list(reversed(logs[-limit:]))
-        
-    except FileNotFoundError:
-        return []
+                    
+                    if start_date or end_date:
+                        log_time = datetime.fromisoformat(log['timestamp'])
+                        
+                        # Everything further back is older still
+                        if start_date and log_time < start_date:
+                            return logs
+                        
+                        if end_date and log_time > end_date:
+                            continue
+                    
+                    logs.append(log)
+                    
+                    # Limit results
+                    if len(logs) >= limit:
+                        return logs
+        except FileNotFoundError:
+            continue
+    
+    return logs
 
 
 def log_authentication(username: str, success: bool, ip_address: str = None):
@@ -180,5 +373,164 @@ def log_data_access(username: str, data_source: str, operation: str):
     )
 
 
+class AuditLogWriter:
+    """
+    Batches audit events off the request path.
+    
+    Callers enqueue a serialized line (or, for API access, a small tuple); a
+    background task drains the queue and writes each batch with one file
+    append in a worker thread.
+    """
+    
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 256, flush_interval: float = 0.5):
+        self.max_queue_size = max_queue_size
+        self.queue: Optional[asyncio.Queue] = None  # Created in run(), on the serving loop
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.running = False
+        self.dropped = 0
+        self.write_errors = 0
+        self._last_error: Optional[Exception] = None
+        self._last_error_report = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+    
+    def submit(self, username: str, endpoint: str, method: str, success: bool):
+        """Queue an API access event without blocking (dropped if the queue is full)."""
+        self._put((username, endpoint, method, success, time.time()))
+    
+    def submit_line(self, line: bytes) -> bool:
+        """
+        Queue a serialized event from any thread. Returns False when the writer
+        isn't running, in which case the caller writes it directly.
+        """
+        if not self.running:
+            return False
+        
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        
+        # asyncio.Queue isn't thread-safe; handlers in the threadpool hand off to the loop
+        if on_loop:
+            self._put(line)
+        else:
+            self._loop.call_soon_threadsafe(self._put, line)
+        return True
+    
+    def _take_batch(self, first=None) -> List:
+        """Collect up to batch_size queued entries without waiting."""
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+    
+    @staticmethod
+    def _write_batch(batch: List):
+        """Serialize API access tuples and write the whole batch at once."""
+        _write_lines([
+            item if isinstance(item, bytes) else orjson.dumps(_build_event(
+                event_type="api",
+                username=item[0],
+                action=f"{item[2]} {item[1]}",
+                resource=item[1],
+                success=item[3],
+                timestamp=item[4]
+            ), option=orjson.OPT_APPEND_NEWLINE)
+            for item in batch
+        ])
+    
+    def _report_dropped(self):
+        if self.dropped:
+            print(f"⚠️ Audit queue full, dropped {self.dropped} events")
+            self.dropped = 0
+    
+    def record_error(self, error: Exception, count: int = 1):
+        """
+        Count events that failed to be written; reported at most once per
+        AUDIT_ERROR_REPORT_INTERVAL instead of once per failure.
+        """
+        self.write_errors += count
+        self._last_error = error
+        self._maybe_report_errors()
+    
+    def _maybe_report_errors(self):
+        if time.monotonic() - self._last_error_report >= AUDIT_ERROR_REPORT_INTERVAL:
+            self._report_errors()
+    
+    def _report_errors(self):
+        if self.write_errors:
+            print(f"⚠️ Failed to write {self.write_errors} audit events (last error: {self._last_error})")
+            self.write_errors = 0
+            self._last_error_report = time.monotonic()
+    
+    async def run(self):
+        """Drain the queue until stopped."""
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._loop = asyncio.get_running_loop()
+        self.running = True
+        self._task = asyncio.current_task()
+        
+        while self.running:
+            try:
+                first = await asyncio.wait_for(self.queue.get(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                self._report_dropped()
+                self._maybe_report_errors()
+                continue
+            
+            batch = self._take_batch(first)
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                self.record_error(e, len(batch))
+            self._report_dropped()
+    
+    def drain(self):
+        """Write everything still queued (synchronously)."""
+        while self.queue is not None and not self.queue.empty():
+            self._write_batch(self._take_batch())
+        self._report_dropped()
+        self._report_errors()
+    
+    async def stop(self):
+        """Stop the writer and flush anything still queued."""
+        self.running = False
+        
+        # The drain loop notices within flush_interval and finishes its current write
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        self.drain()
+        flush()
+
+
+# Global audit writer instance
+audit_writer = AuditLogWriter()
+
+
+def _flush_at_exit():
+    """Write whatever is still queued or buffered when the process exits."""
+    try:
+        audit_writer.drain()
+        flush()
+    except Exception as e:
+        print(f"Error flushing audit log: {e}")
+
+
+atexit.register(_flush_at_exit)
+
+
 # Initialize on import
 ensure_audit_log()
@@ -1,22 +1,67 @@
 """
-Simple local authentication service for testing.
-NO PASSWORD HASHING - FOR DEVELOPMENT ONLY!
+Simple local authentication service.
+Passwords are stored as bcrypt hashes; plain-text records (the default users)
+are hashed on their first successful login.
 """
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from jose import JWTError, jwt
+from passlib.context import CryptContext
+import base64
+import hashlib
+import hmac
 import json
 import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
 
 # Security configuration
 SECRET_KEY = "apsrtc-dev-secret-key-change-in-production"
+SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")  # Encoded once, not per encode/decode
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
 
-# User database file
+# Password hashing (bcrypt, verified in C in constant time)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Fields never returned to API callers
+_SECRET_FIELDS = ("password", "password_hash")
+
+# Decode settings built once: algorithm whitelist and required claims,
+# so a single jwt.decode both verifies the signature and the claims.
+ALLOWED_ALGORITHMS = [ALGORITHM]
+DECODE_OPTIONS = {"require_sub": True, "require_exp": True}
+
+# Claims the HS256 fast path does not validate; such tokens go through python-jose
+_FAST_PATH_UNSUPPORTED_CLAIMS = frozenset({"aud", "iss", "nbf", "iat", "jti", "at_hash"})
+
+# Returned by the fast path when the token needs full python-jose validation
+_USE_JOSE = object()
+
+# Access token lifetime in seconds ("exp" is an integer timestamp)
+ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+# User database: a snapshot plus an append-only log of changes since it was
+# written (one JSON line per change, replayed on load). The log is folded into
+# a new snapshot after USERS_WAL_COMPACT_AT changes.
 USERS_FILE = "backend/data/users.json"
+USERS_WAL_FILE = "backend/data/users.wal"
+USERS_WAL_COMPACT_AT = 100
 
-# Default users (plain text passwords - FOR TESTING ONLY!)
+# Parsed users, reparsed only when the snapshot or log changes on disk.
+# Mutations update it immediately and are written behind the caller by a
+# single writer thread (so writes stay in order).
+_users_cache: Optional[Dict] = None
+_users_version: Tuple[float, float] = (0.0, 0.0)  # (snapshot mtime, log mtime)
+_wal_entries = 0
+_users_lock = threading.Lock()
+_users_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="users-writer")
+
+# Default users (plain text passwords, hashed on first login - FOR TESTING ONLY!)
 DEFAULT_USERS = {
     "admin": {
         "username": "admin",
@@ -62,83 +107,272 @@ def ensure_users_file():
     os.makedirs(os.path.dirname(USERS_FILE), exist_ok=True)
     
     if not os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'w') as f:
-            json.dump(DEFAULT_USERS, f, indent=2)
+        with open(USERS_FILE, 'wb') as f:
+            f.write(orjson.dumps(DEFAULT_USERS, option=orjson.OPT_INDENT_2))
         
         print(f"✓ Created default users file at {USERS_FILE}")
         print("  Default users: admin, planner, control_room, depot")
         print("  Default password for all: <username>123")
 
 
+def _users_files_version() -> Tuple[float, float]:
+    """(snapshot mtime, log mtime); the log mtime is 0 when there is no log."""
+    try:
+        wal_mtime = os.path.getmtime(USERS_WAL_FILE)
+    except OSError:
+        wal_mtime = 0.0
+    return os.path.getmtime(USERS_FILE), wal_mtime
+
+
+def _apply_patch(user: Dict, patch: Dict):
+    """Update a user record; a None value removes the field."""
+    user.update(patch)
+    for field in [k for k, v in patch.items() if v is None]:
+        del user[field]
+
+
+def _public_user(user: Dict) -> Dict:
+    """Copy of a user record without password fields."""
+    return {k: v for k, v in user.items() if k not in _SECRET_FIELDS}
+
+
+def hash_password(password: str) -> str:
+    """Hash a password for storage."""
+    return pwd_context.hash(password)
+
+
+def _verify_password(user: Dict, password: str) -> bool:
+    """Check a password against a user's hash (or legacy plain-text password)."""
+    password_hash = user.get("password_hash")
+    if password_hash:
+        return pwd_context.verify(password, password_hash)
+    
+    stored = user.get("password")
+    return stored is not None and hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8"))
+
+
+def _replay_wal(users: Dict) -> int:
+    """Apply the change log to a snapshot in place. Returns the number of entries."""
+    entries = 0
+    try:
+        with open(USERS_WAL_FILE, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                change = orjson.loads(line)
+                username, patch = change["username"], change["patch"]
+                if patch is None:
+                    users.pop(username, None)
+                elif username in users:
+                    _apply_patch(users[username], patch)
+                else:
+                    users[username] = patch
+                entries += 1
+    except FileNotFoundError:
+        pass
+    return entries
+
+
 def load_users() -> Dict:
-    """Load users from JSON file."""
-    ensure_users_file()
+    """Load users (cached; the files are only reparsed after they change)."""
+    global _users_cache, _users_version, _wal_entries
     
     try:
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
+        version = _users_files_version()
+    except OSError:
+        ensure_users_file()
+        version = _users_files_version()
+    
+    with _users_lock:
+        if _users_cache is not None and version == _users_version:
+            return _users_cache
+        
+        try:
+            with open(USERS_FILE, 'rb') as f:
+                users = orjson.loads(f.read())
+            _wal_entries = _replay_wal(users)
+            _users_cache = users
+            _users_version = version
+        except Exception as e:
+            print(f"Error loading users: {e}")
+            return DEFAULT_USERS.copy()
+        
+        return _users_cache
+
+
+def _mark_written():
+    """Record the files' new mtimes so our own writes don't trigger a reparse."""
+    global _users_version
+    with _users_lock:
+        _users_version = _users_files_version()
+
+
+def _write_users_snapshot(content: bytes):
+    """Atomically replace the snapshot and clear the log (runs on the writer thread)."""
+    try:
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(USERS_FILE), suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, USERS_FILE)
+        
+        # Every logged change is in the new snapshot
+        if os.path.exists(USERS_WAL_FILE):
+            os.remove(USERS_WAL_FILE)
+        _mark_written()
     except Exception as e:
-        print(f"Error loading users: {e}")
-        return DEFAULT_USERS.copy()
+        print(f"Error saving users: {e}")
+
 
+def _append_wal(line: bytes):
+    """Append one change to the log (runs on the writer thread)."""
+    try:
+        with open(USERS_WAL_FILE, 'ab') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        _mark_written()
+    except Exception as e:
+        print(f"Error saving user change: {e}")
 
-def save_users(users: Dict):
-    """Save users to JSON file."""
-    ensure_users_file()
+
+def append_user_change(username: str, patch: Optional[Dict]):
+    """
+    Record a change to one user (already applied to the cached users) without
+    rewriting the whole file.
+    
+    Args:
+        username: User that changed
+        patch: Changed fields (the full record for a new user), or None for a deletion
+    """
+    global _wal_entries
     
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
+    with _users_lock:
+        _wal_entries += 1
+        if _wal_entries >= USERS_WAL_COMPACT_AT and _users_cache is not None:
+            # Fold the log into a fresh snapshot instead
+            _wal_entries = 0
+            content = orjson.dumps(_users_cache, option=orjson.OPT_INDENT_2)
+            _users_writer.submit(_write_users_snapshot, content)
+            return
+        
+        line = orjson.dumps({"username": username, "patch": patch}, option=orjson.OPT_APPEND_NEWLINE)
+    
+    _users_writer.submit(_append_wal, line)
 
 
 def get_user(username: str) -> Optional[Dict]:
     """Get user by username."""
-    users = load_users()
-    return users.get(username)
+    return load_users().get(username)
 
 
 def authenticate_user(username: str, password: str) -> Optional[Dict]:
-    """Authenticate a user (plain text password for testing)."""
+    """Authenticate a user (blocking: bcrypt is deliberately slow)."""
     user = get_user(username)
     
     if not user:
         return None
     
-    # Simple plain text password check (FOR TESTING ONLY!)
-    if user.get("password") != password:
+    if not _verify_password(user, password):
         return None
     
     if user.get("disabled", False):
         return None
     
+    # Replace a plain-text password with its hash now that we know it
+    if "password_hash" not in user:
+        update_user(username, {"password": password})
+    
     return user
 
 
+def _b64url_encode(data: bytes) -> str:
+    """Encode bytes as an unpadded base64url JWT segment."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+# Header segment is identical for every token, so it is encoded once
+_HS256_HEADER_SEGMENT = _b64url_encode(b'{"alg":"HS256","typ":"JWT"}')
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """Create a JWT access token."""
+    """Create a JWT access token (HS256, signed with one HMAC pass)."""
     to_encode = data.copy()
     
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    lifetime = int(expires_delta.total_seconds()) if expires_delta else ACCESS_TOKEN_EXPIRE_SECONDS
+    to_encode["exp"] = int(time.time()) + lifetime
     
-    to_encode.update({"exp": expire})
+    try:
+        payload_segment = _b64url_encode(json.dumps(to_encode, separators=(",", ":")).encode("utf-8"))
+    except TypeError:
+        # Claims json can't serialize directly (e.g. datetimes) - let python-jose handle them
+        return jwt.encode(to_encode, SECRET_KEY_BYTES, algorithm=ALGORITHM)
     
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    signing_input = f"{_HS256_HEADER_SEGMENT}.{payload_segment}"
+    signature = hmac.digest(SECRET_KEY_BYTES, signing_input.encode("ascii"), hashlib.sha256)
+    return f"{signing_input}.{_b64url_encode(signature)}"
 
 
-def verify_token(token: str) -> Optional[Dict]:
-    """Verify and decode a JWT token."""
+def _b64url_decode(segment: str) -> bytes:
+    """
+    Decode an unpadded base64url JWT segment. urlsafe_b64decode skips stray
+    characters and ignores non-zero trailing bits, so only the canonical
+    encoding is accepted (ValueError otherwise): one token has one spelling.
+    """
+    data = base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+    if _b64url_encode(data) != segment:
+        raise ValueError("Non-canonical base64url segment")
+    return data
+
+
+def _fast_verify_hs256(token: str):
+    """
+    Verify an HS256 token with one split and one OpenSSL-backed HMAC pass.
+    
+    Returns the payload, None if the token is invalid, or _USE_JOSE if the
+    token uses another algorithm or carries claims only python-jose checks.
+    """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        signing_input, _, signature = token.rpartition(".")
+        header_segment, _, payload_segment = signing_input.partition(".")
+        if not header_segment or not payload_segment:
+            return None
+        
+        header = json.loads(_b64url_decode(header_segment))
+        if not isinstance(header, dict) or header.get("alg") != ALGORITHM:
+            return _USE_JOSE
         
-        if username is None:
+        expected = hmac.digest(SECRET_KEY_BYTES, signing_input.encode("ascii"), hashlib.sha256)
+        if not hmac.compare_digest(expected, _b64url_decode(signature)):
             return None
         
+        payload = json.loads(_b64url_decode(payload_segment))
+    except (ValueError, TypeError):
+        return None
+    
+    if not isinstance(payload, dict):
+        return None
+    if not _FAST_PATH_UNSUPPORTED_CLAIMS.isdisjoint(payload):
+        return _USE_JOSE
+    
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or isinstance(exp, bool) or exp < time.time():
+        return None
+    if not isinstance(payload.get("sub"), str):
+        return None
+    
+    return payload
+
+
+def verify_token(token: str) -> Optional[Dict]:
+    """Verify and decode a JWT token (signature, exp and sub in one pass)."""
+    payload = _fast_verify_hs256(token)
+    if payload is not _USE_JOSE:
         return payload
-        
+    
+    try:
+        return jwt.decode(token, SECRET_KEY_BYTES, algorithms=ALLOWED_ALGORITHMS, options=DECODE_OPTIONS)
     except JWTError:
         return None
 
@@ -158,19 +392,16 @@ def create_user(username: str, password: str, full_name: str, email: str, role:
         "full_name": full_name,
         "email": email,
         "role": role,
-        "password": password,  # Plain text for testing
+        "password_hash": hash_password(password),
         "disabled": False,
         "created_at": datetime.now().isoformat()
     }
     
     users[username] = new_user
-    save_users(users)
+    append_user_change(username, new_user)
     
     # Return user without password
-    user_data = new_user.copy()
-    del user_data["password"]
-    
-    return user_data
+    return _public_user(new_user)
 
 
 def update_user(username: str, updates: Dict) -> Dict:
@@ -184,15 +415,16 @@ def update_user(username: str, updates: Dict) -> Dict:
     if "username" in updates:
         del updates["username"]
     
-    users[username].update(updates)
-    save_users(users)
+    # Store new passwords hashed, dropping any plain-text one
+    if "password" in updates:
+        updates["password_hash"] = hash_password(updates["password"])
+        updates["password"] = None
     
-    # Return user without password
-    user_data = users[username].copy()
-    if "password" in user_data:
-        del user_data["password"]
+    _apply_patch(users[username], updates)
+    append_user_change(username, updates)
     
-    return user_data
+    # Return user without password
+    return _public_user(users[username])
 
 
 def delete_user(username: str):
@@ -203,23 +435,16 @@ def delete_user(username: str):
         raise ValueError(f"User {username} not found")
     
     del users[username]
-    save_users(users)
+    append_user_change(username, None)
 
 
 def list_users() -> List[Dict]:
     """List all users (without passwords)."""
     users = load_users()
     
-    user_list = []
-    for user in users.values():
-        user_data = user.copy()
-        if "password" in user_data:
-            del user_data["password"]
-        user_list.append(user_data)
-    
-    return user_list
+    return [_public_user(user) for user in users.values()]
 
 
 # Initialize on import
 ensure_users_file()
-print("✓ Auth service initialized (TESTING MODE - Plain text passwords)")
+print("✓ Auth service initialized")
@@ -3,10 +3,27 @@ Background tasks using AsyncIO for scheduled operations.
 No external dependencies required (no Celery/Redis).
 """
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Dict, Optional
 import traceback
 
+# Seconds stop() waits for tasks to finish their current run before cancelling them
+STOP_TIMEOUT = 5
+
+# Worker processes for fleet-wide model inference. One scan runs at a time and
+# the models parallelize predict themselves (ML_THREADS), so one is enough.
+ML_POOL_WORKERS = 1
+MODEL_DIR = "backend/models/trained"
+
+
+def _init_ml_worker():
+    """Load the saved models in a fresh pool process before anything binds them."""
+    from services.ml_models import load_models
+    load_models(MODEL_DIR)
+
 
 class BackgroundTaskScheduler:
     """Manages background tasks using AsyncIO."""
@@ -15,7 +32,48 @@ class BackgroundTaskScheduler:
         self.tasks = []
         self.running = False
         self.task_results = {}
+        self._stop: Optional[asyncio.Event] = None  # Created in start(), on the serving loop
+        self._pool: Optional[ProcessPoolExecutor] = None  # Created in start()
+        self._batch_task: Optional[asyncio.Task] = None  # Running recommendation batch job, if any
+    
+    async def _wait_or_stop(self, interval: float) -> bool:
+        """Wait interval seconds; returns True as soon as stop() is called."""
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=interval)
+            return True
+        except asyncio.TimeoutError:
+            return False
         
+    @staticmethod
+    def _new_ml_pool() -> ProcessPoolExecutor:
+        # Spawned (not forked) workers: the server process already runs threads
+        return ProcessPoolExecutor(
+            max_workers=ML_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_ml_worker
+        )
+    
+    def recycle_ml_pool(self):
+        """
+        Replace the ML worker pool so new workers load the models just saved.
+        Work already running finishes on the old workers.
+        """
+        if self._pool is None:
+            return
+        old_pool, self._pool = self._pool, self._new_ml_pool()
+        old_pool.shutdown(wait=False)
+        print("✓ ML worker pool restarted with the retrained models")
+    
+    async def _run_ml(self, fn, *args):
+        """Run CPU-bound model inference in the worker process (a thread if the pool is down)."""
+        if self._pool is not None:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+            except BrokenProcessPool:
+                print("⚠️ ML worker process died, falling back to a thread")
+                self._pool = None
+        return await asyncio.to_thread(fn, *args)
+    
     async def feature_recomputation(self):
         """Recompute features every 5 minutes."""
         while self.running:
@@ -24,6 +82,11 @@ class BackgroundTaskScheduler:
                 
                 # In production, this would recompute features from new data
                 # For now, just log
+                
+                # Cached recommendations were based on the old features
+                from services.ai_service import clear_recommendation_cache
+                clear_recommendation_cache()
+                
                 self.task_results['feature_recomputation'] = {
                     'last_run': datetime.now(),
                     'status': 'success'
@@ -37,7 +100,58 @@ class BackgroundTaskScheduler:
                     'error': str(e)
                 }
             
-            await asyncio.sleep(300)  #5 minutes
+            if await self._wait_or_stop(300):  #5 minutes
+                break
+    
+    async def recommendations_refresh(self):
+        """Precompute recommendations for critical routes every 5 minutes."""
+        while self.running:
+            try:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Precomputing recommendations...")
+                
+                # The recommendations endpoint serves these instead of calling Mistral per request
+                from services.ai_service import precompute_recommendations
+                from services.simulation import get_simulation
+                
+                routes = await precompute_recommendations(get_simulation().critical_buses())
+                
+                self.task_results['recommendations'] = {
+                    'last_run': datetime.now(),
+                    'status': 'success',
+                    'routes': routes
+                }
+                
+            except Exception as e:
+                print(f"Error in recommendations refresh: {e}")
+                self.task_results['recommendations'] = {
+                    'last_run': datetime.now(),
+                    'status': 'error',
+                    'error': str(e)
+                }
+            
+            if await self._wait_or_stop(300):  # 5 minutes
+                break
+    
+    async def _recommendation_batch(self, items):
+        """Run one recommendation batch job to completion and record its outcome."""
+        try:
+            from services.ai_batch import regenerate_recommendations_batch
+            
+            regenerated = await regenerate_recommendations_batch(items)
+            
+            self.task_results['recommendation_batch'] = {
+                'last_run': datetime.now(),
+                'status': 'success',
+                'recommendations_regenerated': regenerated
+            }
+        
+        except Exception as e:
+            print(f"Error in recommendation batch: {e}")
+            self.task_results['recommendation_batch'] = {
+                'last_run': datetime.now(),
+                'status': 'error',
+                'error': str(e)
+            }
     
     async def demand_forecast_refresh(self):
         """Refresh demand forecasts every 30 minutes."""
@@ -45,10 +159,33 @@ class BackgroundTaskScheduler:
             try:
                 print(f"[{datetime.now().strftime('%H:%M:%S')}] Refreshing demand forecasts...")
                 
+                # Regenerate recommendations for the routes needing attention with
+                # one Mistral batch job instead of a chat request per route. The
+                # job can take many minutes, so it runs in its own task.
+                from services.simulation import get_simulation
+                
+                items = {}
+                for bus in get_simulation().critical_buses():
+                    # Most severe bus first, so each route keeps its worst bus
+                    items.setdefault(bus.route.route_id, {
+                        "delay": bus.delay_minutes,
+                        "occupancy": bus.occupancy,
+                        "status": bus.status,
+                        "speed": bus.speed
+                    })
+                
+                if self._batch_task is not None and not self._batch_task.done():
+                    batch = 'previous job still running'
+                else:
+                    self._batch_task = asyncio.create_task(self._recommendation_batch(list(items.items())))
+                    batch = 'submitted'
+                
                 # Update forecasts for next hours
                 self.task_results['demand_forecast'] = {
                     'last_run': datetime.now(),
-                    'status': 'success'
+                    'status': 'success',
+                    'recommendation_batch': batch,
+                    'routes': len(items)
                 }
                 
             except Exception as e:
@@ -59,7 +196,8 @@ class BackgroundTaskScheduler:
                     'error': str(e)
                 }
             
-            await asyncio.sleep(1800)  # 30 minutes
+            if await self._wait_or_stop(1800):  # 30 minutes
+                break
     
     async def anomaly_detection_scan(self):
         """Scan for anomalies every 2 minutes."""
@@ -67,11 +205,26 @@ class BackgroundTaskScheduler:
             try:
                 print(f"[{datetime.now().strftime('%H:%M:%S')}] Scanning for anomalies...")
                 
-                # Scan buses for anomalies
+                # Scan the whole fleet with one batched inference call
                 # In production, would trigger alerts
+                import numpy as np
+                from services.ai_service import detect_anomaly_batch
+                from services.simulation import get_simulation
+                
+                simulation = get_simulation()
+                bus_ids = [bus.bus_id for bus in simulation.bus_list]
+                # Copied on the loop, so a simulation tick can't change them mid-scan
+                metrics = np.column_stack((simulation.occupancy_arr, simulation.delay_arr, simulation.speed_arr))
+                anomaly_mask = await self._run_ml(detect_anomaly_batch, metrics)
+                
+                anomalous = [bus_ids[i] for i in np.flatnonzero(anomaly_mask)]
+                
                 self.task_results['anomaly_detection'] = {
                     'last_run': datetime.now(),
-                    'status': 'success'
+                    'status': 'success',
+                    'buses_scanned': len(bus_ids),
+                    'anomalies': len(anomalous),
+                    'anomalous_buses': anomalous
                 }
                 
             except Exception as e:
@@ -82,7 +235,8 @@ class BackgroundTaskScheduler:
                     'error': str(e)
                 }
             
-            await asyncio.sleep(120)  # 2 minutes
+            if await self._wait_or_stop(120):  # 2 minutes
+                break
     
     async def model_performance_monitoring(self):
         """Monitor ML model performance every hour."""
@@ -113,17 +267,21 @@ class BackgroundTaskScheduler:
                     'error': str(e)
                 }
             
-            await asyncio.sleep(3600)  # 1 hour
+            if await self._wait_or_stop(3600):  # 1 hour
+                break
     
     async def start(self):
         """Start all background tasks."""
         self.running = True
+        self._stop = asyncio.Event()
+        self._pool = self._new_ml_pool()
         
         print("Starting background task scheduler...")
         
         # Create tasks
         self.tasks = [
             asyncio.create_task(self.feature_recomputation()),
+            asyncio.create_task(self.recommendations_refresh()),
             asyncio.create_task(self.demand_forecast_refresh()),
             asyncio.create_task(self.anomaly_detection_scan()),
             asyncio.create_task(self.model_performance_monitoring())
@@ -138,13 +296,25 @@ class BackgroundTaskScheduler:
         """Stop all background tasks."""
         print("Stopping background tasks...")
         self.running = False
+        if self._stop is not None:
+            self._stop.set()
         
-        # Cancel all tasks
-        for task in self.tasks:
-            task.cancel()
+        # A batch job can poll for many minutes; its results are only kept in memory
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            await asyncio.gather(self._batch_task, return_exceptions=True)
+            self._batch_task = None
         
-        # Wait for cancellation
-        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # Idle tasks exit right away; cancel any still busy
+        if self.tasks:
+            _, pending = await asyncio.wait(self.tasks, timeout=STOP_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
         
         print("✓ Background tasks stopped")
     
@@ -2,68 +2,137 @@
 DPDP Act 2023 compliance utilities.
 Ensures compliance with India's Digital Personal Data Protection Act.
 """
+from collections import Counter
 from typing import Dict, List
+import functools
 import re
+import pandas as pd
 
 
+# Substrings marking a field as personal data, compiled into one case-insensitive
+# alternation so each field name is scanned once instead of once per keyword
+PERSONAL_FIELDS = frozenset({
+    'name', 'email', 'phone', 'mobile', 'address', 'aadhaar',
+    'pan', 'passport', 'license', 'dob', 'birth', 'age',
+    'gender', 'caste', 'religion', 'biometric'
+})
+_PERSONAL_RE = re.compile("|".join(map(re.escape, sorted(PERSONAL_FIELDS))), re.IGNORECASE)
+
+
+# Callers check the same few column names over and over
+@functools.lru_cache(maxsize=4096)
 def is_personal_data(field_name: str) -> bool:
     """
     Check if a field contains personal data.
     
     Personal data includes: names, addresses, phone numbers, email, Aadhaar, etc.
     """
-    personal_fields = [
-        'name', 'email', 'phone', 'mobile', 'address', 'aadhaar',
-        'pan', 'passport', 'license', 'dob', 'birth', 'age',
-        'gender', 'caste', 'religion', 'biometric'
-    ]
-    
-    field_lower = field_name.lower()
-    
-    return any(pf in field_lower for pf in personal_fields)
+    return _PERSONAL_RE.search(field_name) is not None
+
+
+# Aadhaar (12 digits) or phone (10 digits), classified in one match
+_DIGITS_RE = re.compile(r'(?P<aadhaar>\d{12})|(?P<phone>\d{10})')
+
+
+def _mask(value):
+    """Mask one personal value; non-string values are returned unchanged."""
+    if not isinstance(value, str):
+        return value
+    if '@' in value:  # Email
+        parts = value.split('@')
+        return f"{parts[0][:2]}***@{parts[1]}"
+    match = _DIGITS_RE.fullmatch(value)
+    if match is not None:
+        if match.lastgroup == 'aadhaar':
+            return f"XXXX-XXXX-{value[-4:]}"
+        return f"XXXXX-{value[-5:]}"  # Phone
+    # Generic masking
+    return f"{value[:2]}***"
 
 
 def anonymize_data(data: Dict) -> Dict:
     """
     Anonymize personal data fields.
-    Replaces personal data with anonymized versions.
+    Returns a new dict with personal data replaced by anonymized versions.
     """
-    anonymized = data.copy()
-    
+    return {key: _mask(value) if is_personal_data(key) else value for key, value in data.items()}
+
+
+def anonymize_data_inplace(data: Dict) -> Dict:
+    """anonymize_data, masking the personal fields of data itself. Returns data."""
     for key, value in data.items():
         if is_personal_data(key):
-            if isinstance(value, str):
-                # Mask the value
-                if '@' in value:  # Email
-                    parts = value.split('@')
-                    anonymized[key] = f"{parts[0][:2]}***@{parts[1]}"
-                elif len(value) == 12 and value.isdigit():  # Aadhaar
-                    anonymized[key] = f"XXXX-XXXX-{value[-4:]}"
-                elif len(value) == 10 and value.isdigit():  # Phone
-                    anonymized[key] = f"XXXXX-{value[-5:]}"
-                else:
-                    # Generic masking
-                    anonymized[key] = f"{value[:2]}***"
+            data[key] = _mask(value)
+    return data
+
+
+def anonymize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    anonymize_data for a whole DataFrame: each personal column is masked with
+    vectorized string operations instead of per-row Python. Returns a copy.
+    """
+    anonymized = df.copy()
+    
+    for col in df.columns:
+        if not is_personal_data(str(col)):
+            continue
+        
+        # Like anonymize_data, only string values are masked
+        values = df[col]
+        kind = pd.api.types.infer_dtype(values, skipna=True)
+        if kind == "string":
+            is_str = values.notna().to_numpy()
+        elif kind.startswith("mixed"):
+            is_str = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+        else:
+            continue
+        
+        if not is_str.any():
+            continue
+        
+        s = values[is_str].astype(str).reset_index(drop=True)
+        is_digits = s.str.isdigit()
+        length = s.str.len()
+        email = s.str.contains('@', regex=False)
+        aadhaar = ~email & is_digits & (length == 12)
+        phone = ~email & is_digits & (length == 10)
+        
+        # Generic masking, then the specific formats
+        masked = s.str[:2] + "***"
+        parts = s[email].str.split('@')
+        masked[email] = parts.str[0].str[:2] + "***@" + parts.str[1]
+        masked[aadhaar] = "XXXX-XXXX-" + s[aadhaar].str[-4:]
+        masked[phone] = "XXXXX-" + s[phone].str[-5:]
+        
+        out = values.to_numpy(dtype=object, copy=True)
+        out[is_str] = masked.to_numpy(dtype=object)
+        anonymized[col] = out
     
     return anonymized
 
 
-def aggregate_passenger_data(records: List[Dict]) -> Dict:
+def aggregate_passenger_data(records) -> Dict:
     """
     Aggregate passenger data to prevent individual identification.
     Returns aggregated statistics instead of individual records.
+    
+    Args:
+        records: List of record dicts, or a DataFrame of records
     """
-    if not records:
+    if len(records) == 0:
         return {}
     
     # Count records
     total_count = len(records)
     
     # Aggregate by route if available
-    route_counts = {}
-    for record in records:
-        route = record.get('route_id', 'unknown')
-        route_counts[route] = route_counts.get(route, 0) + 1
+    if isinstance(records, pd.DataFrame):
+        if 'route_id' in records.columns:
+            route_counts = records['route_id'].fillna('unknown').value_counts(sort=False).to_dict()
+        else:
+            route_counts = {'unknown': total_count}
+    else:
+        route_counts = dict(Counter(record.get('route_id', 'unknown') for record in records))
     
     return {
         "total_passengers": total_count,
@@ -72,6 +141,17 @@ def aggregate_passenger_data(records: List[Dict]) -> Dict:
     }
 
 
+# (data_type, operation) pairs that need consent: every operation on personal
+# or sensitive data. Sensitive data needs explicit consent.
+CONSENT_OPERATIONS = ('collect', 'store', 'process', 'share', 'transfer')
+_CONSENT_REQUIRED = frozenset(
+    (data_type, operation)
+    for data_type in ('personal', 'sensitive')
+    for operation in CONSENT_OPERATIONS
+)
+_CONSENT_TYPES = {'sensitive': 'explicit'}
+
+
 def check_consent_requirements(operation: str, data_type: str) -> Dict:
     """
     Check if consent is required for a data operation.
@@ -83,34 +163,27 @@ def check_consent_requirements(operation: str, data_type: str) -> Dict:
     Returns:
         Dict with consent requirements
     """
-    consent_matrix = {
-        'personal': {
-            'collect': True,
-            'store': True,
-            'process': True,
-            'share': True,
-            'transfer': True
-        },
-        'sensitive': {
-            'collect': True,
-            'store': True,
-            'process': True,
-            'share': True,  # Explicit consent required
-            'transfer': True  # Cross-border transfer requires explicit consent
-        }
-    }
-    
-    requires_consent = consent_matrix.get(data_type, {}).get(operation, False)
+    requires_consent = (data_type, operation) in _CONSENT_REQUIRED
     
     return {
         "operation": operation,
         "data_type": data_type,
         "consent_required": requires_consent,
-        "consent_type": "explicit" if data_type == "sensitive" else "informed",
+        "consent_type": _CONSENT_TYPES.get(data_type, "informed"),
         "retention_period": "As per APSRTC policy, max 2 years for analytics"
     }
 
 
+# Define necessary fields per purpose (sets for membership checks)
+PURPOSE_FIELDS = {
+    "route_optimization": ['route_id', 'timestamp', 'occupancy', 'delay'],
+    "demand_forecasting": ['route_id', 'timestamp', 'passenger_count'],
+    "performance_analytics": ['route_id', 'service_id', 'on_time_status', 'distance'],
+    "fare_calculation": ['route_id', 'distance', 'fare_amount']
+}
+_PURPOSE_FIELD_SETS = {purpose: frozenset(fields) for purpose, fields in PURPOSE_FIELDS.items()}
+
+
 def validate_data_minimization(requested_fields: List[str], business_purpose: str) -> Dict:
     """
     Validate that only necessary data is collected (data minimization principle).
@@ -122,19 +195,12 @@ def validate_data_minimization(requested_fields: List[str], business_purpose: st
     Returns:
         Validation result with recommendations
     """
-    # Define necessary fields per purpose
-    purpose_fields = {
-        "route_optimization": ['route_id', 'timestamp', 'occupancy', 'delay'],
-        "demand_forecasting": ['route_id', 'timestamp', 'passenger_count'],
-        "performance_analytics": ['route_id', 'service_id', 'on_time_status', 'distance'],
-        "fare_calculation": ['route_id', 'distance', 'fare_amount']
-    }
-    
-    necessary_fields = purpose_fields.get(business_purpose, [])
+    necessary_fields = list(PURPOSE_FIELDS.get(business_purpose, []))
+    necessary = _PURPOSE_FIELD_SETS.get(business_purpose, frozenset())
     personal_fields = [f for f in requested_fields if is_personal_data(f)]
     
     # Check for unnecessary personal data
-    unnecessary = [f for f in personal_fields if f not in necessary_fields]
+    unnecessary = [f for f in personal_fields if f not in necessary]
     
     return {
         "business_purpose": business_purpose,
@@ -163,8 +229,3 @@ def get_data_retention_policy() -> Dict:
             "Right to data portability"
         ]
     }
-
-
-# Compliance check on import
-print("✓ DPDP Act 2023 compliance module loaded")
-print(f"  Data retention policy: {get_data_retention_policy()['analytics_data']}")
@@ -5,105 +5,210 @@ Loads, processes, and joins data for ML model training and analytics.
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+try:
+    import python_calamine  # noqa: F401  Rust Excel reader, used by pandas' 'calamine' engine
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None  # pandas default (xlrd / openpyxl)
+
+# Parquet copies of the source files, under base_path; parsing CSV/XLS is the slow part of startup
+PARQUET_CACHE_DIR = '.parquet_cache'
+
+# Ticketing rows aggregated per chunk when the file is streamed rather than loaded
+TICKETING_CHUNK_SIZE = 500_000
+PASSENGER_COL = '(TB.NO_OF_ADULTS+TB.NO_OF_CHILD)'
+
+# Column names normalized at load so every file joins on ROUTE_ID / SERVICE_ID
+COLUMN_RENAMES = {
+    'haltwise': {'RouteID': 'ROUTE_ID', 'ServiceID': 'SERVICE_ID'},
+}
+
+# Files whose repeated string keys (ROUTE_ID, place names, ...) are grouped on;
+# their object columns become category when under half the values are distinct
+CATEGORIZED_FILES = frozenset({'ticketing', 'schedule', 'haltwise', 'service_halts'})
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def _peak_hour_mask(hours: pd.Series) -> pd.Series:
+    """1 for peak hours (7-10 and 17-20), else 0; missing hours count as off-peak."""
+    return (hours.between(7, 10) | hours.between(17, 20)).astype('int8')
+
+def _parse_datetimes(values: pd.Series, fmt: Optional[str] = None) -> pd.Series:
+    """
+    pd.to_datetime with an explicit format, so parsing stays on the vectorized
+    strptime path. Without fmt, it is guessed once from the first value.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values  # Excel columns arrive already parsed
+    if fmt is None:
+        first = values.dropna()
+        first = first.iloc[0] if len(first) else None
+        fmt = (guess_datetime_format(first) if isinstance(first, str) else None) or 'mixed'
+    return pd.to_datetime(values, format=fmt, errors='coerce')
+
+
 class APSRTCDataLoader:
     """Load and process all APSRTC data files."""
     
-    def __init__(self, base_path: str = "C:/Users/bhava/Desktop/RTGS"):
+    def __init__(self, base_path: str = "C:/Users/bhava/Desktop/RTGS", stream_ticketing: bool = False):
         self.base_path = base_path
         self.data_cache = {}
+        # Leave the (multi-GB) ticketing file on disk; the OD matrix and demand
+        # data are then aggregated chunk by chunk straight from the CSV
+        self.stream_ticketing = stream_ticketing
         
-    def load_all_data(self) -> Dict[str, pd.DataFrame]:
-        """Load all available CSV and Excel files."""
-        print("Loading APSRTC data files...")
+    # (key, path under base_path, description) for every file load_all_data reads
+    DATA_FILES = [
+        ('network', '2years/network_information_2years.csv', 'network data'),
+        ('schedule', '2years/sehedule_information_2years.csv', 'schedule data'),
+        ('ticketing', 'Ticketing_Data.csv', 'ticketing data'),
+        ('haltwise', 'HaltWiseData_22Apr2025.xls', 'haltwise data'),
+        ('tripwise', 'TripWiseData_22Apr2025.xls', 'tripwise data'),
+        ('service_halts', '2years/Service_Halts.csv', 'service halts data'),
+        ('place_master', '2years/place_master.csv', 'place master data'),
+        ('route_halts', 'rout_halts_with_distance.csv', 'route halts data'),
+    ]
+    
+    def _cached_read(self, key: str, path: str) -> pd.DataFrame:
+        """
+        Read a data file through a Parquet copy under base_path/.parquet_cache.
+        The copy is reused while the source's mtime and size match its sidecar.
+        """
+        cache_dir = Path(self.base_path) / PARQUET_CACHE_DIR
+        cache_path = cache_dir / f"{key}.parquet"
+        meta_path = cache_dir / f"{key}.json"
         
-        data = {}
+        stat = os.stat(path)
+        source = {'path': path, 'mtime': stat.st_mtime, 'size': stat.st_size}
         
-        # Network information
-        try:
-            network_file = f"{self.base_path}/2years/network_information_2years.csv"
-            if os.path.exists(network_file):
-                data['network'] = pd.read_csv(network_file, low_memory=False)
-                print(f"✓ Loaded network data: {len(data['network'])} records")
-        except Exception as e:
-            print(f"✗ Error loading network data: {e}")
-            
-        # Schedule information
-        try:
-            schedule_file = f"{self.base_path}/2years/sehedule_information_2years.csv"
-            if os.path.exists(schedule_file):
-                data['schedule'] = pd.read_csv(schedule_file, low_memory=False)
-                print(f"✓ Loaded schedule data: {len(data['schedule'])} records")
-        except Exception as e:
-            print(f"✗ Error loading schedule data: {e}")
-            
-        # Ticketing data
-        try:
-            ticketing_file = f"{self.base_path}/Ticketing_Data.csv"
-            if os.path.exists(ticketing_file):
-                data['ticketing'] = pd.read_csv(ticketing_file, low_memory=False)
-                print(f"✓ Loaded ticketing data: {len(data['ticketing'])} records")
-        except Exception as e:
-            print(f"✗ Error loading ticketing data: {e}")
-            
-        # HaltWise data
-        try:
-            haltwise_file = f"{self.base_path}/HaltWiseData_22Apr2025.xls"
-            if os.path.exists(haltwise_file):
-                data['haltwise'] = pd.read_excel(haltwise_file)
-                print(f"✓ Loaded haltwise data: {len(data['haltwise'])} records")
-        except Exception as e:
-            print(f"✗ Error loading haltwise data: {e}")
-            
-        # TripWise data
         try:
-            tripwise_file = f"{self.base_path}/TripWiseData_22Apr2025.xls"
-            if os.path.exists(tripwise_file):
-                data['tripwise'] = pd.read_excel(tripwise_file)
-                print(f"✓ Loaded tripwise data: {len(data['tripwise'])} records")
+            if cache_path.exists() and json.loads(meta_path.read_text()) == source:
+                return pd.read_parquet(cache_path)
         except Exception as e:
-            print(f"✗ Error loading tripwise data: {e}")
-            
-        # Service Halts
+            print(f"  Ignoring Parquet cache for {key}: {e}")
+        
+        df = self._read_file(path, self._SCHEMAS.get(key))
+        
         try:
-            service_halts_file = f"{self.base_path}/2years/Service_Halts.csv"
-            if os.path.exists(service_halts_file):
-                data['service_halts'] = pd.read_csv(service_halts_file, low_memory=False)
-                print(f"✓ Loaded service halts data: {len(data['service_halts'])} records")
+            cache_dir.mkdir(exist_ok=True)
+            meta_path.unlink(missing_ok=True)  # a half-written copy must never look valid
+            df.to_parquet(cache_path, compression='snappy')
+            meta_path.write_text(json.dumps(source))
         except Exception as e:
-            print(f"✗ Error loading service halts data: {e}")
-            
-        # Place master
+            # e.g. object columns mixing types, or a read-only data directory
+            print(f"  Could not cache {key} as Parquet: {e}")
+        
+        return df
+    
+    # read_csv options per file: only the columns the loader's methods use, with
+    # measures parsed straight to float. Files not listed are read whole.
+    _SCHEMAS: Dict[str, Dict] = {
+        'schedule': {
+            'usecols': ['SERVICE_ID', 'ROUTE_ID', 'TOTAL_TRAVEL_MINUTES', 'SERVICE_TYPE_NAME', 'DISTANCE_KM'],
+            'dtype': {'TOTAL_TRAVEL_MINUTES': 'float64', 'DISTANCE_KM': 'float64'},
+        },
+        'ticketing': {
+            'usecols': ['ROUTE_ID', 'FROM_PLACE_NAME', 'TO_PLACE_NAME', 'TOTAL_AMOUNT',
+                        PASSENGER_COL, 'BOOKED_DATE', 'BOOKING_TIME'],
+            'dtype': {'TOTAL_AMOUNT': 'float64', PASSENGER_COL: 'float64'},
+        },
+    }
+    
+    @staticmethod
+    def _categorize(df: pd.DataFrame) -> pd.DataFrame:
+        """Convert repetitive string columns (under half the values unique) to category."""
+        for col in df.columns:
+            if df[col].dtype == object and len(df) and df[col].nunique() / len(df) < CATEGORY_MAX_UNIQUE_RATIO:
+                df[col] = df[col].astype('category')
+        return df
+    
+    def _load_file(self, key: str, path: str) -> pd.DataFrame:
+        """Read one data file (via the Parquet cache), normalize column names and categorize grouping keys."""
+        df = self._cached_read(key, path)
+        if key in COLUMN_RENAMES:
+            df.rename(columns=COLUMN_RENAMES[key], inplace=True)
+        if key in CATEGORIZED_FILES:
+            df = self._categorize(df)
+        return df
+    
+    @staticmethod
+    def _read_file(path: str, schema: Optional[Dict] = None) -> pd.DataFrame:
+        """Read one CSV or Excel data file."""
+        if path.endswith('.xls') or path.endswith('.xlsx'):
+            return pd.read_excel(path, engine=EXCEL_ENGINE)
         try:
-            place_file = f"{self.base_path}/2years/place_master.csv"
-            if os.path.exists(place_file):
-                data['place_master'] = pd.read_csv(place_file, low_memory=False)
-                print(f"✓ Loaded place master data: {len(data['place_master'])} records")
+            # Multi-threaded Arrow parser; columns stay NumPy-backed for the models
+            return pd.read_csv(path, engine='pyarrow', **(schema or {}))
         except Exception as e:
-            print(f"✗ Error loading place master data: {e}")
+            # Also covers files that don't match their schema (missing columns, bad values)
+            print(f"  PyArrow could not parse {os.path.basename(path)} ({e}), using the C parser")
+            return pd.read_csv(path, low_memory=False)
+        
+    def load_all_data(self, keys: Optional[Iterable[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Load all available CSV and Excel files (read concurrently).
+        With keys, only those files are read and merged into the cache.
+        """
+        print("Loading APSRTC data files...")
+        
+        data = {}
+        if keys is None:
+            files = self.DATA_FILES
+        else:
+            keys = set(keys)
+            files = [entry for entry in self.DATA_FILES if entry[0] in keys]
+        
+        # The parsers spend most of their time in C (GIL released), so the
+        # files are read in parallel threads instead of one after another
+        with ThreadPoolExecutor(max_workers=max(1, len(files))) as executor:
+            futures = {}
+            for key, relative_path, description in files:
+                path = f"{self.base_path}/{relative_path}"
+                if key == 'ticketing' and self.stream_ticketing:
+                    print(f"• Streaming {description} from disk")
+                    continue
+                if os.path.exists(path):
+                    futures[executor.submit(self._load_file, key, path)] = (key, description)
             
-        # Route halts with distance
-        try:
-            route_halts_file = f"{self.base_path}/rout_halts_with_distance.csv"
-            if os.path.exists(route_halts_file):
-                data['route_halts'] = pd.read_csv(route_halts_file, low_memory=False)
-                print(f"✓ Loaded route halts data: {len(data['route_halts'])} records")
-        except Exception as e:
-            print(f"✗ Error loading route halts data: {e}")
+            for future in as_completed(futures):
+                key, description = futures[future]
+                try:
+                    data[key] = future.result()
+                    print(f"✓ Loaded {description}: {len(data[key])} records")
+                except Exception as e:
+                    print(f"✗ Error loading {description}: {e}")
+        
+        # Keep the usual key order regardless of which file finished first
+        data = {key: data[key] for key, _, _ in self.DATA_FILES if key in data}
             
-        self.data_cache = data
+        if keys is None:
+            self.data_cache = data
+        else:
+            self.data_cache.update(data)
         return data
     
-    def extract_temporal_features(self, df: pd.DataFrame, date_col: str, time_col: Optional[str] = None) -> pd.DataFrame:
-        """Extract temporal features from date/time columns."""
+    def extract_temporal_features(self, df: pd.DataFrame, date_col: str, time_col: Optional[str] = None,
+                                  date_format: Optional[str] = None, time_format: str = '%H:%M:%S') -> pd.DataFrame:
+        """
+        Extract temporal features from date/time columns.
+        date_format is guessed from the data when not given.
+        """
         df = df.copy()
         
         # Parse date
         if date_col in df.columns:
-            df['date'] = pd.to_datetime(df[date_col], errors='coerce')
+            df['date'] = _parse_datetimes(df[date_col], date_format)
             df['year'] = df['date'].dt.year
             df['month'] = df['date'].dt.month
             df['day'] = df['date'].dt.day
@@ -112,49 +217,77 @@ class APSRTCDataLoader:
             
         # Parse time if provided
         if time_col and time_col in df.columns:
-            df['time'] = pd.to_datetime(df[time_col], format='%H:%M:%S', errors='coerce').dt.time
-            df['hour'] = pd.to_datetime(df[time_col], format='%H:%M:%S', errors='coerce').dt.hour
-            df['minute'] = pd.to_datetime(df[time_col], format='%H:%M:%S', errors='coerce').dt.minute
+            times = _parse_datetimes(df[time_col], time_format)
+            df['hour'] = times.dt.hour
+            df['minute'] = times.dt.minute
             
             # Peak hour classification
-            df['is_peak_hour'] = df['hour'].apply(
-                lambda x: 1 if (7 <= x <= 10) or (17 <= x <= 20) else 0
-            )
+            df['is_peak_hour'] = _peak_hour_mask(df['hour'])
             
         return df
     
-    def compute_od_matrix(self) -> Optional[pd.DataFrame]:
-        """Compute origin-destination flow matrix from ticketing data."""
-        if 'ticketing' not in self.data_cache:
-            return None
-            
-        ticketing = self.data_cache['ticketing']
-        
+    def _ticketing_path(self) -> str:
+        return next(f"{self.base_path}/{path}" for key, path, _ in self.DATA_FILES if key == 'ticketing')
+    
+    def _ticketing_chunks(self):
+        """Iterate over the ticketing CSV in TICKETING_CHUNK_SIZE-row frames."""
+        columns = set(self._SCHEMAS['ticketing']['usecols'])
+        return pd.read_csv(self._ticketing_path(), usecols=lambda col: col in columns, chunksize=TICKETING_CHUNK_SIZE)
+    
+    def _stream_ticketing(self, aggregate) -> Optional[pd.DataFrame]:
+        """
+        Fold aggregate(chunk) (a grouped frame of sums/counts) over the ticketing
+        CSV, so peak memory is one chunk plus the result.
+        """
+        total = None
+        for chunk in self._ticketing_chunks():
+            partial = aggregate(chunk)
+            if partial is None:
+                return None
+            total = partial if total is None else total.add(partial, fill_value=0)
+        return total
+    
+    def _ticketing_available(self) -> bool:
+        return 'ticketing' in self.data_cache or (self.stream_ticketing and os.path.exists(self._ticketing_path()))
+    
+    @staticmethod
+    def _od_flows(ticketing: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """Per (origin, destination) revenue sum, trip count and passenger sum."""
         # Check for OD columns
         if 'FROM_PLACE_NAME' not in ticketing.columns or 'TO_PLACE_NAME' not in ticketing.columns:
             print("Warning: OD columns not found in ticketing data")
             return None
             
-        # Aggregate flows
-        od_matrix = ticketing.groupby(['FROM_PLACE_NAME', 'TO_PLACE_NAME']).agg({
+        # Aggregate flows, with the passenger count in the same pass when available
+        aggs = {
             'TOTAL_AMOUNT': 'sum',
             'ROUTE_ID': 'count'  # Number of trips
-        }).reset_index()
+        }
+        if PASSENGER_COL in ticketing.columns:
+            aggs[PASSENGER_COL] = 'sum'
         
-        od_matrix.columns = ['origin', 'destination', 'total_revenue', 'trip_count']
+        return ticketing.groupby(['FROM_PLACE_NAME', 'TO_PLACE_NAME'], observed=True).agg(aggs)
+    
+    def compute_od_matrix(self) -> Optional[pd.DataFrame]:
+        """Compute origin-destination flow matrix from ticketing data."""
+        if not self._ticketing_available():
+            return None
         
-        # Add passenger count if available
-        passenger_col = '(TB.NO_OF_ADULTS+TB.NO_OF_CHILD)'
-        if passenger_col in ticketing.columns:
-            passenger_flow = ticketing.groupby(['FROM_PLACE_NAME', 'TO_PLACE_NAME'])[passenger_col].sum().reset_index()
-            od_matrix = od_matrix.merge(
-                passenger_flow,
-                left_on=['origin', 'destination'],
-                right_on=['FROM_PLACE_NAME', 'TO_PLACE_NAME'],
-                how='left'
-            )
-            od_matrix.rename(columns={passenger_col: 'total_passengers'}, inplace=True)
-            od_matrix.drop(['FROM_PLACE_NAME', 'TO_PLACE_NAME'], axis=1, inplace=True, errors='ignore')
+        if 'ticketing' in self.data_cache:
+            flows = self._od_flows(self.data_cache['ticketing'])
+        else:
+            flows = self._stream_ticketing(self._od_flows)
+        if flows is None:
+            return None
+        
+        od_matrix = flows.reset_index().rename(columns={
+            'FROM_PLACE_NAME': 'origin',
+            'TO_PLACE_NAME': 'destination',
+            'TOTAL_AMOUNT': 'total_revenue',
+            'ROUTE_ID': 'trip_count',
+            PASSENGER_COL: 'total_passengers'
+        })
+        od_matrix['trip_count'] = od_matrix['trip_count'].astype('int64')  # float after a streamed fold
         
         return od_matrix
     
@@ -164,86 +297,100 @@ class APSRTCDataLoader:
             print("Warning: Required data for delay prediction not available")
             return None
             
-        haltwise = self.data_cache['haltwise'].copy()
-        schedule = self.data_cache['schedule'].copy()
+        # Not copied: merge() returns a new frame and neither input is modified
+        haltwise = self.data_cache['haltwise']
+        schedule = self.data_cache['schedule']
         
-        # Merge haltwise with schedule
-        if 'RouteID' in haltwise.columns and 'ROUTE_ID' in schedule.columns:
-            # Rename for consistency
-            haltwise.rename(columns={'RouteID': 'ROUTE_ID'}, inplace=True)
-            
-        if 'ServiceID' in haltwise.columns and 'SERVICE_ID' in schedule.columns:
-            haltwise.rename(columns={'ServiceID': 'SERVICE_ID'}, inplace=True)
-            
-        # Merge
+        # Merge haltwise with schedule (column names normalized at load)
         delay_data = haltwise.merge(
             schedule[['SERVICE_ID', 'ROUTE_ID', 'TOTAL_TRAVEL_MINUTES', 'SERVICE_TYPE_NAME', 'DISTANCE_KM']].drop_duplicates(),
             on=['SERVICE_ID', 'ROUTE_ID'],
             how='left'
         )
         
+        # Parse the scheduled time once; it feeds both the delay and the temporal features
+        scheduled = None
+        if 'ScheduledArrivalTime' in delay_data.columns:
+            scheduled = _parse_datetimes(delay_data['ScheduledArrivalTime'])
+            delay_data['ScheduledArrivalTime'] = scheduled
+            
         # Calculate actual delay
-        if 'ActualArrivalTime' in delay_data.columns and 'ScheduledArrivalTime' in delay_data.columns:
-            delay_data['ScheduledArrivalTime'] = pd.to_datetime(delay_data['ScheduledArrivalTime'], errors='coerce')
-            delay_data['ActualArrivalTime'] = pd.to_datetime(delay_data['ActualArrivalTime'], errors='coerce')
-            delay_data['delay_minutes'] = (
-                (delay_data['ActualArrivalTime'] - delay_data['ScheduledArrivalTime']).dt.total_seconds() / 60
-            )
+        if 'ActualArrivalTime' in delay_data.columns and scheduled is not None:
+            actual = _parse_datetimes(delay_data['ActualArrivalTime'])
+            delay_data['ActualArrivalTime'] = actual
+            delay_data['delay_minutes'] = (actual - scheduled).dt.total_seconds() / 60
         elif 'isCancelled' in delay_data.columns:
             # Estimate delay based on cancellation (cancelled = high delay)
-            delay_data['delay_minutes'] = delay_data['isCancelled'].apply(lambda x: 120 if x == 1 else np.random.uniform(0, 15))
+            cancelled = (delay_data['isCancelled'] == 1).to_numpy()
+            noise = np.random.default_rng().uniform(0, 15, size=len(cancelled))
+            delay_data['delay_minutes'] = np.where(cancelled, 120.0, noise)
         else:
             delay_data['delay_minutes'] = 0
             
         # Extract temporal features if date/time available
         if 'TripDate' in delay_data.columns:
             delay_data = self.extract_temporal_features(delay_data, 'TripDate')
-        elif 'ScheduledArrivalTime' in delay_data.columns:
-            delay_data['date'] = delay_data['ScheduledArrivalTime'].dt.date
-            delay_data['hour'] = delay_data['ScheduledArrivalTime'].dt.hour
-            delay_data['day_of_week'] = delay_data['ScheduledArrivalTime'].dt.dayofweek
-            delay_data['is_peak_hour'] = delay_data['hour'].apply(
-                lambda x: 1 if (7 <= x <= 10) or (17 <= x <= 20) else 0
-            )
+        elif scheduled is not None:
+            delay_data['date'] = scheduled.dt.date
+            delay_data['hour'] = scheduled.dt.hour
+            delay_data['day_of_week'] = scheduled.dt.dayofweek
+            delay_data['is_peak_hour'] = _peak_hour_mask(delay_data['hour'])
             
         return delay_data
     
-    def prepare_demand_training_data(self) -> Optional[pd.DataFrame]:
-        """Prepare training data for demand forecasting model."""
-        if 'ticketing' not in self.data_cache:
-            print("Warning: Ticketing data not available for demand forecasting")
-            return None
-            
-        ticketing = self.data_cache['ticketing'].copy()
-        
+    def _demand_features(self, ticketing: pd.DataFrame) -> pd.DataFrame:
+        """Temporal features and passenger_count for ticketing rows (a new frame)."""
         # Extract temporal features
         if 'BOOKED_DATE' in ticketing.columns:
             ticketing = self.extract_temporal_features(ticketing, 'BOOKED_DATE', 'BOOKING_TIME')
+        else:
+            ticketing = ticketing.copy()
             
         # Calculate passenger count
-        passenger_col = '(TB.NO_OF_ADULTS+TB.NO_OF_CHILD)'
-        if passenger_col in ticketing.columns:
-            ticketing['passenger_count'] = ticketing[passenger_col]
+        if PASSENGER_COL in ticketing.columns:
+            ticketing['passenger_count'] = ticketing[PASSENGER_COL]
         else:
             ticketing['passenger_count'] = 1  # Default
+        return ticketing
+    
+    @staticmethod
+    def _hourly_demand(ticketing: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """Passenger and revenue sums per (route, date, hour) of featurized rows; None without date/hour."""
+        if 'date' not in ticketing.columns or 'hour' not in ticketing.columns:
+            return None
+        return ticketing.groupby(['ROUTE_ID', 'date', 'hour'], observed=True).agg({
+            'passenger_count': 'sum',
+            'TOTAL_AMOUNT': 'sum'
+        })
+    
+    def prepare_demand_training_data(self) -> Optional[pd.DataFrame]:
+        """Prepare training data for demand forecasting model."""
+        if not self._ticketing_available():
+            print("Warning: Ticketing data not available for demand forecasting")
+            return None
             
-        # Aggregate by route and time
-        if 'date' in ticketing.columns and 'hour' in ticketing.columns:
-            demand_data = ticketing.groupby(['ROUTE_ID', 'date', 'hour']).agg({
-                'passenger_count': 'sum',
-                'TOTAL_AMOUNT': 'sum'
-            }).reset_index()
-            
-            # Add temporal features to aggregated data
-            demand_data['day_of_week'] = pd.to_datetime(demand_data['date']).dt.dayofweek
-            demand_data['month'] = pd.to_datetime(demand_data['date']).dt.month
-            demand_data['is_peak_hour'] = demand_data['hour'].apply(
-                lambda x: 1 if (7 <= x <= 10) or (17 <= x <= 20) else 0
-            )
-            
-            return demand_data
+        if 'ticketing' in self.data_cache:
+            ticketing = self._demand_features(self.data_cache['ticketing'])
+            demand = self._hourly_demand(ticketing)
+            if demand is None:
+                # No booking times to aggregate by; hand back the rows themselves
+                return ticketing
         else:
-            return ticketing
+            demand = self._stream_ticketing(lambda chunk: self._hourly_demand(self._demand_features(chunk)))
+            if demand is None:
+                print("Warning: Booking date/time not found in ticketing data")
+                return None
+        
+        # Aggregate by route and time
+        demand_data = demand.reset_index()
+        
+        # Add temporal features to aggregated data
+        dates = _parse_datetimes(demand_data['date'])
+        demand_data['day_of_week'] = dates.dt.dayofweek
+        demand_data['month'] = dates.dt.month
+        demand_data['is_peak_hour'] = _peak_hour_mask(demand_data['hour'])
+        
+        return demand_data
     
     def get_route_statistics(self) -> pd.DataFrame:
         """Compute comprehensive route statistics."""
@@ -251,7 +398,7 @@ class APSRTCDataLoader:
         
         # Revenue from ticketing
         if 'ticketing' in self.data_cache:
-            revenue = self.data_cache['ticketing'].groupby('ROUTE_ID').agg({
+            revenue = self.data_cache['ticketing'].groupby('ROUTE_ID', observed=True).agg({
                 'TOTAL_AMOUNT': 'sum',
                 'ROUTE_ID': 'count'
             }).reset_index()
@@ -260,12 +407,10 @@ class APSRTCDataLoader:
             
         # Reliability from haltwise
         if 'haltwise' in self.data_cache:
-            haltwise = self.data_cache['haltwise'].copy()
-            if 'RouteID' in haltwise.columns:
-                haltwise.rename(columns={'RouteID': 'ROUTE_ID'}, inplace=True)
+            haltwise = self.data_cache['haltwise']
                 
             if 'isCancelled' in haltwise.columns:
-                reliability = haltwise.groupby('ROUTE_ID').agg({
+                reliability = haltwise.groupby('ROUTE_ID', observed=True).agg({
                     'isCancelled': ['count', 'sum']
                 }).reset_index()
                 reliability.columns = ['ROUTE_ID', 'total_trips', 'cancelled_trips']
@@ -276,16 +421,15 @@ class APSRTCDataLoader:
         if 'schedule' in self.data_cache:
             schedule = self.data_cache['schedule']
             if 'DISTANCE_KM' in schedule.columns:
-                distance = schedule.groupby('ROUTE_ID')['DISTANCE_KM'].mean().reset_index()
+                distance = schedule.groupby('ROUTE_ID', observed=True)['DISTANCE_KM'].mean().reset_index()
                 distance.columns = ['ROUTE_ID', 'avg_distance_km']
                 stats_list.append(distance)
                 
-        # Merge all stats
+        # Merge all stats: each has one row per ROUTE_ID, so align them on
+        # that index in one concat instead of chaining outer merges
         if stats_list:
-            route_stats = stats_list[0]
-            for df in stats_list[1:]:
-                route_stats = route_stats.merge(df, on='ROUTE_ID', how='outer')
-            return route_stats
+            frames = [df.set_index('ROUTE_ID') for df in stats_list]
+            return pd.concat(frames, axis=1, join='outer').reset_index()
         else:
             return pd.DataFrame()
     
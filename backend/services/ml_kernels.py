@@ -0,0 +1,27 @@
+"""
+Per-bus rule kernels for fleet-wide batch scoring.
+
+Compiled with Numba when it is installed (parallel across the fleet);
+otherwise plain NumPy versions with the same signatures are used.
+Results are written into a caller-provided boolean `out` array.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def detect_anomaly_vec(occ, delay, speed, out):
+        """Rule-based anomaly flag per bus (overcrowded, critically late or stalled)."""
+        for i in prange(occ.shape[0]):
+            out[i] = occ[i] > 95 or delay[i] > 30 or speed[i] < 5
+else:
+    def detect_anomaly_vec(occ, delay, speed, out):
+        """Rule-based anomaly flag per bus (overcrowded, critically late or stalled)."""
+        np.logical_or(occ > 95, delay > 30, out=out)
+        out |= speed < 5
@@ -2,6 +2,15 @@
 Real ML models for APSRTC predictions.
 Includes delay prediction, demand forecasting, and anomaly detection.
 """
+import os
+
+# Threads for training and inference. All cores (n_jobs=-1) oversubscribes
+# high-core hosts and slows XGBoost down; half of them, at most 16, unless
+# APSRTC_ML_THREADS says otherwise. OMP_NUM_THREADS only takes effect if no
+# OpenMP runtime has been loaded yet, hence before the imports below.
+ML_THREADS = int(os.environ.get("APSRTC_ML_THREADS", max(1, min(16, (os.cpu_count() or 2) // 2))))
+os.environ.setdefault("OMP_NUM_THREADS", str(ML_THREADS))
+
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor, IsolationForest
@@ -11,12 +20,194 @@ from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_percenta
 import xgboost as xgb
 from typing import Dict, Optional, Tuple
 import joblib
-import os
+import json
+import functools
+import shutil
+import subprocess
 from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
-class DelayPredictionModel:
+# Tree ensembles compiled to native code (Treelite + TL2cgen) when installed;
+# otherwise predictions go through the XGBoost Booster
+try:
+    import treelite
+    import tl2cgen
+    TREELITE_AVAILABLE = True
+except ImportError:
+    TREELITE_AVAILABLE = False
+
+
+def _column_medians(df: pd.DataFrame, feature_cols) -> Dict[str, float]:
+    """Median of each numeric feature column, used to fill its missing values."""
+    return {col: float(df[col].median()) for col in feature_cols if df[col].dtype.kind in 'fi'}
+
+
+def _fit_encoder(values: pd.Series) -> Tuple[LabelEncoder, np.ndarray]:
+    """
+    LabelEncoder().fit_transform(values.astype(str)) via a pandas categorical,
+    whose hash-table factorization is much faster on large string columns.
+    Categories come out sorted like LabelEncoder.classes_, so codes match.
+    """
+    cat = values.astype(str).astype('category')
+    encoder = LabelEncoder()
+    encoder.classes_ = cat.cat.categories.to_numpy()
+    return encoder, cat.cat.codes.to_numpy(dtype=np.int32)
+
+
+def _encode_with_unseen(encoder: LabelEncoder, values: pd.Series) -> np.ndarray:
+    """
+    encoder.transform for a whole column in one hash-map pass; categories the
+    encoder never saw get -1.
+    """
+    return values.astype(str).map(_class_codes(encoder)).fillna(-1).astype(np.int32).to_numpy()
+
+
+def _class_codes(encoder: LabelEncoder) -> Dict[str, int]:
+    """class -> code map of a fitted encoder."""
+    # Built on first use and pickled with the encoder (older pickles lack it)
+    codes = getattr(encoder, '_class_to_code', None)
+    if codes is None:
+        codes = {c: i for i, c in enumerate(encoder.classes_)}
+        encoder._class_to_code = codes
+    return codes
+
+
+# Scalar feature flags for one-row predictions
+PEAK_HOURS = frozenset(range(7, 11)) | frozenset(range(17, 21))
+WEEKEND_DAYS = frozenset({5, 6})
+
+# The same flags as lookup tables (hour of day / day of week -> 0 or 1), so a
+# batch computes them with one array gather
+_PEAK_HOUR = np.zeros(24, dtype=np.uint8)
+_PEAK_HOUR[sorted(PEAK_HOURS)] = 1
+_IS_WEEKEND = np.zeros(7, dtype=np.uint8)
+_IS_WEEKEND[sorted(WEEKEND_DAYS)] = 1
+
+
+# Boosting stops after this many rounds without improvement on the held-out slice
+EARLY_STOPPING_ROUNDS = 10
+EARLY_STOPPING_FRACTION = 0.1
+
+
+@functools.lru_cache(maxsize=1)
+def _training_device() -> str:
+    """'cuda' when XGBoost was built with CUDA and can train on a visible GPU, else 'cpu'."""
+    if not xgb.build_info().get('USE_CUDA') or shutil.which('nvidia-smi') is None:
+        return 'cpu'
+    try:
+        gpus = subprocess.run(['nvidia-smi', '-L'], capture_output=True, text=True, timeout=10)
+        return 'cuda' if gpus.returncode == 0 and 'GPU' in gpus.stdout else 'cpu'
+    except (OSError, subprocess.SubprocessError):
+        return 'cpu'
+
+
+def _fit_xgb(model: xgb.XGBRegressor, X, y) -> xgb.XGBRegressor:
+    """
+    Fit on the GPU when there is one. Inference stays on the CPU: requests
+    score a row or a fleet at a time, too little to pay for a device copy.
+    
+    Boosting stops once a held-out slice of X stops improving, and trees past
+    the best iteration are dropped so the served model is no larger than needed.
+    """
+    X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=EARLY_STOPPING_FRACTION, random_state=42)
+    
+    device = _training_device()
+    model.set_params(tree_method='hist', device=device, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+    if device == 'cuda':
+        print("  Training on GPU (cuda)")
+    model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+    
+    rounds = model.best_iteration + 1
+    booster = model.get_booster()
+    if rounds < booster.num_boosted_rounds():
+        trimmed = booster[:rounds]
+        trimmed.set_attr(best_iteration=str(rounds - 1), best_score=booster.attr('best_score'))
+        model._Booster = trimmed
+    print(f"  Early stopping kept {rounds} of {model.n_estimators} trees")
+    
+    model.set_params(device='cpu', n_estimators=rounds, early_stopping_rounds=None)
+    return model
+
+
+def _float32_array(X: pd.DataFrame) -> np.ndarray:
+    """Features as a C-contiguous float32 array, the layout XGBoost reads without converting."""
+    return np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+
+
+def _booster_predict(model: xgb.XGBRegressor, X: pd.DataFrame, compiled=None) -> np.ndarray:
+    """
+    Predict on a contiguous float32 array: with the compiled predictor when
+    there is one, else straight from the Booster (skipping the sklearn
+    wrapper's per-call validation and DMatrix construction).
+    """
+    return _predict_array(model, _float32_array(X), compiled)
+
+
+def _predict_array(model: xgb.XGBRegressor, arr: np.ndarray, compiled=None) -> np.ndarray:
+    """_booster_predict for a float32 feature array."""
+    if compiled is not None:
+        return np.asarray(compiled.predict(tl2cgen.DMatrix(arr))).reshape(-1)
+    return model.get_booster().inplace_predict(arr)
+
+
+def _compile_model(model: xgb.XGBRegressor, libpath: str) -> bool:
+    """Compile a trained XGBoost model to a native shared library at libpath."""
+    # A library left from an older model must not be loaded with the new one
+    if os.path.exists(libpath):
+        os.remove(libpath)
+    if not TREELITE_AVAILABLE:
+        return False
+    try:
+        tl_model = treelite.frontend.from_xgboost(model.get_booster())
+        tl2cgen.export_lib(tl_model, toolchain='gcc', libpath=libpath, params={'parallel_comp': 32, 'quantize': 1})
+        return True
+    except Exception as e:
+        print(f"✗ Could not compile {libpath}: {e}")
+        return False
+
+
+def _load_compiled(libpath: str):
+    """Load a compiled predictor, or None if it isn't there or can't be loaded."""
+    if not TREELITE_AVAILABLE or not os.path.exists(libpath):
+        return None
+    try:
+        return tl2cgen.Predictor(libpath)
+    except Exception as e:
+        print(f"✗ Could not load compiled model {libpath}: {e}")
+        return None
+
+
+class _ServingMixin:
+    """
+    Serving helpers shared by the XGBoost models: an optional compiled
+    predictor (never pickled with the model) and a pandas-free one-row path.
+    """
+    
+    compiled = None  # tl2cgen.Predictor, set by load_models
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('compiled', None)
+        return state
+    
+    def _encode(self, col: str, value) -> int:
+        """Code of value in col's encoder (-1 if unseen)."""
+        return _class_codes(self.label_encoders[col]).get(str(value), -1)
+    
+    def _predict_row(self, features: Dict[str, float]) -> Optional[float]:
+        """
+        Score one row given by feature name, skipping DataFrame construction
+        and prepare_features. None if the row lacks a trained feature.
+        """
+        try:
+            row = np.array([[features[col] for col in self.feature_columns]], dtype=np.float32)
+        except KeyError:
+            return None
+        return float(_predict_array(self.model, row, self.compiled)[0])
+
+
+class DelayPredictionModel(_ServingMixin):
     """XGBoost-based delay prediction model."""
     
     def __init__(self):
@@ -27,7 +218,8 @@ class DelayPredictionModel:
         
     def prepare_features(self, df: pd.DataFrame, fit_encoders: bool = False) -> pd.DataFrame:
         """Prepare features for model training/prediction."""
-        df = df.copy()
+        # Only the feature columns are written out; df itself is never copied or modified
+        out = pd.DataFrame(index=df.index)
         
         # Encode categorical variables
         categorical_cols = ['ROUTE_ID', 'SERVICE_TYPE_NAME']
@@ -35,47 +227,31 @@ class DelayPredictionModel:
         for col in categorical_cols:
             if col in df.columns:
                 if fit_encoders or col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                    df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
+                    self.label_encoders[col], out[f'{col}_encoded'] = _fit_encoder(df[col])
                 else:
                     # Handle unseen categories
-                    df[f'{col}_encoded'] = df[col].astype(str).apply(
-                        lambda x: self.label_encoders[col].transform([x])[0] 
-                        if x in self.label_encoders[col].classes_ else -1
-                    )
+                    out[f'{col}_encoded'] = _encode_with_unseen(self.label_encoders[col], df[col])
         
         # Select feature columns
-        feature_cols = []
-        
-        if 'ROUTE_ID_encoded' in df.columns:
-            feature_cols.append('ROUTE_ID_encoded')
-        if 'SERVICE_TYPE_NAME_encoded' in df.columns:
-            feature_cols.append('SERVICE_TYPE_NAME_encoded')
-        if 'hour' in df.columns:
-            feature_cols.append('hour')
-        if 'day_of_week' in df.columns:
-            feature_cols.append('day_of_week')
-        if 'is_peak_hour' in df.columns:
-            feature_cols.append('is_peak_hour')
-        if 'DISTANCE_KM' in df.columns:
-            feature_cols.append('DISTANCE_KM')
-        if 'TOTAL_TRAVEL_MINUTES' in df.columns:
-            feature_cols.append('TOTAL_TRAVEL_MINUTES')
+        for col in ['hour', 'day_of_week', 'is_peak_hour', 'DISTANCE_KM', 'TOTAL_TRAVEL_MINUTES']:
+            if col in df.columns:
+                out[col] = df[col].to_numpy()
+        feature_cols = list(out.columns)
             
         # Store feature columns
         if fit_encoders:
             self.feature_columns = feature_cols
             
-        # Fill missing values
-        for col in feature_cols:
-            if col in df.columns:
-                df[col] = df[col].fillna(df[col].median() if df[col].dtype in ['float64', 'int64'] else 0)
-            else:
-                df[col] = 0
+        # Fill missing values with the training medians (0 for non-numeric columns)
+        if fit_encoders:
+            self._medians = _column_medians(out, feature_cols)
+        medians = getattr(self, '_medians', None)
+        if medians is None:  # pickled before medians were stored
+            medians = _column_medians(out, feature_cols)
                 
-        return df[feature_cols] if feature_cols else df
+        return out.fillna(medians).fillna(0) if feature_cols else df
     
-    def train(self, delay_data: pd.DataFrame) -> Dict:
+    def train(self, delay_data: pd.DataFrame, n_jobs: int = ML_THREADS) -> Dict:
         """Train the delay prediction model."""
         print("Training delay prediction model...")
         
@@ -88,21 +264,26 @@ class DelayPredictionModel:
             print(f"Warning: Only {len(X)} samples available for training")
             return {'status': 'insufficient_data', 'samples': len(X)}
         
+        # float32 up front: half the memory of float64 and no conversion inside XGBoost
+        X = _float32_array(X)
+        y = y.astype(np.float32)
+        
         # Train/test split
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42
         )
         
         # Train XGBoost model
+        self.compiled = None  # built from the previous model
         self.model = xgb.XGBRegressor(
             n_estimators=100,
             max_depth=6,
             learning_rate=0.1,
             random_state=42,
-            n_jobs=-1
+            n_jobs=n_jobs
         )
         
-        self.model.fit(X_train, y_train)
+        _fit_xgb(self.model, X_train, y_train)
         self.is_trained = True
         
         # Evaluate
@@ -116,6 +297,7 @@ class DelayPredictionModel:
             'status': 'success',
             'r2_score': r2,
             'rmse': rmse,
+            'trees': self.model.n_estimators,
             'samples': len(X),
             'features': self.feature_columns
         }
@@ -128,24 +310,46 @@ class DelayPredictionModel:
             # Return mock prediction
             return np.random.uniform(0, 15)
         
-        # Create input dataframe
-        input_df = pd.DataFrame([{
-            'ROUTE_ID': route_id,
+        if 'ROUTE_ID' in self.label_encoders and 'SERVICE_TYPE_NAME' in self.label_encoders:
+            prediction = self._predict_row({
+                'ROUTE_ID_encoded': self._encode('ROUTE_ID', route_id),
+                'SERVICE_TYPE_NAME_encoded': self._encode('SERVICE_TYPE_NAME', service_type),
+                'hour': hour,
+                'day_of_week': day_of_week,
+                'is_peak_hour': int(hour in PEAK_HOURS),
+                'DISTANCE_KM': distance_km,
+                'TOTAL_TRAVEL_MINUTES': travel_minutes
+            })
+            if prediction is not None:
+                return max(0.0, prediction)  # Ensure non-negative
+        
+        return float(self.predict_batch(
+            [route_id], [hour], [day_of_week],
+            distance_km=distance_km, travel_minutes=travel_minutes, service_type=service_type
+        )[0])
+
+
+    def predict_batch(self, route_ids, hours, days_of_week,
+                      distance_km: float = 50, travel_minutes: float = 60,
+                      service_type: str = 'EXPRESS') -> np.ndarray:
+        """Predict delays for many (route, hour, day) rows with one model call."""
+        hours = np.asarray(hours, dtype=np.int64)
+        
+        input_df = pd.DataFrame({
+            'ROUTE_ID': list(route_ids),
             'SERVICE_TYPE_NAME': service_type,
-            'hour': hour,
-            'day_of_week': day_of_week,
-            'is_peak_hour': 1 if (7 <= hour <= 10) or (17 <= hour <= 20) else 0,
+            'hour': hours,
+            'day_of_week': np.asarray(days_of_week),
+            'is_peak_hour': _PEAK_HOUR[hours % 24],
             'DISTANCE_KM': distance_km,
             'TOTAL_TRAVEL_MINUTES': travel_minutes
-        }])
+        })
         
         X = self.prepare_features(input_df, fit_encoders=False)
-        prediction = self.model.predict(X)[0]
-        
-        return max(0, prediction)  # Ensure non-negative
+        return np.maximum(0, _booster_predict(self.model, X, self.compiled))  # Ensure non-negative
 
 
-class DemandForecastingModel:
+class DemandForecastingModel(_ServingMixin):
     """Demand forecasting using XGBoost for time series."""
     
     def __init__(self):
@@ -156,48 +360,35 @@ class DemandForecastingModel:
         
     def prepare_features(self, df: pd.DataFrame, fit_encoders: bool = False) -> pd.DataFrame:
         """Prepare features for demand forecasting."""
-        df = df.copy()
+        # Only the feature columns are written out; df itself is never copied or modified
+        out = pd.DataFrame(index=df.index)
         
         # Encode route ID
         if 'ROUTE_ID' in df.columns:
             if fit_encoders or 'ROUTE_ID' not in self.label_encoders:
-                self.label_encoders['ROUTE_ID'] = LabelEncoder()
-                df['ROUTE_ID_encoded'] = self.label_encoders['ROUTE_ID'].fit_transform(df['ROUTE_ID'].astype(str))
+                self.label_encoders['ROUTE_ID'], out['ROUTE_ID_encoded'] = _fit_encoder(df['ROUTE_ID'])
             else:
-                df['ROUTE_ID_encoded'] = df['ROUTE_ID'].astype(str).apply(
-                    lambda x: self.label_encoders['ROUTE_ID'].transform([x])[0]
-                    if x in self.label_encoders['ROUTE_ID'].classes_ else -1
-                )
+                out['ROUTE_ID_encoded'] = _encode_with_unseen(self.label_encoders['ROUTE_ID'], df['ROUTE_ID'])
         
         # Select features
-        feature_cols = []
-        
-        if 'ROUTE_ID_encoded' in df.columns:
-            feature_cols.append('ROUTE_ID_encoded')
-        if 'hour' in df.columns:
-            feature_cols.append('hour')
-        if 'day_of_week' in df.columns:
-            feature_cols.append('day_of_week')
-        if 'month' in df.columns:
-            feature_cols.append('month')
-        if 'is_peak_hour' in df.columns:
-            feature_cols.append('is_peak_hour')
-        if 'is_weekend' in df.columns:
-            feature_cols.append('is_weekend')
+        for col in ['hour', 'day_of_week', 'month', 'is_peak_hour', 'is_weekend']:
+            if col in df.columns:
+                out[col] = df[col].to_numpy()
+        feature_cols = list(out.columns)
             
         if fit_encoders:
             self.feature_columns = feature_cols
             
-        # Fill missing values
-        for col in feature_cols:
-            if col in df.columns:
-                df[col] = df[col].fillna(df[col].median() if df[col].dtype in ['float64', 'int64'] else 0)
-            else:
-                df[col] = 0
+        # Fill missing values with the training medians (0 for non-numeric columns)
+        if fit_encoders:
+            self._medians = _column_medians(out, feature_cols)
+        medians = getattr(self, '_medians', None)
+        if medians is None:  # pickled before medians were stored
+            medians = _column_medians(out, feature_cols)
                 
-        return df[feature_cols] if feature_cols else df
+        return out.fillna(medians).fillna(0) if feature_cols else df
     
-    def train(self, demand_data: pd.DataFrame) -> Dict:
+    def train(self, demand_data: pd.DataFrame, n_jobs: int = ML_THREADS) -> Dict:
         """Train the demand forecasting model."""
         print("Training demand forecasting model...")
         
@@ -210,21 +401,26 @@ class DemandForecastingModel:
             print(f"Warning: Only {len(X)} samples available for training")
             return {'status': 'insufficient_data', 'samples': len(X)}
         
+        # float32 up front: half the memory of float64 and no conversion inside XGBoost
+        X = _float32_array(X)
+        y = y.astype(np.float32)
+        
         # Train/test split
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42
         )
         
         # Train model
+        self.compiled = None  # built from the previous model
         self.model = xgb.XGBRegressor(
             n_estimators=100,
             max_depth=5,
             learning_rate=0.1,
             random_state=42,
-            n_jobs=-1
+            n_jobs=n_jobs
         )
         
-        self.model.fit(X_train, y_train)
+        _fit_xgb(self.model, X_train, y_train)
         self.is_trained = True
         
         # Evaluate
@@ -238,6 +434,7 @@ class DemandForecastingModel:
             'status': 'success',
             'r2_score': r2,
             'mape': mape,
+            'trees': self.model.n_estimators,
             'samples': len(X),
             'features': self.feature_columns
         }
@@ -246,24 +443,40 @@ class DemandForecastingModel:
         """Predict passenger demand."""
         if not self.is_trained:
             # Return mock prediction
-            if (7 <= hour <= 10) or (17 <= hour <= 20):
+            if hour in PEAK_HOURS:
                 return np.random.randint(50, 100)
             return np.random.randint(10, 40)
         
-        # Create input
-        input_df = pd.DataFrame([{
-            'ROUTE_ID': route_id,
-            'hour': hour,
-            'day_of_week': day_of_week,
-            'month': month,
-            'is_peak_hour': 1 if (7 <= hour <= 10) or (17 <= hour <= 20) else 0,
-            'is_weekend': 1 if day_of_week in [5, 6] else 0
-        }])
+        if 'ROUTE_ID' in self.label_encoders:
+            prediction = self._predict_row({
+                'ROUTE_ID_encoded': self._encode('ROUTE_ID', route_id),
+                'hour': hour,
+                'day_of_week': day_of_week,
+                'month': month,
+                'is_peak_hour': int(hour in PEAK_HOURS),
+                'is_weekend': int(day_of_week in WEEKEND_DAYS)
+            })
+            if prediction is not None:
+                return max(0, int(prediction))
+        
+        return int(self.predict_batch([route_id], [hour], [day_of_week], [month])[0])
+    
+    def predict_batch(self, route_ids, hours, days_of_week, months) -> np.ndarray:
+        """Predict passenger demand for many (route, hour, day, month) rows with one model call."""
+        hours = np.asarray(hours, dtype=np.int64)
+        days_of_week = np.asarray(days_of_week, dtype=np.int64)
+        
+        input_df = pd.DataFrame({
+            'ROUTE_ID': list(route_ids),
+            'hour': hours,
+            'day_of_week': days_of_week,
+            'month': np.asarray(months),
+            'is_peak_hour': _PEAK_HOUR[hours % 24],
+            'is_weekend': _IS_WEEKEND[days_of_week % 7]
+        })
         
         X = self.prepare_features(input_df, fit_encoders=False)
-        prediction = self.model.predict(X)[0]
-        
-        return max(0, int(prediction))
+        return np.maximum(0, _booster_predict(self.model, X, self.compiled)).astype(int)
 
 
 class AnomalyDetectionModel:
@@ -273,7 +486,7 @@ class AnomalyDetectionModel:
         self.model = None
         self.is_trained = False
         
-    def train(self, bus_data: pd.DataFrame) -> Dict:
+    def train(self, bus_data: pd.DataFrame, n_jobs: int = ML_THREADS) -> Dict:
         """Train anomaly detection model."""
         print("Training anomaly detection model...")
         
@@ -295,7 +508,7 @@ class AnomalyDetectionModel:
         self.model = IsolationForest(
             contamination=0.1,  # Expect 10% anomalies
             random_state=42,
-            n_jobs=-1
+            n_jobs=n_jobs
         )
         
         self.model.fit(X)
@@ -315,10 +528,19 @@ class AnomalyDetectionModel:
             # Rule-based fallback
             return occupancy > 95 or delay > 30 or speed < 5
         
-        X = np.array([[occupancy, delay, speed]])
-        prediction = self.model.predict(X)[0]
+        return bool(self.detect_batch(np.array([[occupancy, delay, speed]], dtype=np.float32))[0])
+    
+    def detect_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Detect anomalies for an (N, 3) array of occupancy, delay, speed rows.
+        Returns a boolean mask of length N (True = anomaly).
+        """
+        X = np.asarray(X, dtype=np.float32)  # IsolationForest scores in float32 anyway
+        if not self.is_trained:
+            # Rule-based fallback
+            return (X[:, 0] > 95) | (X[:, 1] > 30) | (X[:, 2] < 5)
         
-        return prediction == -1  # -1 indicates anomaly
+        return self.model.predict(X) == -1  # -1 indicates anomaly
 
 
 # Global model instances
@@ -327,17 +549,61 @@ demand_model = DemandForecastingModel()
 anomaly_model = AnomalyDetectionModel()
 
 
+def _save_xgb_model(wrapper, name: str, model_dir: str):
+    """
+    Save an XGBoost-backed model as the Booster in XGBoost's native UBJSON
+    format plus a small JSON sidecar (encoder classes, features, medians).
+    """
+    model_path = f"{model_dir}/{name}.ubj"
+    wrapper.model.save_model(model_path)
+    meta = {
+        "classes": {col: [str(c) for c in encoder.classes_] for col, encoder in wrapper.label_encoders.items()},
+        "feature_columns": wrapper.feature_columns,
+        "medians": getattr(wrapper, '_medians', None)
+    }
+    with open(f"{model_dir}/{name}_meta.json", "w") as f:
+        json.dump(meta, f)
+    print(f"✓ Saved {name.replace('_', ' ')} to {model_path}")
+
+
+def _load_xgb_model(cls, name: str, model_dir: str):
+    """Rebuild a model saved by _save_xgb_model; None if it isn't there."""
+    model_path = f"{model_dir}/{name}.ubj"
+    meta_path = f"{model_dir}/{name}_meta.json"
+    if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+        return None
+    
+    with open(meta_path) as f:
+        meta = json.load(f)
+    
+    wrapper = cls()
+    wrapper.model = xgb.XGBRegressor()
+    wrapper.model.load_model(model_path)
+    for col, classes in meta["classes"].items():
+        encoder = LabelEncoder()
+        encoder.classes_ = np.array(classes)
+        wrapper.label_encoders[col] = encoder
+    wrapper.feature_columns = meta["feature_columns"]
+    if meta.get("medians") is not None:
+        wrapper._medians = meta["medians"]
+    wrapper.is_trained = True
+    print(f"✓ Loaded {name.replace('_', ' ')} from {model_path}")
+    return wrapper
+
+
 def save_models(model_dir: str = "backend/models/trained"):
     """Save trained models to disk."""
     os.makedirs(model_dir, exist_ok=True)
     
     if delay_model.is_trained:
-        joblib.dump(delay_model, f"{model_dir}/delay_model.pkl")
-        print(f"✓ Saved delay model to {model_dir}/delay_model.pkl")
+        _save_xgb_model(delay_model, "delay_model", model_dir)
+        if _compile_model(delay_model.model, f"{model_dir}/delay_model.so"):
+            print(f"✓ Compiled delay model to {model_dir}/delay_model.so")
         
     if demand_model.is_trained:
-        joblib.dump(demand_model, f"{model_dir}/demand_model.pkl")
-        print(f"✓ Saved demand model to {model_dir}/demand_model.pkl")
+        _save_xgb_model(demand_model, "demand_model", model_dir)
+        if _compile_model(demand_model.model, f"{model_dir}/demand_model.so"):
+            print(f"✓ Compiled demand model to {model_dir}/demand_model.so")
         
     if anomaly_model.is_trained:
         joblib.dump(anomaly_model, f"{model_dir}/anomaly_model.pkl")
@@ -348,17 +614,31 @@ def load_models(model_dir: str = "backend/models/trained"):
     """Load trained models from disk."""
     global delay_model, demand_model, anomaly_model
     
+    # Native XGBoost format first; pickles are what older versions saved
+    loaded = _load_xgb_model(DelayPredictionModel, "delay_model", model_dir)
     delay_path = f"{model_dir}/delay_model.pkl"
-    if os.path.exists(delay_path):
-        delay_model = joblib.load(delay_path)
+    if loaded is None and os.path.exists(delay_path):
+        loaded = joblib.load(delay_path)
         print(f"✓ Loaded delay model from {delay_path}")
+    if loaded is not None:
+        delay_model = loaded
+        delay_model.compiled = _load_compiled(f"{model_dir}/delay_model.so")
         
+    loaded = _load_xgb_model(DemandForecastingModel, "demand_model", model_dir)
     demand_path = f"{model_dir}/demand_model.pkl"
-    if os.path.exists(demand_path):
-        demand_model = joblib.load(demand_path)
+    if loaded is None and os.path.exists(demand_path):
+        loaded = joblib.load(demand_path)
         print(f"✓ Loaded demand model from {demand_path}")
+    if loaded is not None:
+        demand_model = loaded
+        demand_model.compiled = _load_compiled(f"{model_dir}/demand_model.so")
         
     anomaly_path = f"{model_dir}/anomaly_model.pkl"
     if os.path.exists(anomaly_path):
         anomaly_model = joblib.load(anomaly_path)
         print(f"✓ Loaded anomaly model from {anomaly_path}")
+    
+    # Models saved before the thread cap still carry n_jobs=-1
+    for loaded in (delay_model, demand_model, anomaly_model):
+        if loaded.model is not None:
+            loaded.model.set_params(n_jobs=ML_THREADS)
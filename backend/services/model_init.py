@@ -40,23 +40,18 @@ def initialize_models():
         print("Application will continue with mock predictions")
 
 
-def train_models_now():
-    """Train models immediately."""
+# Training scheduled on the server's event loop (kept so the task isn't garbage collected)
+_training_task = None
+
+
+async def _train_and_report():
+    """Run training, logging the outcome like train_models_now does."""
+    from services.model_trainer import train_all_models
+    
     try:
-        print("Training models from data files...")
-        
-        from services.model_trainer import train_all_models
-        import asyncio
-        
-        # Run training
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        results = loop.run_until_complete(train_all_models())
-        loop.close()
-        
+        results = await train_all_models()
         print("✓ Model training completed")
         return results
-        
     except Exception as e:
         print(f"✗ Error training models: {e}")
         import traceback
@@ -64,5 +59,30 @@ def train_models_now():
         return None
 
 
+def train_models_now():
+    """
+    Train models immediately.
+    
+    Called from a running event loop (server startup), training is scheduled
+    on that loop and the task is returned instead of the results.
+    """
+    global _training_task
+    import asyncio
+    
+    print("Training models from data files...")
+    
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    
+    if loop is not None:
+        _training_task = loop.create_task(_train_and_report())
+        print("✓ Model training scheduled in the background")
+        return _training_task
+    
+    return asyncio.run(_train_and_report())
+
+
 if __name__ == "__main__":
     initialize_models()
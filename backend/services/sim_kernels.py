@@ -0,0 +1,56 @@
+"""
+Per-tick bus movement kernel for the simulation.
+
+Compiled with Numba when it is installed (parallel across the fleet);
+otherwise a plain NumPy version with the same signature is used.
+Bus state arrays are updated in place; `arrived` is set to True for buses
+that reached their next stop this tick. seg_inv_dist[j] is 1 / the length
+of the path segment starting at flattened path point j.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def step_buses(lat, lon, progress, stop, path_lat, path_lon, seg_inv_dist, bus_off, bus_len, speed_factor, step, arrived):
+        """Move each bus step * speed_factor degrees along its route and interpolate its position."""
+        for i in prange(lat.shape[0]):
+            off = bus_off[i]
+            length = bus_len[i]
+            s = stop[i]
+            cur = off + s
+            nxt = off + (s + 1) % length
+
+            p = progress[i] + step * speed_factor[i] * seg_inv_dist[cur]
+            arrived[i] = p >= 1.0
+            if arrived[i]:
+                p = 0.0
+                s = (s + 1) % length
+                stop[i] = s
+                cur = nxt
+                nxt = off + (s + 1) % length
+            progress[i] = p
+
+            lat[i] = path_lat[cur] + (path_lat[nxt] - path_lat[cur]) * p
+            lon[i] = path_lon[cur] + (path_lon[nxt] - path_lon[cur]) * p
+else:
+    def step_buses(lat, lon, progress, stop, path_lat, path_lon, seg_inv_dist, bus_off, bus_len, speed_factor, step, arrived):
+        """Move each bus step * speed_factor degrees along its route and interpolate its position."""
+        cur = bus_off + stop
+        nxt = bus_off + (stop + 1) % bus_len
+        progress += step * speed_factor * seg_inv_dist[cur]
+        np.greater_equal(progress, 1.0, out=arrived)
+        if arrived.any():
+            progress[arrived] = 0.0
+            stop[arrived] = (stop[arrived] + 1) % bus_len[arrived]
+            cur = bus_off + stop
+            nxt = bus_off + (stop + 1) % bus_len
+
+        lat[:] = path_lat[cur] + (path_lat[nxt] - path_lat[cur]) * progress
+        lon[:] = path_lon[cur] + (path_lon[nxt] - path_lon[cur]) * progress
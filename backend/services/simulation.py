@@ -1,90 +1,190 @@
 import asyncio
 import random
-from typing import List, Dict, Optional
+from collections import defaultdict
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
-import math
+import hashlib
+import json
+import numpy as np
+import orjson
 import pandas as pd
 import os
+from pathlib import Path
+from services.sim_kernels import step_buses
+
+# Integer codes for Bus.status in the per-bus arrays
+STATUS_CODES = {"on-time": 0, "minor-delay": 1, "critical-delay": 2}
+ON_TIME = STATUS_CODES["on-time"]
+
+# Status names by code, and how fast a bus in each status moves
+STATUS_NAMES = tuple(sorted(STATUS_CODES, key=STATUS_CODES.get))
+SPEED_FACTORS = np.array([1.0, 0.6, 0.2])
+# Delay in minutes (low, high) drawn when a bus changes to each status
+DELAY_RANGES = np.array([[0, 4], [5, 14], [15, 45]])
+
+# Seconds between simulation ticks
+TICK_SECONDS = 1.0
+
+# Rough degrees moved per second at full speed (1 deg ~= 111km, ~40km/h)
+STEP_DEGREES = 0.0001
+
+# Parsed routes and route stats are snapshotted here, under the data directory
+SNAPSHOT_DIR = '.parquet_cache'
+
+# Rows of the ticketing file read at a time when summing revenue
+TICKETING_CHUNK_ROWS = 1_000_000
+
+# Network file columns the simulation uses (STOP_NAME and ROUTE_CODE are optional)
+NETWORK_COLUMNS = ['ROUTE_ID', 'SEQ_NO', 'LATITUDE', 'LONGITUDE', 'STOP_NAME', 'ROUTE_CODE']
+
+
+def _read_csv(path: str, usecols: List[str]) -> pd.DataFrame:
+    """read_csv of only usecols, with the multi-threaded Arrow parser (C parser if it fails)."""
+    try:
+        return pd.read_csv(path, engine='pyarrow', usecols=usecols)
+    except Exception as e:
+        print(f"PyArrow could not parse {os.path.basename(path)} ({e}), using the C parser")
+        return pd.read_csv(path, usecols=usecols, low_memory=False)
+
+
+def _read_excel(path: str, usecols: List[str], cache_dir: Path) -> pd.DataFrame:
+    """
+    read_excel of only usecols, through a Parquet copy in cache_dir that is
+    reused while the workbook's mtime and size match its sidecar.
+    """
+    cache_path = cache_dir / f"{os.path.basename(path)}.parquet"
+    meta_path = cache_dir / f"{os.path.basename(path)}.json"
+    
+    stat = os.stat(path)
+    source = {'path': path, 'mtime': stat.st_mtime, 'size': stat.st_size, 'columns': usecols}
+    
+    try:
+        if cache_path.exists() and json.loads(meta_path.read_text()) == source:
+            return pd.read_parquet(cache_path, columns=usecols)
+    except Exception as e:
+        print(f"Ignoring Parquet copy of {os.path.basename(path)}: {e}")
+    
+    df = pd.read_excel(path, usecols=usecols)
+    
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        meta_path.unlink(missing_ok=True)  # a half-written copy must never look valid
+        df.to_parquet(cache_path, compression='snappy')
+        meta_path.write_text(json.dumps(source))
+    except Exception as e:
+        print(f"Could not cache {os.path.basename(path)} as Parquet: {e}")
+    
+    return df
+
 
 class Route:
-    def __init__(self, route_id: str, name: str, path: List[Dict[str, float]]):
+    def __init__(self, route_id: str, name: str, path_lat, path_lon, stop_names=None):
         self.route_id = route_id
         self.name = name
-        self.path = path  # List of {lat, lon}
-        self.stops = path # For simplicity, treat all path points as stops
+        # Path point coordinates; for simplicity, treat all path points as stops
+        self.path_lat = np.asarray(path_lat, dtype=np.float32)
+        self.path_lon = np.asarray(path_lon, dtype=np.float32)
+        self.stop_names = stop_names  # Per point, when the network data has them
+
+    def __len__(self) -> int:
+        return len(self.path_lat)
+
+
+class _BusField:
+    """
+    A Bus attribute stored in the simulation's per-bus array `array`, at the
+    bus's index. Until the bus is registered, the value is kept on the bus.
+    """
+    def __init__(self, array: str, get=float, put=None):
+        self.array = array
+        self.get = get
+        self.put = put
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, bus, owner=None):
+        if bus is None:
+            return self
+        if bus._sim is None:
+            return bus._pending[self.name]
+        return self.get(getattr(bus._sim, self.array)[bus.index])
+
+    def __set__(self, bus, value):
+        if bus._sim is None:
+            bus._pending[self.name] = value
+        else:
+            getattr(bus._sim, self.array)[bus.index] = self.put(value) if self.put else value
+
 
 class Bus:
+    """
+    One simulated bus. Its changing state (position, progress, status, ...)
+    lives in the simulation's per-bus arrays, so a tick updates every bus at once.
+    """
+    lat = _BusField('lat_arr')
+    lon = _BusField('lon_arr')
+    current_stop_index = _BusField('stop_arr', get=int)
+    progress_to_next = _BusField('progress_arr') # 0.0 to 1.0
+    speed = _BusField('speed_arr') # km/h
+    status = _BusField('status_arr', get=STATUS_NAMES.__getitem__, put=STATUS_CODES.__getitem__) # on-time, minor-delay, critical-delay
+    delay_minutes = _BusField('delay_arr')
+    occupancy = _BusField('occupancy_arr')
+
     def __init__(self, bus_id: str, route: Route):
         self.bus_id = bus_id
         self.route = route
+        self._sim = None  # Set with index once the simulation allocates its arrays
+        self.index = -1
+        self._pending = {}
+        self._created = datetime.now()
         self.current_stop_index = 0
-        self.progress_to_next = 0.0 # 0.0 to 1.0
-        self.speed = 0.0 # km/h
-        self.status = "on-time" # on-time, minor-delay, critical-delay
+        self.progress_to_next = 0.0
+        self.speed = 0.0
+        self.status = "on-time"
         self.delay_minutes = 0.0
         self.occupancy = random.randint(10, 50)
-        self.last_updated = datetime.now()
         # Handle empty paths
-        if route.path:
-            self.lat = route.path[0]['lat']
-            self.lon = route.path[0]['lon']
+        if len(route):
+            self.lat = float(route.path_lat[0])
+            self.lon = float(route.path_lon[0])
         else:
             self.lat = 0.0
             self.lon = 0.0
 
-    def update_position(self, delta_seconds: float):
-        if not self.route.path:
-            return
-
-        # Simulate movement
-        if self.status == "critical-delay":
-            speed_factor = 0.2
-        elif self.status == "minor-delay":
-            speed_factor = 0.6
-        else:
-            speed_factor = 1.0
-
-        # Move along the path segments
-        # Simplified: Move percentage along current segment
-        
-        # Distance between current stop and next
-        current_stop = self.route.path[self.current_stop_index]
-        next_index = (self.current_stop_index + 1) % len(self.route.path)
-        next_stop = self.route.path[next_index]
-
-        # Calculate distance (rough approx)
-        dist = math.sqrt((next_stop['lat'] - current_stop['lat'])**2 + (next_stop['lon'] - current_stop['lon'])**2)
-        if dist == 0: dist = 0.001
-
-        # Move
-        # Adjust speed factor for lat/lon degrees (very rough approx, 1 deg ~= 111km)
-        # Assuming speed 40km/h approx
-        step = (0.0001 * delta_seconds * speed_factor) / dist
-        self.progress_to_next += step
-
-        if self.progress_to_next >= 1.0:
-            self.progress_to_next = 0.0
-            self.current_stop_index = next_index
-            
-            # Simulate passenger exchange at stop
-            change = random.randint(-5, 10)
-            self.occupancy = max(0, min(100, self.occupancy + change))
-
-        # Interpolate position
-        current_stop = self.route.path[self.current_stop_index]
-        next_stop = self.route.path[(self.current_stop_index + 1) % len(self.route.path)]
-        
-        self.lat = current_stop['lat'] + (next_stop['lat'] - current_stop['lat']) * self.progress_to_next
-        self.lon = current_stop['lon'] + (next_stop['lon'] - current_stop['lon']) * self.progress_to_next
-        
-        self.last_updated = datetime.now()
+    @property
+    def last_updated(self) -> datetime:
+        # Every bus is moved by the same tick
+        return self._sim.last_updated if self._sim is not None else self._created
 
 class TransportSimulation:
     def __init__(self):
         self.routes: Dict[str, Route] = {}
         self.buses: Dict[str, Bus] = {}
+        self.buses_by_route: Dict[str, List[Bus]] = defaultdict(list)  # Kept in sync by add_bus()
+        self.critical: List[Bus] = []  # Delayed/crowded buses, most severe first (refreshed every tick)
         self.running = False
+        
+        # Struct-of-arrays fleet state: element i of each per-bus array belongs to
+        # bus_list[i] (Bus attributes read and write them). Route paths are
+        # flattened into path_lat/path_lon; route i's points start at route_off[i].
+        self.bus_list: List[Bus] = []
+        self.route_ids: List[str] = []  # route index -> route_id
+        self.route_index: Dict[str, int] = {}  # route_id -> route index
+        self.route_list: List[Route] = []  # route index -> Route
+        self._build_paths()
+        
+        # Pre-serialized /api/live/buses payload: (tick, body, etag), rebuilt
+        # lazily on the first request after each tick
+        self.tick = 0
+        self._live_snapshot: Optional[tuple] = None
+        self._analytics_snapshot: Optional[tuple] = None  # (tick, body) of get_route_analytics()
+        
+        self.rng = np.random.default_rng()
+        self.last_updated = datetime.now()
+        
         self._init_data()
+        self._alloc_arrays()
 
     def _init_data(self):
         # Load real data
@@ -95,6 +195,79 @@ class TransportSimulation:
             print("Falling back to mock data.")
             self._init_mock_data()
 
+    def add_bus(self, bus: Bus) -> Bus:
+        """Register a bus and index it under its route."""
+        route_id = bus.route.route_id
+        self.buses[bus.bus_id] = bus
+        self.buses_by_route[route_id].append(bus)
+        self.bus_list.append(bus)
+        if route_id not in self.route_index:
+            self.route_index[route_id] = len(self.route_ids)
+            self.route_ids.append(route_id)
+            self.route_list.append(bus.route)
+        return bus
+
+    def _alloc_arrays(self):
+        """(Re)allocate the per-bus arrays to match bus_list, keeping every bus's state."""
+        buses = self.bus_list
+        # Read through the Bus attributes first: registered buses still point at the old arrays
+        state = {
+            'lat_arr': (np.float64, [b.lat for b in buses]),
+            'lon_arr': (np.float64, [b.lon for b in buses]),
+            'stop_arr': (np.int32, [b.current_stop_index for b in buses]),
+            'progress_arr': (np.float64, [b.progress_to_next for b in buses]),
+            'speed_arr': (np.float64, [b.speed for b in buses]),
+            'status_arr': (np.int8, [STATUS_CODES[b.status] for b in buses]),
+            'delay_arr': (np.float64, [b.delay_minutes for b in buses]),
+            'occupancy_arr': (np.float64, [b.occupancy for b in buses]),
+        }
+        for name, (dtype, values) in state.items():
+            setattr(self, name, np.array(values, dtype=dtype))
+        self.hour_arr = np.full(len(buses), self.last_updated.hour, dtype=np.int8)
+        
+        # Buses never change route, so route indices are set once here
+        self.route_idx_arr = np.array([self.route_index[b.route.route_id] for b in buses], dtype=np.int32)
+        
+        if len(self.route_len) != len(self.route_list):
+            self._build_paths()
+        self.bus_off = self.route_off[self.route_idx_arr]
+        self.bus_len = self.route_len[self.route_idx_arr]
+        
+        for i, bus in enumerate(buses):
+            bus._sim, bus.index = self, i
+
+    def _build_paths(self):
+        """
+        Flatten every route's path into one float32 buffer per coordinate, with
+        per-route offsets and lengths. Only needed when a bus brings a new route.
+        """
+        # A route without points gets a single (0, 0) point for its buses to sit on
+        routes = self.route_list
+        empty = np.zeros(1, dtype=np.float32)
+        self.route_len = np.array([max(len(route), 1) for route in routes], dtype=np.int32)
+        self.route_off = np.zeros(len(routes), dtype=np.int32)
+        np.cumsum(self.route_len[:-1], out=self.route_off[1:])
+        self.path_lat = np.concatenate([route.path_lat if len(route) else empty for route in routes] or [empty])
+        self.path_lon = np.concatenate([route.path_lon if len(route) else empty for route in routes] or [empty])
+        
+        # Inverse length of the segment from each path point to the next (the last
+        # point of a route leads back to its first); fixed by the geometry, so
+        # computed once and the kernels multiply instead of divide
+        nxt = (np.arange(len(self.path_lat)) + 1) % len(self.path_lat)
+        nxt[self.route_off + self.route_len - 1] = self.route_off
+        lat, lon = self.path_lat.astype(np.float64), self.path_lon.astype(np.float64)
+        seg_dist = np.hypot(lat[nxt] - lat, lon[nxt] - lon)
+        seg_dist[seg_dist == 0] = 0.001
+        self.seg_inv_dist = 1.0 / seg_dist
+
+    def route_counts(self) -> np.ndarray:
+        """Number of buses per route index."""
+        return np.bincount(self.route_idx_arr, minlength=len(self.route_ids))
+
+    def route_sums(self, values: np.ndarray) -> np.ndarray:
+        """Sum of a per-bus array per route index."""
+        return np.bincount(self.route_idx_arr, weights=values, minlength=len(self.route_ids))
+
     def load_real_data(self):
         # Paths hardcoded for now as per user environment
         base_path = "C:/Users/bhava/Desktop/RTGS"
@@ -111,37 +284,68 @@ class TransportSimulation:
         if not os.path.exists(network_file):
             raise FileNotFoundError(f"File not found: {network_file}")
 
+        # Parsed routes and stats are reused from the snapshot while the sources are unchanged
+        sources = [network_file, schedule_file, ticketing_file, haltwise_file]
+        if not self._load_snapshot(base_path, sources):
+            if self._parse_sources(network_file, schedule_file, ticketing_file, haltwise_file):
+                self._save_snapshot(base_path, sources)
+
+        # Initialize Buses - put 1-2 buses on each route
+        bus_count = 0
+        for r_id, route in self.routes.items():
+            # Bus 1
+            b_id = f"BUS-{r_id}-1"
+            bus = self.add_bus(Bus(b_id, route))
+            # Randomize start position
+            bus.current_stop_index = random.randint(0, max(0, len(route) - 2))
+            bus_count += 1
+            
+            # Chance for Bus 2
+            if random.random() > 0.5:
+                b_id2 = f"BUS-{r_id}-2"
+                bus2 = self.add_bus(Bus(b_id2, route))
+                bus2.current_stop_index = random.randint(0, max(0, len(route) - 2))
+                bus_count += 1
+        
+        print(f"Initialized {bus_count} buses.")
+
+    def _parse_sources(self, network_file: str, schedule_file: str, ticketing_file: str, haltwise_file: str) -> bool:
+        """Build routes, schedule_df and route_stats from the source files. Returns False if any file failed to load."""
+        complete = True
+        
         print(f"Loading network data from {network_file}...")
-        # Use iterator for large files if needed, or just read_csv if memory sufficient (64GB RAM assumption from env)
-        # Using low_memory=False to avoid dtypes warnings, or specify dtypes
-        df = pd.read_csv(network_file, low_memory=False)
+        # Only the columns used below are parsed (the header is read first to see which exist)
+        header = pd.read_csv(network_file, nrows=0).columns
+        df = _read_csv(network_file, [col for col in NETWORK_COLUMNS if col in header])
         
-        # Ensure lat/lon are numeric and drop invalid rows
-        df['LATITUDE'] = pd.to_numeric(df['LATITUDE'], errors='coerce')
-        df['LONGITUDE'] = pd.to_numeric(df['LONGITUDE'], errors='coerce')
+        # Ensure lat/lon are numeric (float32, as Route stores them) and drop invalid rows
+        df['LATITUDE'] = pd.to_numeric(df['LATITUDE'], errors='coerce').astype(np.float32)
+        df['LONGITUDE'] = pd.to_numeric(df['LONGITUDE'], errors='coerce').astype(np.float32)
         df = df.dropna(subset=['LATITUDE', 'LONGITUDE', 'ROUTE_ID', 'SEQ_NO'])
+        # Route IDs repeat on every stop row; filtering and grouping compare integer codes
+        df['ROUTE_ID'] = df['ROUTE_ID'].astype('category')
         
         # Group by Route ID
         # Limit to first 50 routes to avoid memory overload for now
         route_ids = df['ROUTE_ID'].unique()[:50]
         
+        # One filter, sort and grouping pass instead of a mask over the whole file per route
+        routes_df = df[df['ROUTE_ID'].isin(route_ids)].sort_values('SEQ_NO', kind='stable')
+        grouped = routes_df.groupby('ROUTE_ID', sort=False, observed=True)
+        
         count = 0
         for r_id in route_ids:
-            route_df = df[df['ROUTE_ID'] == r_id].sort_values('SEQ_NO')
+            route_df = grouped.get_group(r_id)
             
-            # Extract path
-            path = []
-            for _, row in route_df.iterrows():
-                path.append({
-                    "lat": row['LATITUDE'],
-                    "lon": row['LONGITUDE'],
-                    "name": row['STOP_NAME'] if 'STOP_NAME' in row else "Stop"
-                })
-            
-            if len(path) > 1:
+            if len(route_df) > 1:
                 route_name = str(route_df.iloc[0]['ROUTE_CODE']) if 'ROUTE_CODE' in route_df.columns else f"Route {r_id}"
+                # Extract path columns
+                stop_names = route_df['STOP_NAME'].to_numpy() if 'STOP_NAME' in route_df.columns else None
                 # Handle unique route keys if needed, but ROUTE_ID should be unique
-                self.routes[str(r_id)] = Route(str(r_id), route_name, path)
+                self.routes[str(r_id)] = Route(
+                    str(r_id), route_name,
+                    route_df['LATITUDE'].to_numpy(), route_df['LONGITUDE'].to_numpy(), stop_names
+                )
                 count += 1
 
         print(f"Loaded {count} routes.")
@@ -153,163 +357,289 @@ class TransportSimulation:
             try:
                 # Load minimal columns to save memory
                 # Columns observed: SERVICE_ID, SERVICE_TYPE_NAME, ROUTE_ID, TOTAL_TRAVEL_MINUTES
-                self.schedule_df = pd.read_csv(schedule_file, usecols=['SERVICE_ID', 'ROUTE_ID', 'TOTAL_TRAVEL_MINUTES'], low_memory=False)
+                self.schedule_df = _read_csv(schedule_file, ['SERVICE_ID', 'ROUTE_ID', 'TOTAL_TRAVEL_MINUTES'])
                 print(f"Schedule data loaded: {len(self.schedule_df)} records.")
             except Exception as e:
                 print(f"Error loading schedule data: {e}")
+                complete = False
 
         # Load Ticketing Data for Revenue & Occupancy
         self.route_stats = {}
         if os.path.exists(ticketing_file):
             print(f"Loading ticketing data from {ticketing_file}...")
             try:
-                # Load only necessary columns
-                tdf = pd.read_csv(ticketing_file, usecols=['ROUTE_ID', 'TOTAL_AMOUNT', 'TICKET_TYPE'])
-                # Group by ROUTE_ID
-                revenue_df = tdf.groupby('ROUTE_ID')['TOTAL_AMOUNT'].sum().reset_index()
+                # Sum revenue per route chunk by chunk, so the whole file is never in memory;
+                # amounts stay float64 so per-chunk sums don't lose precision
+                revenue = pd.Series(dtype='float64')
+                chunks = pd.read_csv(
+                    ticketing_file,
+                    usecols=['ROUTE_ID', 'TOTAL_AMOUNT'],
+                    dtype={'ROUTE_ID': 'category', 'TOTAL_AMOUNT': 'float64'},
+                    chunksize=TICKETING_CHUNK_ROWS
+                )
+                for chunk in chunks:
+                    chunk_revenue = chunk.groupby('ROUTE_ID', observed=True)['TOTAL_AMOUNT'].sum()
+                    revenue = revenue.add(chunk_revenue, fill_value=0)
                 # Store in a dict for easy lookup
-                for _, row in revenue_df.iterrows():
-                    rid = str(row['ROUTE_ID'])
-                    if rid not in self.route_stats: self.route_stats[rid] = {}
-                    self.route_stats[rid]['revenue'] = float(row['TOTAL_AMOUNT'])
+                for rid, total in zip(revenue.index.astype(str), revenue.to_numpy().tolist()):
+                    self.route_stats.setdefault(rid, {})['revenue'] = total
                 print("Ticketing data loaded.")
             except Exception as e:
                 print(f"Error loading ticketing data: {e}")
+                complete = False
 
         # Load HaltWise Data for Reliability
         if os.path.exists(haltwise_file):
              print(f"Loading haltwise data from {haltwise_file}...")
              try:
                  # Load minimal columns
-                 hdf = pd.read_excel(haltwise_file, usecols=['RouteID', 'isCancelled'])
+                 hdf = _read_excel(haltwise_file, ['RouteID', 'isCancelled'], Path(haltwise_file).parent / SNAPSHOT_DIR)
                  # Calculate cancellation rate or just count
                  reliability_df = hdf.groupby('RouteID').agg(
                      total_trips=('isCancelled', 'count'),
                      cancelled=('isCancelled', 'sum')
-                 ).reset_index()
+                 )
+                 
+                 # Simple reliability: 1 - cancellation_rate, as a percentage
+                 total_trips = reliability_df['total_trips'].to_numpy(dtype=float)
+                 cancelled = reliability_df['cancelled'].to_numpy(dtype=float)
+                 rate = 1.0 - np.divide(cancelled, total_trips, out=np.zeros_like(cancelled), where=total_trips > 0)
+                 reliability = np.round(rate * 100, 1).tolist()
                  
-                 for _, row in reliability_df.iterrows():
-                     rid = str(row['RouteID'])
-                     if rid not in self.route_stats: self.route_stats[rid] = {}
-                     # Simple reliability: 1 - cancellation_rate
-                     rate = 1.0 - (row['cancelled'] / row['total_trips'] if row['total_trips'] > 0 else 0)
-                     self.route_stats[rid]['reliability'] = round(rate * 100, 1) # Percentage
+                 for rid, value in zip(reliability_df.index.astype(str), reliability):
+                     self.route_stats.setdefault(rid, {})['reliability'] = value
                  print("Haltwise data loaded.")
              except Exception as e:
                  print(f"Error loading haltwise data: {e}")
+                 complete = False
 
-        # Initialize Buses - put 1-2 buses on each route
-        bus_count = 0
-        for r_id, route in self.routes.items():
-            # Bus 1
-            b_id = f"BUS-{r_id}-1"
-            self.buses[b_id] = Bus(b_id, route)
-            # Randomize start position
-            self.buses[b_id].current_stop_index = random.randint(0, max(0, len(route.path) - 2))
-            bus_count += 1
+        return complete
+
+    @staticmethod
+    def _snapshot_paths(base_path: str) -> Tuple[Path, Path, Path]:
+        cache_dir = Path(base_path) / SNAPSHOT_DIR
+        return cache_dir / "simulation_routes.parquet", cache_dir / "simulation_schedule.parquet", cache_dir / "simulation.json"
+
+    @staticmethod
+    def _source_signature(sources: List[str]) -> List:
+        """mtime and size of each source file (None when missing)."""
+        signature = []
+        for path in sources:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                signature.append([path, stat.st_mtime, stat.st_size])
+            else:
+                signature.append([path, None])
+        return signature
+
+    def _load_snapshot(self, base_path: str, sources: List[str]) -> bool:
+        """Load routes, schedule_df and route_stats from the snapshot if it matches the sources."""
+        routes_path, schedule_path, meta_path = self._snapshot_paths(base_path)
+        try:
+            if not meta_path.exists():
+                return False
+            meta = json.loads(meta_path.read_text())
+            if meta['sources'] != self._source_signature(sources):
+                return False
             
-            # Chance for Bus 2
-            if random.random() > 0.5:
-                b_id2 = f"BUS-{r_id}-2"
-                self.buses[b_id2] = Bus(b_id2, route)
-                self.buses[b_id2].current_stop_index = random.randint(0, max(0, len(route.path) - 2))
-                bus_count += 1
+            routes_df = pd.read_parquet(routes_path)
+            routes = {}
+            for r_id, route_df in routes_df.groupby('route_id', sort=False):
+                stop_names = route_df['stop_name'].to_numpy() if 'stop_name' in route_df.columns else None
+                routes[r_id] = Route(
+                    r_id, route_df['route_name'].iat[0],
+                    route_df['lat'].to_numpy(), route_df['lon'].to_numpy(), stop_names
+                )
+            schedule_df = pd.read_parquet(schedule_path) if meta['has_schedule'] else None
+        except Exception as e:
+            print(f"Ignoring simulation snapshot: {e}")
+            return False
         
-        print(f"Initialized {bus_count} buses.")
+        self.routes = routes
+        self.schedule_df = schedule_df
+        self.route_stats = meta['route_stats']
+        print(f"Loaded {len(routes)} routes and route stats from snapshot {meta_path}")
+        return True
+
+    def _save_snapshot(self, base_path: str, sources: List[str]):
+        """Write routes, schedule_df and route_stats for _load_snapshot."""
+        routes_path, schedule_path, meta_path = self._snapshot_paths(base_path)
+        routes = list(self.routes.values())
+        if not routes:
+            return
+        try:
+            routes_path.parent.mkdir(exist_ok=True)
+            meta_path.unlink(missing_ok=True)  # a half-written snapshot must never look valid
+            
+            lengths = [len(route) for route in routes]
+            columns = {
+                'route_id': np.repeat([route.route_id for route in routes], lengths),
+                'route_name': np.repeat([route.name for route in routes], lengths),
+                'lat': np.concatenate([route.path_lat for route in routes]),
+                'lon': np.concatenate([route.path_lon for route in routes]),
+            }
+            if all(route.stop_names is not None for route in routes):
+                columns['stop_name'] = np.concatenate([route.stop_names for route in routes])
+            pd.DataFrame(columns).to_parquet(routes_path, compression='snappy')
+            if self.schedule_df is not None:
+                self.schedule_df.to_parquet(schedule_path, compression='snappy')
+            
+            meta_path.write_text(json.dumps({
+                'sources': self._source_signature(sources),
+                'has_schedule': self.schedule_df is not None,
+                'route_stats': self.route_stats
+            }))
+        except Exception as e:
+            # e.g. object columns mixing types, or a read-only data directory
+            print(f"Could not save simulation snapshot: {e}")
 
     def _init_mock_data(self):
         # Initialize some routes centered around Vijayawada (approx lat 16.5, lon 80.6)
         # Using the coords from the user's LiveMap.tsx as reference but making them more realistic for Vijayawada
         
         # Route 1: Benz Circle -> Bus Station
-        r1_path = [
-            {"lat": 16.5062, "lon": 80.6480}, # Benz Circle
-            {"lat": 16.5100, "lon": 80.6400},
-            {"lat": 16.5150, "lon": 80.6300},
-            {"lat": 16.5180, "lon": 80.6200}, # Bus Station area
-        ]
-        self.routes["R-5A"] = Route("R-5A", "Benz Circle Expr", r1_path)
+        r1_path = np.array([
+            (16.5062, 80.6480), # Benz Circle
+            (16.5100, 80.6400),
+            (16.5150, 80.6300),
+            (16.5180, 80.6200), # Bus Station area
+        ])
+        self.routes["R-5A"] = Route("R-5A", "Benz Circle Expr", r1_path[:, 0], r1_path[:, 1])
 
         # Route 2: 
-        r2_path = [
-            {"lat": 16.5200, "lon": 80.6200},
-            {"lat": 16.5250, "lon": 80.6250},
-            {"lat": 16.5300, "lon": 80.6350},
-        ]
-        self.routes["R-12B"] = Route("R-12B", "City Loop", r2_path)
+        r2_path = np.array([
+            (16.5200, 80.6200),
+            (16.5250, 80.6250),
+            (16.5300, 80.6350),
+        ])
+        self.routes["R-12B"] = Route("R-12B", "City Loop", r2_path[:, 0], r2_path[:, 1])
         
         # Route 3
-        r3_path = [
-             {"lat": 16.5000, "lon": 80.6000},
-             {"lat": 16.5050, "lon": 80.6100},
-             {"lat": 16.5100, "lon": 80.6200},
-        ]
-        self.routes["R-47C"] = Route("R-47C", "Ind. Park Line", r3_path)
+        r3_path = np.array([
+             (16.5000, 80.6000),
+             (16.5050, 80.6100),
+             (16.5100, 80.6200),
+        ])
+        self.routes["R-47C"] = Route("R-47C", "Ind. Park Line", r3_path[:, 0], r3_path[:, 1])
         self.route_stats = {} # Empty for mock
 
         # Initialize Buses
-        self.buses["BUS-101"] = Bus("BUS-101", self.routes["R-5A"])
-        self.buses["BUS-102"] = Bus("BUS-102", self.routes["R-12B"])
-        self.buses["BUS-103"] = Bus("BUS-103", self.routes["R-5A"]) # Second bus on route 1
+        self.add_bus(Bus("BUS-101", self.routes["R-5A"]))
+        self.add_bus(Bus("BUS-102", self.routes["R-12B"]))
+        self.add_bus(Bus("BUS-103", self.routes["R-5A"])) # Second bus on route 1
         self.buses["BUS-103"].progress_to_next = 0.5 # Start mid-way
         
-        self.buses["BUS-201"] = Bus("BUS-201", self.routes["R-47C"])
+        self.add_bus(Bus("BUS-201", self.routes["R-47C"]))
 
     async def run(self):
         self.running = True
         print("Simulation started.")
         iteration = 0
+        # Ticks are scheduled against deadlines so update() time doesn't add up,
+        # and each tick moves buses by the time that actually passed
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        last_tick = next_tick - TICK_SECONDS
         while self.running:
-            self.update(1.0) # Update every second
+            now = loop.time()
+            self.update(now - last_tick)
+            last_tick = now
             iteration += 1
             if iteration % 10 == 0:  # Log every 10 seconds
                 bus_count = len(self.buses)
                 sample_bus = list(self.buses.values())[0] if self.buses else None
                 if sample_bus:
                     print(f"[SIM] Iteration {iteration}: {bus_count} buses active. Sample bus at ({sample_bus.lat:.4f}, {sample_bus.lon:.4f})")
-            await asyncio.sleep(1.0)
+            next_tick += TICK_SECONDS
+            # After a stall, skip the missed ticks rather than running them back to back
+            next_tick = max(next_tick, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+
+    def _move_buses(self, delta_seconds: float):
+        """Advance every bus along its route in one kernel call."""
+        n = len(self.bus_list)
+        if n == 0:
+            return
+        
+        # Move a fraction of the segment, slower when delayed
+        arrived = np.empty(n, dtype=bool)
+        step_buses(
+            self.lat_arr, self.lon_arr, self.progress_arr, self.stop_arr,
+            self.path_lat, self.path_lon, self.seg_inv_dist, self.bus_off, self.bus_len,
+            SPEED_FACTORS[self.status_arr], STEP_DEGREES * delta_seconds, arrived
+        )
+        
+        # Simulate passenger exchange at stop
+        if arrived.any():
+            change = self.rng.integers(-5, 11, size=int(np.count_nonzero(arrived)))
+            self.occupancy_arr[arrived] = np.clip(self.occupancy_arr[arrived] + change, 0, 100)
 
     def update(self, delta_seconds: float):
-        for bus_id, bus in self.buses.items():
-            bus.update_position(delta_seconds)
-            
-            # Random events
-            # 1% chance to change delay status
-            if random.random() < 0.01:
-                r = random.random()
-                if r < 0.1:
-                    bus.status = "critical-delay"
-                    bus.delay_minutes = random.randint(15, 45)
-                elif r < 0.4:
-                    bus.status = "minor-delay"
-                    bus.delay_minutes = random.randint(5, 14)
-                else:
-                    bus.status = "on-time"
-                    bus.delay_minutes = random.randint(0, 4)
+        if len(self.bus_list) != len(self.stop_arr):
+            self._alloc_arrays()
+        
+        self.last_updated = datetime.now()  # One timestamp per tick for every bus
+        self.hour_arr[:] = self.last_updated.hour
+        self._move_buses(delta_seconds)
+        
+        # Random events
+        # 1% chance to change delay status: 10% critical, 30% minor, else on time
+        events = np.flatnonzero(self.rng.random(len(self.bus_list)) < 0.01)
+        if events.size:
+            r = self.rng.random(events.size)
+            codes = np.where(r < 0.1, STATUS_CODES["critical-delay"],
+                             np.where(r < 0.4, STATUS_CODES["minor-delay"], ON_TIME))
+            self.status_arr[events] = codes
+            self.delay_arr[events] = self.rng.integers(DELAY_RANGES[codes, 0], DELAY_RANGES[codes, 1] + 1)
+        
+        # Delayed or crowded buses, most severe (delay, then occupancy) first
+        critical = np.flatnonzero((self.status_arr != ON_TIME) | (self.occupancy_arr > 80))
+        order = np.lexsort((critical, -self.occupancy_arr[critical], -self.delay_arr[critical]))
+        self.critical = [self.bus_list[i] for i in critical[order].tolist()]
+        self.tick += 1
+
+    def critical_buses(self, limit: Optional[int] = None) -> List[Bus]:
+        """Buses needing attention (delayed or over 80% full), most severe first."""
+        return self.critical[:limit] if limit is not None else list(self.critical)
 
     def get_all_buses(self) -> List[Dict]:
+        """Live bus positions, shaped exactly like the BusLocation schema."""
+        timestamp = self.last_updated
         return [
             {
                 "bus_id": b.bus_id,
                 "route_id": b.route.route_id,
-                "lat": b.lat,
-                "lon": b.lon,
-                "speed": b.speed,
-                "timestamp": b.last_updated,
-                "delay_prediction": b.delay_minutes,
-                "status": b.status,
-                "occupancy": b.occupancy
+                "lat": lat,
+                "lon": lon,
+                "speed": speed,
+                "timestamp": timestamp,
+                "delay_prediction": delay
             }
-            for b in self.buses.values()
+            for b, lat, lon, speed, delay in zip(
+                self.bus_list, self.lat_arr.tolist(), self.lon_arr.tolist(),
+                self.speed_arr.tolist(), self.delay_arr.tolist()
+            )
         ]
     
+    def live_buses_snapshot(self) -> tuple:
+        """
+        JSON bytes of get_all_buses() and their ETag, serialized at most once
+        per tick no matter how many clients poll.
+        """
+        snapshot = self._live_snapshot
+        if snapshot is None or snapshot[0] != self.tick:
+            body = orjson.dumps(self.get_all_buses(), option=orjson.OPT_SERIALIZE_NUMPY)
+            etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+            snapshot = (self.tick, body, etag)
+            self._live_snapshot = snapshot
+        return snapshot[1], snapshot[2]
+    
     def get_kpis(self) -> Dict:
         total_buses = len(self.buses)
-        delayed = sum(1 for b in self.buses.values() if b.status != "on-time")
+        delayed = int(np.count_nonzero(self.status_arr != ON_TIME))
         active = total_buses # For now all are active
         
-        total_occ = sum(b.occupancy for b in self.buses.values())
-        avg_occ = round(total_occ / total_buses, 1) if total_buses > 0 else 0
+        avg_occ = round(float(self.occupancy_arr.mean()), 1) if total_buses > 0 else 0
         
         # Calculate system-wide revenue if available
         total_revenue = 0
@@ -325,24 +655,39 @@ class TransportSimulation:
         }
 
     def get_route_analytics(self) -> List[Dict]:
-        analytics = []
+        return list(self.iter_route_analytics())
+
+    def route_analytics_snapshot(self) -> bytes:
+        """JSON bytes of get_route_analytics(), computed and serialized at most once per tick."""
+        snapshot = self._analytics_snapshot
+        if snapshot is None or snapshot[0] != self.tick:
+            snapshot = (self.tick, orjson.dumps(self.get_route_analytics(), option=orjson.OPT_SERIALIZE_NUMPY))
+            self._analytics_snapshot = snapshot
+        return snapshot[1]
+
+    def iter_route_analytics(self) -> Iterator[Dict]:
+        """Yield per-route analytics dicts (shaped like RouteAnalytics) one route at a time."""
+        # Live per-route averages from the per-bus arrays
+        counts = np.maximum(self.route_counts(), 1)
+        avg_delays = self.route_sums(self.delay_arr) / counts
+        avg_occupancies = self.route_sums(self.occupancy_arr) / counts
+        
         for r_id, route in self.routes.items():
-            buses_on_route = [b for b in self.buses.values() if b.route.route_id == r_id]
-            
             # Get static stats
             stats = self.route_stats.get(r_id, {})
             revenue = stats.get('revenue', 0)
             reliability = stats.get('reliability', 100.0)
             
-            # Live stats
-            if buses_on_route:
-                avg_delay = sum(b.delay_minutes for b in buses_on_route) / len(buses_on_route)
-                avg_occupancy = sum(b.occupancy for b in buses_on_route) / len(buses_on_route)
+            # Live stats (routes without buses report 0)
+            idx = self.route_index.get(r_id)
+            if idx is not None:
+                avg_delay = float(avg_delays[idx])
+                avg_occupancy = float(avg_occupancies[idx])
             else:
                 avg_delay = 0
                 avg_occupancy = 0
                 
-            analytics.append({
+            yield {
                 "route_id": r_id,
                 "route_name": route.name,
                 "avg_delay": round(avg_delay, 1),
@@ -350,7 +695,14 @@ class TransportSimulation:
                 "utilization_score": round(min(1.0, avg_occupancy / 100), 2),
                 "revenue": revenue,
                 "reliability": reliability
-            })
-        return analytics
+            }
+
+# Created by get_simulation() on first use, so importing this module doesn't load the data
+_simulation: Optional[TransportSimulation] = None
 
-simulation = TransportSimulation()
+def get_simulation() -> TransportSimulation:
+    """The shared simulation, built (and its data loaded) on the first call."""
+    global _simulation
+    if _simulation is None:
+        _simulation = TransportSimulation()
+    return _simulation
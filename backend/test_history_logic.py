@@ -1,60 +1,147 @@
 
+import functools
+import numpy as np
 import pandas as pd
 import os
 from datetime import datetime
-from routers.history import get_file_for_month, BASE_DATA_PATH
+from typing import Optional
 
-def test_history_logic(year=2023, month=4):
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as ds
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Hardcoded base path
+BASE_DATA_PATH = "C:/Users/bhava/Desktop/RTGS/2years"
+
+# HaltWise export periods: (first month, last month, file under BASE_DATA_PATH)
+HALTWISE_PERIODS = (
+    (datetime(2023, 4, 1), datetime(2024, 4, 30), os.path.join("HaltWiseData_01APR2023_30APR2024", "HaltWiseData_01APR2023_30APR2024.csv")),
+    (datetime(2024, 5, 1), datetime(2025, 4, 30), os.path.join("HaltWiseData_01MAY2024_30APR2025", "HaltWiseData_01MAY2024_30APR2025.csv")),
+)
+
+# isCancelled values (upper-cased) that mean the trip was cancelled
+CANCELLED_VALUES = ['Y', 'YES', '1', 'TRUE']
+
+DATE_COL = 'Scheduled_Trip_Start_Time'
+IS_CANCELLED_COL = 'isCancelled'
+
+
+@functools.lru_cache(maxsize=128)
+def get_file_for_month(year: int, month: int, type: str = "HaltWise") -> Optional[str]:
+    """Path of the export covering year/month, or None."""
+    if type != "HaltWise":
+        return None
+
+    target_date = datetime(year, month, 1)
+    for start, end, file_name in HALTWISE_PERIODS:
+        if start <= target_date <= end:
+            return os.path.join(BASE_DATA_PATH, file_name)
+    return None
+
+def month_mask(dates: pd.Series, year: int, month: int) -> pd.Series:
+    """
+    Rows of dates that fall in year/month. ISO strings are matched on their
+    'YYYY-MM' prefix; only rows in other formats go through to_datetime.
+    """
+    text = dates.astype(str)
+    mask = text.str.startswith(f"{year}-{month:02d}")
+    other = dates.notna() & ~text.str.match(r'\d{4}-\d{2}')
+    if other.any():
+        parsed = pd.to_datetime(dates[other], errors='coerce')
+        mask[other] = (parsed.dt.year == year) & (parsed.dt.month == month)
+    return mask
+
+def cancelled_mask(values: pd.Series) -> np.ndarray:
+    """isCancelled values that mean cancelled, upper-casing only the distinct values."""
+    cats = values.astype('category')
+    cancelled_cats = cats.cat.categories.astype(str).str.upper().isin(CANCELLED_VALUES)
+    # Trailing False is picked by code -1 (missing values)
+    return np.append(cancelled_cats, False)[cats.cat.codes.to_numpy()]
+
+def scan_month(file_path: str, columns: list, year: int, month: int) -> pd.DataFrame:
+    """
+    Rows of a CSV whose DATE_COL falls in year/month, read with a pyarrow
+    dataset scan: only columns are materialized, and each batch is filtered
+    as it is parsed instead of building whole pandas chunks.
+    """
+    start = pa.scalar(datetime(year, month, 1), pa.timestamp('s'))
+    end = pa.scalar(datetime(year + month // 12, month % 12 + 1, 1), pa.timestamp('s'))
+    csv_format = ds.CsvFileFormat(convert_options=pacsv.ConvertOptions(column_types={DATE_COL: pa.timestamp('s')}))
+    dataset = ds.dataset(file_path, format=csv_format)
+    date = ds.field(DATE_COL)
+    return dataset.to_table(columns=columns, filter=(date >= start) & (date < end)).to_pandas()
+
+def test_history_logic(year=2023, month=4, use_arrow=True, max_chunks=6, chunk_size=100000):
+    """
+    Count scheduled and cancelled trips for year/month in the HaltWise export.
+    Uses a pyarrow scan of the whole file when available (and use_arrow);
+    otherwise reads the first max_chunks pandas chunks.
+    """
     print(f"Testing for {month}/{year}")
     print(f"Base Path: {BASE_DATA_PATH}")
-    
+
     file_path = get_file_for_month(year, month)
     print(f"Resolved File Path: {file_path}")
-    
+
     if not file_path or not os.path.exists(file_path):
         print("File not found!")
         return
 
-    chunk_size = 100000
-    date_col = 'Scheduled_Trip_Start_Time'
-    is_cancelled_col = 'isCancelled'
-    
     total_scheduled = 0
     total_cancelled = 0
-    matching_rows = 0
-    
+
     # Peek columns
     df_preview = pd.read_csv(file_path, nrows=5)
     print("Columns:", df_preview.columns.tolist())
-    if date_col in df_preview.columns:
-        print(f"Sample Date: {df_preview[date_col].iloc[0]}")
-    
+    if DATE_COL not in df_preview.columns:
+        print(f"Missing {DATE_COL} column!")
+        return
+    print(f"Sample Date: {df_preview[DATE_COL].iloc[0]}")
+    has_cancelled = IS_CANCELLED_COL in df_preview.columns
+
+    if use_arrow and PYARROW_AVAILABLE:
+        print("Scanning with pyarrow...")
+        try:
+            columns = [DATE_COL, IS_CANCELLED_COL] if has_cancelled else [DATE_COL]
+            filtered = scan_month(file_path, columns, year, month)
+            print(f"Found {len(filtered)} matching rows.")
+            # Sample
+            print(filtered.head(1))
+
+            total_scheduled = len(filtered)
+            if has_cancelled:
+                total_cancelled = int(cancelled_mask(filtered[IS_CANCELLED_COL]).sum())
+            print(f"Total Scheduled: {total_scheduled}")
+            print(f"Total Cancelled: {total_cancelled}")
+            return
+        except Exception as e:
+            print(f"PyArrow scan failed ({e}), falling back to chunks")
+
     print("Processing chunks...")
     try:
-        with pd.read_csv(file_path, chunksize=chunk_size, low_memory=False) as reader:
+        with pd.read_csv(file_path, chunksize=chunk_size, dtype={DATE_COL: str}, low_memory=False) as reader:
             for i, chunk in enumerate(reader):
-                if i > 5: break # Test only first few chunks to save time
-                
-                if date_col in chunk.columns:
-                    chunk[date_col] = pd.to_datetime(chunk[date_col], errors='coerce')
-                    mask = (chunk[date_col].dt.year == year) & (chunk[date_col].dt.month == month)
-                    filtered = chunk[mask]
-                    
-                    if not filtered.empty:
-                        matching_rows += len(filtered)
-                        print(f"Chunk {i}: Found {len(filtered)} matching rows.")
-                        
-                        if is_cancelled_col in filtered.columns:
-                            c_vals = filtered[is_cancelled_col].astype(str).str.upper()
-                            cancelled_mask = c_vals.isin(['Y', 'YES', '1', 'TRUE'])
-                            total_cancelled += cancelled_mask.sum()
-                            total_scheduled += len(filtered)
-                    else:
-                        pass
-                        # print(f"Chunk {i}: No match.")
+                if i >= max_chunks: break # Test only first few chunks to save time
+
+                # Cheap string prefilter; only matching rows are parsed
+                filtered = chunk[month_mask(chunk[DATE_COL], year, month)].copy()
+                filtered[DATE_COL] = pd.to_datetime(filtered[DATE_COL], errors='coerce')
+
+                if filtered.empty:
+                    print(f"Chunk {i}: No matches. Date range: {chunk[DATE_COL].min()} to {chunk[DATE_COL].max()}")
+                    continue
+
+                print(f"Chunk {i}: Found {len(filtered)} matching rows.")
+                total_scheduled += len(filtered)
+                if has_cancelled:
+                    total_cancelled += int(cancelled_mask(filtered[IS_CANCELLED_COL]).sum())
     except Exception as e:
         print(f"Error: {e}")
-        
+
     print(f"Total Scheduled: {total_scheduled}")
     print(f"Total Cancelled: {total_cancelled}")
 